@@ -4,16 +4,40 @@ Java Installation Wizard Flask Application
 Dockerized application for installing Java across multiple platforms using Ansible
 """
 
-from flask import Flask, render_template, request, jsonify, Response, session
+from flask import Flask, render_template, request, jsonify, Response, g
+from werkzeug.utils import secure_filename
 import os
 import json
+import hashlib
 import toml
 import subprocess
-import threading
 import time
 import uuid
+import shutil
+import socket
 from datetime import datetime
 import logging
+import threading
+
+from artifacts import ArtifactStore, ArtifactVerifier, parse_digest
+from catalog import INSTALLATION_FIELDS, INSTALLATION_PREFIX, PROFILE_FIELDS, PROFILE_PREFIX, validate_fields
+from compiler import PlaybookCompiler, compiled_groups
+from config_store import ConfigStore, EntryNotFound, PreconditionFailed
+from distribution import inventory_hosts, parse_distribution, plan_distribution, write_distribution_playbook
+from events import EventBufferRegistry, encode_frame
+from facts import FactCache
+from history import RESULT_EVENTS, RunHistory, epoch
+from jobs import FINAL_STATUSES, CancelCheck, EventForwarder, EventMirror, JobCanceled, open_job_store
+from installer import (build_extravars, build_inventory, redact_request, resolve_installation, resolve_profile,
+                       run_playbook, runner_credentials)
+from logs import LogArchive, follow_log, log_path
+from metrics import HOST_BUCKETS, TASK_BUCKETS, MetricsRegistry
+from preflight import exclusion_limit, run_preflight
+from rollout import parse_rollout, run_rollout
+from runner_config import job_runner_options, remove_control_path_dir
+from scheduler import JobScheduler, QueueFull
+from sse_hub import SSEHub
+from uploads import ChecksumMismatch, OffsetMismatch, UploadError, UploadManager, UploadsBusy, normalize_checksum
 
 app = Flask(__name__)
 app.secret_key = 'java-installer-secret-key-change-in-production'
@@ -23,14 +47,33 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
-JAVA_UPDATER_DIR = '/app/java_updater'
+JAVA_UPDATER_DIR = os.environ.get('JAVA_UPDATER_DIR', '/app/java_updater')
 INSTALLATION_DIR = os.path.join(JAVA_UPDATER_DIR, 'installation')
 BACKUP_DIR = os.path.join(JAVA_UPDATER_DIR, 'backup')
 LOG_DIR = os.path.join(JAVA_UPDATER_DIR, 'log')
+RUNNER_DIR = os.path.join(JAVA_UPDATER_DIR, 'runner')
+FACTS_DIR = os.path.join(JAVA_UPDATER_DIR, 'facts')
+COMPILED_DIR = os.path.join(JAVA_UPDATER_DIR, 'compiled')
+LOG_ARCHIVE_DIR = os.path.join(LOG_DIR, 'archive')
+HISTORY_FILE = os.path.join(JAVA_UPDATER_DIR, 'history.sqlite')
+JOBS_FILE = os.path.join(JAVA_UPDATER_DIR, 'jobs.sqlite')
 CONFIG_FILE = os.path.join(JAVA_UPDATER_DIR, 'java_updater.toml')
+CHECKSUM_CACHE_FILE = os.path.join(JAVA_UPDATER_DIR, 'checksums.json')
+
+# Seconds between keepalive comments on idle progress streams
+HEARTBEAT_INTERVAL = 15
+
+# Modules that move the installation archive, and where the bytes come from
+TRANSFER_ACTIONS = {
+    'copy': 'controller',
+    'win_copy': 'controller',
+    'synchronize': 'controller',
+    'get_url': 'peer',
+    'win_get_url': 'peer'
+}
 
 # Create directories if they don't exist
-for directory in [JAVA_UPDATER_DIR, INSTALLATION_DIR, BACKUP_DIR, LOG_DIR]:
+for directory in [JAVA_UPDATER_DIR, INSTALLATION_DIR, BACKUP_DIR, LOG_DIR, RUNNER_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 # Sample TOML configuration
@@ -70,6 +113,98 @@ if not os.path.exists(CONFIG_FILE):
     with open(CONFIG_FILE, 'w') as f:
         toml.dump(sample_config, f)
 
+# Parsed configuration, reloaded only when the file changes
+config_store = ConfigStore(CONFIG_FILE)
+
+# Catalog collections exposed through the API: key prefix and editable fields
+CATALOG_COLLECTIONS = {
+    'installations': (INSTALLATION_PREFIX, INSTALLATION_FIELDS),
+    'profiles': (PROFILE_PREFIX, PROFILE_FIELDS)
+}
+
+def load_settings():
+    """Read the [settings] table from the TOML configuration"""
+    try:
+        return config_store.get().config.get('settings', {})
+    except Exception as e:
+        logger.error(f"Error reading settings: {e}")
+        return {}
+
+settings = load_settings()
+
+# Content-addressed archive storage and resumable uploads into it
+artifact_store = ArtifactStore(INSTALLATION_DIR)
+artifact_verifier = ArtifactVerifier(CHECKSUM_CACHE_FILE)
+upload_manager = UploadManager(
+    INSTALLATION_DIR,
+    max_active=settings.get('max_concurrent_uploads', 4),
+    store=artifact_store
+)
+
+# Finished logs are compressed into the archive
+log_archive = LogArchive(LOG_ARCHIVE_DIR)
+
+run_history = RunHistory(HISTORY_FILE)
+playbook_compiler = PlaybookCompiler(COMPILED_DIR, JAVA_UPDATER_DIR)
+# Host facts cached between runs
+fact_cache = FactCache(FACTS_DIR, timeout=settings.get('fact_cache_timeout', 86400))
+
+# Bounded per-installation event buffers fed by ansible-runner
+event_buffers = EventBufferRegistry()
+
+# Request, job, task and transfer instrumentation served on /metrics
+metrics = MetricsRegistry()
+request_duration = metrics.histogram(
+    'java_installer_http_request_duration_seconds', 'Time to produce a response, per route', ('route', 'method', 'status')
+)
+task_duration = metrics.histogram(
+    'java_installer_task_duration_seconds', 'Duration of task results, per task and outcome', ('task', 'status'),
+    buckets=TASK_BUCKETS
+)
+host_duration = metrics.histogram(
+    'java_installer_host_duration_seconds', 'Time from the first to the last task result of a host in a run',
+    ('status',), buckets=HOST_BUCKETS
+)
+artifact_bytes = metrics.counter(
+    'java_installer_artifact_bytes_total', 'Installation archive bytes received by uploads or sent to hosts',
+    ('artifact', 'source')
+)
+
+# Jobs, cancellation flags and progress frames shared by every app worker; frames of jobs running here are
+# copied into the store so streams served by other workers can follow them
+job_store = open_job_store(settings, JOBS_FILE)
+event_forwarder = EventForwarder(job_store)
+event_mirror = EventMirror(job_store)
+# Unique per start: a restarted container has the same hostname and PID, and must not heartbeat for the jobs
+# its previous process left running, or they would never expire
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+def log_finished(installation_id):
+    """Whether no worker can still be writing the job's log; jobs the store no longer knows are long over"""
+    job = job_store.get(installation_id)
+    return job is None or job['status'] in FINAL_STATUSES
+
+# Logs left over from earlier runs are archived in the background; other workers may share the log directory
+threading.Thread(target=log_archive.archive_directory, args=(LOG_DIR, log_finished), name='log-archive',
+                 daemon=True).start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_duration.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of the service metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -78,87 +213,768 @@ def index():
 def get_config():
     """Get configuration from TOML file"""
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = toml.load(f)
-        return jsonify(config)
+        snapshot = config_store.get()
+        if request.if_none_match.contains(snapshot.etag):
+            response = Response(status=304)
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['X-Config-Generation'] = str(snapshot.generation)
+        return response
     except Exception as e:
         logger.error(f"Error reading config: {e}")
         return jsonify({'error': 'Failed to read configuration'}), 500
 
+def catalog_response(records):
+    """JSON response for catalog query results, conditional on the configuration and query"""
+    etag_source = f"{config_store.get().etag}:{request.query_string.decode('utf-8')}"
+    etag = hashlib.sha256(etag_source.encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({'items': [record.to_dict() for record in records], 'count': len(records)})
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/installations')
+def get_installations():
+    """Query installation packages by os, vendor and version"""
+    try:
+        catalog = config_store.catalog()
+        return catalog_response(catalog.find_installations(
+            os=request.args.get('os'),
+            vendor=request.args.get('vendor'),
+            version=request.args.get('version')
+        ))
+    except Exception as e:
+        logger.error(f"Error querying installations: {e}")
+        return jsonify({'error': 'Failed to query installations'}), 500
+
+@app.route('/api/profiles')
+def get_profiles():
+    """Query installation profiles by OS compatibility"""
+    try:
+        catalog = config_store.catalog()
+        return catalog_response(catalog.find_profiles(compatible_with=request.args.get('compatible_with')))
+    except Exception as e:
+        logger.error(f"Error querying profiles: {e}")
+        return jsonify({'error': 'Failed to query profiles'}), 500
+
+def catalog_fields(collection):
+    """Validate the JSON body of a catalog write and return its fields"""
+    _, allowed = CATALOG_COLLECTIONS[collection]
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        raise ValueError('Request body must be a JSON object')
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    validate_fields(fields)
+    return fields
+
+def if_match_etag():
+    """Return the ETag a write is conditional on, or None for unconditional writes"""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return next(iter(request.if_match.as_set()))
+
+def catalog_write_response(snapshot, entry_id, status=200):
+    entry = snapshot.config.get(entry_id)
+    response = jsonify({'id': entry_id, 'entry': entry, 'generation': snapshot.generation})
+    response.set_etag(snapshot.etag)
+    response.headers['X-Config-Generation'] = str(snapshot.generation)
+    return response, status
+
+@app.route('/api/<any(installations, profiles):collection>', methods=['POST'])
+def create_catalog_entry(collection):
+    """Add an installation or profile entry"""
+    prefix, _ = CATALOG_COLLECTIONS[collection]
+    try:
+        fields = catalog_fields(collection)
+        expected_etag = if_match_etag()
+        snapshot, entry_id = config_store.add_entry(prefix, fields, expected_etag)
+        return catalog_write_response(snapshot, entry_id, 201)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PreconditionFailed as e:
+        return jsonify({'error': str(e)}), 412
+    except Exception as e:
+        logger.error(f"Error adding {collection} entry: {e}")
+        return jsonify({'error': 'Failed to update configuration'}), 500
+
+@app.route('/api/<any(installations, profiles):collection>/<entry_id>', methods=['PATCH', 'DELETE'])
+def modify_catalog_entry(collection, entry_id):
+    """Update or remove an installation or profile entry"""
+    prefix, _ = CATALOG_COLLECTIONS[collection]
+    if not entry_id.startswith(prefix):
+        return jsonify({'error': f'Unknown entry {entry_id}'}), 404
+    try:
+        expected_etag = if_match_etag()
+        if request.method == 'DELETE':
+            snapshot, _ = config_store.delete_entry(entry_id, expected_etag)
+        else:
+            snapshot, _ = config_store.update_entry(entry_id, catalog_fields(collection), expected_etag)
+        return catalog_write_response(snapshot, entry_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except EntryNotFound:
+        return jsonify({'error': f'Unknown entry {entry_id}'}), 404
+    except PreconditionFailed as e:
+        return jsonify({'error': str(e)}), 412
+    except Exception as e:
+        logger.error(f"Error updating {entry_id}: {e}")
+        return jsonify({'error': 'Failed to update configuration'}), 500
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload of an installation archive"""
+    try:
+        data = request.get_json(silent=True) or {}
+        checksum = data.get('checksum', '')
+        installation = config_store.catalog().installations.get(data.get('installation_id'))
+        if not checksum and installation is not None:
+            # Catalog entries with placeholder checksums are uploaded unverified rather than always rejected
+            if parse_digest(installation.checksum):
+                checksum = installation.checksum
+            elif installation.checksum:
+                logger.warning(f"Ignoring malformed catalog checksum of {data.get('installation_id')}")
+        checksum = normalize_checksum(checksum)
+
+        # Identical content is already stored: alias it instead of transferring it again
+        if data.get('filename') and artifact_store.has(checksum):
+            destination = artifact_store.link(checksum, secure_filename(data['filename']))
+            artifact_verifier.record(destination, checksum)
+            return jsonify({
+                'filename': os.path.relpath(destination, JAVA_UPDATER_DIR),
+                'checksum': checksum,
+                'complete': True
+            })
+
+        upload = upload_manager.create(data.get('filename'), data.get('size'), checksum)
+        response = jsonify(upload.to_dict())
+        response.headers['Location'] = f'/api/uploads/{upload.id}'
+        response.headers['Upload-Offset'] = '0'
+        return response, 201
+    except (UploadError, ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error creating upload: {e}")
+        return jsonify({'error': 'Failed to create upload'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+def handle_upload(upload_id):
+    """Report, append a chunk to, or abort an upload"""
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+
+    if request.method == 'DELETE':
+        upload_manager.discard(upload_id)
+        return jsonify({'upload_id': upload_id, 'deleted': True})
+
+    if request.method == 'GET':
+        response = jsonify(upload.to_dict())
+        response.headers['Upload-Offset'] = str(upload.offset)
+        return response
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', upload.offset))
+        if request.content_length is None:
+            raise UploadError('Content-Length is required')
+        destination = upload_manager.append(upload, offset, request.stream, request.content_length)
+        artifact_bytes.inc(upload.filename, 'upload', amount=upload.offset - offset)
+
+        result = upload.to_dict()
+        result['complete'] = destination is not None
+        if destination is not None:
+            result['filename'] = os.path.relpath(destination, JAVA_UPDATER_DIR)
+            artifact_verifier.record(destination, upload.checksum)
+        response = jsonify(result)
+        response.headers['Upload-Offset'] = str(upload.offset)
+        return response
+    except OffsetMismatch as e:
+        response = jsonify({'error': str(e), 'offset': e.offset})
+        response.headers['Upload-Offset'] = str(e.offset)
+        return response, 409
+    except ChecksumMismatch as e:
+        return jsonify({'error': str(e)}), 422
+    except (UploadError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except UploadsBusy:
+        response = jsonify({'error': 'Too many uploads in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    except Exception as e:
+        logger.error(f"Error receiving upload {upload_id}: {e}")
+        return jsonify({'error': 'Failed to store upload chunk'}), 500
+
+@app.route('/api/artifacts')
+def get_artifacts():
+    """List stored artifact blobs with their aliases and reference state"""
+    try:
+        installations = config_store.catalog().installations.values()
+        return jsonify({'artifacts': artifact_store.list(installations)})
+    except Exception as e:
+        logger.error(f"Error listing artifacts: {e}")
+        return jsonify({'error': 'Failed to list artifacts'}), 500
+
+@app.route('/api/artifacts/verify', methods=['POST'])
+def verify_artifacts():
+    """Verify every catalog installation file against its checksum"""
+    try:
+        installations = [i for i in config_store.catalog().installations.values() if i.filename]
+        results = artifact_verifier.verify_many(
+            [(os.path.join(JAVA_UPDATER_DIR, i.filename), i.checksum) for i in installations]
+        )
+        for installation, result in zip(installations, results):
+            result['installation_id'] = installation.id
+            result['path'] = installation.filename
+        return jsonify({
+            'results': results,
+            'ok': all(result['status'] in ('ok', 'unverified') for result in results)
+        })
+    except Exception as e:
+        logger.error(f"Error verifying artifacts: {e}")
+        return jsonify({'error': 'Failed to verify artifacts'}), 500
+
+@app.route('/api/artifacts/gc', methods=['POST'])
+def collect_artifacts():
+    """Remove artifact blobs no installation entry references"""
+    try:
+        dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+        installations = config_store.catalog().installations.values()
+        removed = artifact_store.collect_garbage(installations, dry_run=dry_run)
+        return jsonify({
+            'removed': removed,
+            'freed_bytes': sum(blob['size'] for blob in removed),
+            'dry_run': dry_run
+        })
+    except Exception as e:
+        logger.error(f"Error collecting artifacts: {e}")
+        return jsonify({'error': 'Failed to collect artifacts'}), 500
+
+@app.route('/api/facts')
+def get_facts():
+    """List hosts with cached facts"""
+    return jsonify({'hosts': fact_cache.hosts(), 'timeout': fact_cache.timeout})
+
+@app.route('/api/facts/<host>', methods=['GET', 'DELETE'])
+def handle_host_facts(host):
+    """Show or invalidate the cached facts of a host"""
+    try:
+        if request.method == 'DELETE':
+            return jsonify({'host': host, 'invalidated': fact_cache.invalidate(host)})
+        facts = fact_cache.get(host)
+        if facts is None:
+            return jsonify({'error': f'No cached facts for {host}'}), 404
+        return jsonify({'host': host, 'age_seconds': int(fact_cache.age(host)), 'facts': facts})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/facts/refresh', methods=['POST'])
+def refresh_facts():
+    """Re-gather and cache facts for the given hosts"""
+    try:
+        data = request.get_json(silent=True) or {}
+        hosts = [line.split()[0] for line in data.get('inventory') or [] if line.strip()]
+        hosts += [host for host in data.get('hosts') or [] if host not in hosts]
+        if not hosts:
+            return jsonify({'error': 'No hosts given'}), 400
+
+        job_id = f'facts-{uuid.uuid4()}'
+        private_data_dir = os.path.join(RUNNER_DIR, job_id)
+        try:
+            runner_options = job_runner_options(private_data_dir, job_id, load_settings(), FACTS_DIR)
+            runner_options.update(runner_credentials({'ansible': data}))
+            results = fact_cache.refresh(hosts, build_inventory({'ansible': data}), private_data_dir, **runner_options)
+        finally:
+            # The runner writes the inventory and a copy of the output there; the facts are in the fact cache
+            shutil.rmtree(private_data_dir, ignore_errors=True)
+            remove_control_path_dir(job_id)
+        return jsonify({'hosts': results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error refreshing facts: {e}")
+        return jsonify({'error': 'Failed to refresh facts'}), 500
+
 @app.route('/api/install', methods=['POST'])
 def start_installation():
     """Start the Java installation process"""
     try:
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         installation_id = str(uuid.uuid4())
 
-        # Store installation data in session
-        session['installation_data'] = data
-        session['installation_id'] = installation_id
+        try:
+            parse_rollout(data.get('rollout'))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': f'Invalid rollout options: {e}'}), 400
+        try:
+            parse_distribution(data.get('distribution'))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': f'Invalid distribution options: {e}'}), 400
+        try:
+            priority = int(data.get('priority', 0))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': f'Invalid priority: {e}'}), 400
 
-        # Start installation in background thread
-        thread = threading.Thread(target=run_installation, args=(installation_id, data))
-        thread.daemon = True
-        thread.start()
+        # Queue the installation in the shared job store; any app worker's pool may pick it up
+        position, eta = scheduler.submit(installation_id, data, priority=priority)
+        job_store.append_events(installation_id, [(1, encode_frame(1, {
+            'step': 'Waiting for a free installation slot',
+            'status': 'queued',
+            'queue_position': position,
+            'eta_seconds': eta,
+            'progress': 0,
+            'timestamp': datetime.now().isoformat(),
+            'completed': False
+        }))])
 
-        return jsonify({'installation_id': installation_id})
+        return jsonify({
+            'installation_id': installation_id,
+            'queue_position': position,
+            'eta_seconds': eta
+        })
+    except QueueFull as e:
+        response = jsonify({'error': 'Installation queue is full', 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
     except Exception as e:
         logger.error(f"Error starting installation: {e}")
         return jsonify({'error': 'Failed to start installation'}), 500
 
+@app.route('/api/queue')
+def get_queue():
+    """Report worker pool and waiting queue usage"""
+    return jsonify(scheduler.stats())
+
+def job_response(job):
+    status = scheduler.status(job['id'])
+    return {
+        'installation_id': job['id'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'worker': job['worker'],
+        'cancel_requested': job['cancel_requested'],
+        'queue_position': status[1] if status and status[0] == 'queued' else None,
+        'eta_seconds': status[2] if status and status[0] == 'queued' else None,
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat(),
+        'started_at': datetime.fromtimestamp(job['started_at']).isoformat() if job['started_at'] else None,
+        'finished_at': datetime.fromtimestamp(job['finished_at']).isoformat() if job['finished_at'] else None
+    }
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Installation jobs known to the shared job store, most recent first"""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    jobs = job_store.list_jobs(status=request.args.get('status'), limit=limit)
+    return jsonify({'jobs': [job_response(job) for job in jobs]})
+
+@app.route('/api/jobs/<installation_id>')
+def get_job(installation_id):
+    """State of one installation job, whichever worker runs it"""
+    job = job_store.get(installation_id)
+    if job is None:
+        return jsonify({'error': 'Unknown installation'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/api/jobs/<installation_id>/cancel', methods=['POST'])
+def cancel_job(installation_id):
+    """Cancel a queued installation, or ask the worker running it to stop"""
+    if job_store.get(installation_id) is None:
+        return jsonify({'error': 'Unknown installation'}), 404
+    result = scheduler.cancel(installation_id)
+    if result is None:
+        return jsonify({'error': 'Installation already finished'}), 409
+    return jsonify({'installation_id': installation_id, 'status': result}), 202 if result == 'cancelling' else 200
+
 @app.route('/api/progress/<installation_id>')
 def get_progress(installation_id):
     """Server-sent events endpoint for installation progress"""
-    def generate_progress():
-        installation_steps = [
-            "Verifying local installation file",
-            "Creating backup of existing installation", 
-            "Copying installation file to remote hosts",
-            "Unpacking installation files",
-            "Configuring environment variables",
-            "Updating symlinks",
-            "Installation complete"
-        ]
-
-        for i, step in enumerate(installation_steps):
-            progress = int((i + 1) / len(installation_steps) * 100)
-
-            # Simulate realistic timing
-            time.sleep(2 + (i * 0.5))  # Variable delay for each step
-
-            event_data = {
-                'step': step,
-                'progress': progress,
-                'timestamp': datetime.now().isoformat(),
-                'completed': i + 1 == len(installation_steps)
-            }
+    try:
+        # Reconnecting EventSource clients resume after the last event they saw
+        resume_seq = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        resume_seq = None
 
-            yield f"data: {json.dumps(event_data)}\n\n"
+    # Jobs queued, running on another worker or finished before this process started are followed through
+    # the job store
+    buffer = event_buffers.get(installation_id) or event_mirror.get(installation_id)
+    if buffer is None:
+        return jsonify({'error': 'Unknown installation'}), 404
 
-            if event_data['completed']:
-                break
+    def generate_progress():
+        subscription = buffer.subscribe(
+            resume_seq, replay=settings.get('progress_replay', 100), max_lag=settings.get('progress_max_lag', 200)
+        )
+        try:
+            while not subscription.done:
+                frames = subscription.poll(timeout=HEARTBEAT_INTERVAL)
+                if frames:
+                    yield ''.join(frames)
+                elif not subscription.done:
+                    yield ": keepalive\n\n"
+        finally:
+            subscription.close()
 
     return Response(generate_progress(), mimetype='text/event-stream')
 
+@app.route('/api/logs/<installation_id>')
+def follow_installation_log(installation_id):
+    """Server-sent events stream of an installation log, resumable from a byte offset"""
+    path = log_path(LOG_DIR, installation_id)
+    archived = not os.path.isfile(path)
+    if archived and not log_archive.has(installation_id):
+        return jsonify({'error': 'Unknown installation log'}), 404
+    try:
+        # Event ids are byte offsets, so Last-Event-ID and ?offset= resume at the same place
+        offset = int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'offset must be an integer'}), 400
+    # Jobs running on another worker are followed through the job store, as in get_progress
+    buffer = event_buffers.get(installation_id) or event_mirror.get(installation_id)
+
+    def generate_log():
+        if archived:
+            chunks = log_archive.read_chunks(installation_id, offset)
+        else:
+            chunks = follow_log(path, offset, buffer, timeout=HEARTBEAT_INTERVAL)
+        for chunk in chunks:
+            if chunk is None:
+                yield ": keepalive\n\n"
+                continue
+            end, text = chunk
+            lines = ''.join(f"data: {line}\n" for line in text.splitlines())
+            yield f"id: {end}\n{lines}\n"
+
+    return Response(generate_log(), mimetype='text/event-stream')
+
+@app.route('/api/logs/search')
+def search_logs():
+    """Search archived installation logs by host, status, task and start time"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    results = log_archive.search(
+        host=request.args.get('host'),
+        status=request.args.get('status'),
+        task=request.args.get('task'),
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        limit=limit
+    )
+    return jsonify({'results': results, 'count': len(results)})
+
+@app.route('/api/history/runs')
+def list_runs():
+    """Recorded installation runs, most recent first"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 1000)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    return jsonify({'runs': run_history.runs(status=request.args.get('status'), limit=limit, offset=offset)})
+
+@app.route('/api/history/runs/<run_id>')
+def get_run(run_id):
+    """One recorded run with per-host durations"""
+    run = run_history.run(run_id)
+    if run is None:
+        return jsonify({'error': 'Unknown run'}), 404
+    return jsonify(run)
+
+@app.route('/api/history/slowest-tasks')
+def slowest_tasks():
+    """Tasks with the highest mean duration across recorded runs"""
+    try:
+        limit = min(int(request.args.get('limit', 20)), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'tasks': run_history.slowest_tasks(limit=limit, since=request.args.get('since'))})
+
+def record_event_metrics(event, host_spans, artifact, artifact_size):
+    """Task duration, host span and archive transfer metrics of one runner event"""
+    status = RESULT_EVENTS.get(event.get('event'))
+    if status is None:
+        return
+    event_data = event.get('event_data') or {}
+    finished = epoch(event_data.get('end')) or time.time()
+    started = epoch(event_data.get('start')) or finished
+    duration = event_data.get('duration')
+    task_duration.observe(finished - started if duration is None else duration, event_data.get('task') or '', status)
+
+    host = event_data.get('host')
+    span = host_spans.get(host)
+    if span is None:
+        host_spans[host] = [started, finished, status in ('failed', 'unreachable')]
+    else:
+        span[0] = min(span[0], started)
+        span[1] = max(span[1], finished)
+        span[2] = span[2] or status in ('failed', 'unreachable')
+
+    action = str(event_data.get('task_action') or '').rsplit('.', 1)[-1]
+    if action in TRANSFER_ACTIONS and status == 'ok' and (event_data.get('res') or {}).get('changed'):
+        artifact_bytes.inc(artifact, TRANSFER_ACTIONS[action], amount=artifact_size)
+
 def run_installation(installation_id, data):
-    """Run the actual installation process using Ansible"""
+    """Run the actual installation process using Ansible; returns the final job status"""
+    # Sequence numbers continue after the events already stored for the job (the queued event)
+    buffer = event_buffers.create(installation_id, start_seq=max(job_store.last_event_seq(installation_id), 1))
+    event_forwarder.attach(installation_id, buffer)
+    run_history.start_run(installation_id, redact_request(data))
+    status = 'error'
+    # {host: [first start, last end, failed]} for the host duration histogram
+    host_spans = {}
+    # Runner inputs and artifacts of every phase; removed when the run ends, the log archive keeps the output
+    private_data_dir = os.path.join(RUNNER_DIR, installation_id)
+
+    def check_canceled():
+        if job_store.cancel_requested(installation_id):
+            raise JobCanceled()
+
     try:
         # Log installation start
-        log_file = os.path.join(LOG_DIR, f'installation_{installation_id}.log')
+        log_file = log_path(LOG_DIR, installation_id)
 
         with open(log_file, 'w') as f:
             f.write(f"Installation started at {datetime.now()}\n")
-            f.write(f"Installation data: {json.dumps(data, indent=2)}\n")
+            f.write(f"Installation data: {json.dumps(redact_request(data), indent=2)}\n")
+        buffer.touch()
+
+        config = config_store.get().config
+        installation = resolve_installation(data, config, INSTALLATION_DIR)
+        profile = resolve_profile(data, config)
+        run_history.describe_run(installation_id, installation, profile)
+
+        buffer.append({
+            'step': 'Verifying local installation file',
+            'status': 'started',
+            'progress': 0,
+            'timestamp': datetime.now().isoformat(),
+            'completed': False
+        })
+        verification = artifact_verifier.verify(
+            os.path.join(JAVA_UPDATER_DIR, installation.get('filename', '')),
+            installation.get('checksum', '')
+        )
+        if verification['status'] in ('missing', 'mismatch'):
+            raise ValueError(f"Installation file {installation.get('filename')} is {verification['status']}")
 
-        # In a real implementation, this would:
-        # 1. Generate Ansible playbook based on configuration
-        # 2. Execute ansible-playbook command
-        # 3. Stream real output to the progress endpoint
+        inventory = build_inventory(data)
+        extravars = build_extravars(installation, profile, JAVA_UPDATER_DIR)
+        rollout = parse_rollout(data.get('rollout'))
+        distribution = parse_distribution(data.get('distribution'))
+        job_settings = load_settings()
+        runner_options = job_runner_options(private_data_dir, installation_id, job_settings, FACTS_DIR)
+        runner_options.update(runner_credentials(data))
+        # ansible-runner polls this while a playbook runs; a cancel request stops the run
+        runner_options['cancel_callback'] = CancelCheck(job_store, installation_id)
+        # Task events from the bundled callback plugin rather than ansible-runner's full event payloads
+        structured_events = job_settings.get('structured_events', True)
+        compliant = []
 
-        logger.info(f"Installation {installation_id} completed successfully")
+        artifact = os.path.basename(installation.get('filename', ''))
+        try:
+            artifact_size = os.path.getsize(extravars['java_installation_file'])
+        except OSError:
+            artifact_size = 0
 
+        def record_event(event):
+            run_history.record_event(installation_id, event)
+            record_event_metrics(event, host_spans, artifact, artifact_size)
+
+        # Leave hosts that already run the requested Java out of the main run
+        if data.get('preflight', True) and installation.get('version'):
+            buffer.append({
+                'step': 'Checking installed Java versions',
+                'status': 'started',
+                'progress': 0,
+                'timestamp': datetime.now().isoformat(),
+                'completed': False
+            })
+            probes = run_preflight(
+                private_data_dir, inventory, extravars['install_path'],
+                installation.get('version'), installation.get('vendor'), **runner_options
+            )
+            compliant = sorted(host for host, probe in probes.items() if probe['status'] == 'compliant')
+            buffer.append({
+                'step': 'Pre-flight version check complete',
+                'status': 'ok',
+                'compliant_hosts': compliant,
+                'hosts': probes,
+                'progress': 0,
+                'timestamp': datetime.now().isoformat(),
+                'completed': False
+            })
+            if compliant and len(compliant) == len(probes):
+                logger.info(f"Installation {installation_id}: all {len(compliant)} hosts already compliant")
+                buffer.append({
+                    'step': 'All hosts already compliant',
+                    'status': 'successful',
+                    'compliant_hosts': compliant,
+                    'progress': 100,
+                    'timestamp': datetime.now().isoformat(),
+                    'completed': True
+                })
+                status = 'successful'
+                return status
+            if compliant:
+                runner_options['limit'] = exclusion_limit(compliant, os.path.join(private_data_dir, 'limit'))
+
+        # Seed the archive once per group and subnet, then let hosts fetch it from each other
+        check_canceled()
+        if distribution:
+            waves = plan_distribution(inventory_hosts(inventory), distribution['fanout'], excluded=compliant)
+            buffer.append({
+                'step': 'Distributing installation file',
+                'status': 'started',
+                'waves': len(waves),
+                'progress': 0,
+                'timestamp': datetime.now().isoformat(),
+                'completed': False
+            })
+            distribution_dir = os.path.join(private_data_dir, 'distribution')
+            distribution_playbook = write_distribution_playbook(
+                os.path.join(distribution_dir, 'project', 'distribute.yml'), waves,
+                extravars['java_installation_file'], installation.get('checksum', ''),
+                job_settings.get('distribution_port', 8765)
+            )
+            distribution_failed = set()
+
+            def record_distribution_event(event):
+                event_data = event.get('event_data') or {}
+                if RESULT_EVENTS.get(event.get('event')) in ('failed', 'unreachable') and \
+                        not event_data.get('ignore_errors'):
+                    # Not a host failure yet: the main run copies the file to these hosts from the controller
+                    distribution_failed.add(event_data.get('host'))
+                    return
+                record_event(event)
+
+            runner = run_playbook(
+                f'{installation_id}-distribution', distribution_dir, inventory, extravars, buffer, log_file,
+                playbook=distribution_playbook, tags={'phase': 'distribution'}, report_completion=False,
+                event_callback=record_distribution_event, structured_events=structured_events, **runner_options
+            )
+            if runner.status == 'canceled':
+                raise JobCanceled()
+            if runner.status == 'successful':
+                extravars['java_artifact_staged'] = True
+            else:
+                # The main run then keeps its transfer tasks; hosts already staged match the checksum and skip them
+                logger.warning(f"Installation {installation_id}: distribution ended with status {runner.status}, "
+                               f"hosts {sorted(distribution_failed)} fall back to a controller copy")
+                buffer.append({
+                    'step': 'Distribution incomplete, copying from the controller where it failed',
+                    'status': 'ok',
+                    'fallback_hosts': sorted(distribution_failed),
+                    'progress': 0,
+                    'timestamp': datetime.now().isoformat(),
+                    'completed': False
+                })
+
+        # Platform-specific plays for this installation and profile; java-install.yml is the generic fallback
+        playbook = None
+        if job_settings.get('compile_playbooks', True):
+            playbook = playbook_compiler.compile(installation, profile, staged=extravars.get('java_artifact_staged', False))
+            # Compiled plays target the installation's OS group only; with none of its hosts in the inventory
+            # ansible would match nothing and report success
+            groups = compiled_groups(installation)
+            hosts_by_group = inventory_hosts(inventory)
+            if not any(host not in compliant for group in groups for host, _ in hosts_by_group.get(group, [])):
+                raise RuntimeError(f"The inventory has no hosts to install on in {', '.join(groups)}")
+        check_canceled()
+
+        if rollout:
+            runners = run_rollout(
+                installation_id, private_data_dir, inventory, extravars, buffer, log_file, rollout,
+                base_playbook=playbook, event_callback=record_event, structured_events=structured_events,
+                **runner_options
+            )
+            statuses = {group: runner.status for group, runner in runners.items()}
+            succeeded = bool(statuses) and all(value == 'successful' for value in statuses.values())
+            status = 'successful' if succeeded else 'canceled' if 'canceled' in statuses.values() else 'failed'
+            logger.info(f"Installation {installation_id} rollout finished: {statuses}")
+        else:
+            runner = run_playbook(
+                installation_id, private_data_dir, inventory, extravars, buffer, log_file, playbook=playbook,
+                event_callback=record_event, structured_events=structured_events, **runner_options
+            )
+            status = runner.status
+            logger.info(f"Installation {installation_id} finished with status {runner.status} (rc={runner.rc})")
+
+    except JobCanceled:
+        logger.info(f"Installation {installation_id} canceled")
+        status = 'canceled'
+        buffer.append({
+            'step': 'Installation canceled',
+            'status': 'canceled',
+            'progress': 100,
+            'timestamp': datetime.now().isoformat(),
+            'completed': True
+        })
     except Exception as e:
         logger.error(f"Installation {installation_id} failed: {e}")
+        buffer.append({
+            'step': 'Installation failed',
+            'status': 'error',
+            'error': str(e),
+            'progress': 100,
+            'timestamp': datetime.now().isoformat(),
+            'completed': True
+        })
+    finally:
+        shutil.rmtree(private_data_dir, ignore_errors=True)
+        remove_control_path_dir(installation_id)
+        buffer.close()
+        event_forwarder.flush(installation_id)
+        run_history.finish_run(installation_id, status)
+        for started, finished, failed in host_spans.values():
+            host_duration.observe(finished - started, 'failed' if failed else 'ok')
+        try:
+            log_archive.archive(installation_id, log_path(LOG_DIR, installation_id))
+        except Exception as e:
+            logger.error(f"Could not archive the log of {installation_id}: {e}")
+    return status
+
+# Fixed worker pool bounded by max_concurrent_installations, claiming jobs from the shared store
+scheduler = JobScheduler(
+    run_installation,
+    job_store,
+    WORKER_ID,
+    workers=settings.get('max_concurrent_installations', 5),
+    max_queued=settings.get('max_queued_installations', 50),
+    initial_duration=settings.get('default_timeout', 300),
+    retention=settings.get('job_retention', 604800),
+    # Credentials stay in this process; the store keeps what the run history keeps
+    redact=redact_request
+)
+
+# Progress and log streams on their own asyncio port; the Flask endpoints above remain as a fallback
+sse_hub = SSEHub(
+    event_buffers, LOG_DIR, log_archive, event_mirror=event_mirror, heartbeat=HEARTBEAT_INTERVAL,
+    replay=settings.get('progress_replay', 100), max_lag=settings.get('progress_max_lag', 200)
+)
+
+metrics.gauge('java_installer_jobs', 'Jobs in the shared job store, per status',
+              lambda: {(status,): count for status, count in job_store.counts().items()}, ('status',))
+metrics.gauge('java_installer_active_installations', 'Installations running on this worker',
+              lambda: scheduler.running)
+metrics.gauge('java_installer_max_concurrent_installations', 'Size of this worker\'s installation pool',
+              lambda: scheduler.workers)
+metrics.gauge('java_installer_max_queued_installations', 'Queued installations accepted before returning 429',
+              lambda: scheduler.max_queued)
+metrics.gauge('java_installer_sse_subscribers', 'Progress stream subscribers attached to event buffers',
+              lambda: sum(buffer.subscribers for buffer in event_buffers.buffers() + event_mirror.buffers()))
+metrics.gauge('java_installer_sse_hub_connections', 'Open connections to the asynchronous stream hub',
+              lambda: sse_hub.connections)
 
 if __name__ == '__main__':
+    if settings.get('sse_port', 5001):
+        sse_hub.start(port=settings.get('sse_port', 5001))
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,258 @@
+"""
+Content-addressed artifact store and checksum verification
+Installation archives are stored once per SHA-256 digest; friendly filenames are hardlinks to the blob.
+Verified digests are cached by (device, inode, size, mtime) so unchanged archives are not hashed again.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 'sha256:<hex>' or bare hex, compared lower-case
+DIGEST_PATTERN = re.compile(r'(?:sha256:)?([0-9a-f]{64})')
+
+# Bytes handed to the hasher per update; large enough that hashlib releases the GIL for each one
+HASH_BLOCK = 8 * 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, reading it through a memory map"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, size, HASH_BLOCK):
+                hasher.update(view[offset:offset + HASH_BLOCK])
+    return hasher.hexdigest()
+
+
+def parse_digest(checksum):
+    """Return the hex digest of a 'sha256:<hex>' (or bare hex) checksum, or None if it is not one"""
+    match = DIGEST_PATTERN.fullmatch((checksum or '').strip().lower())
+    return match.group(1) if match else None
+
+
+class ArtifactStore:
+    """Blobs under `<installation_dir>/.blobs/sha256`, aliased by hardlinks in `installation_dir`"""
+
+    def __init__(self, installation_dir):
+        self.installation_dir = installation_dir
+        self.blob_dir = os.path.join(installation_dir, '.blobs', 'sha256')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def has(self, checksum):
+        digest = parse_digest(checksum)
+        return digest is not None and os.path.exists(self.blob_path(digest))
+
+    def alias_path(self, filename):
+        return os.path.join(self.installation_dir, os.path.basename(filename))
+
+    def _link_alias(self, blob, alias):
+        """Point `alias` at `blob`, replacing whatever the alias was before"""
+        if os.path.exists(alias) and os.path.samefile(blob, alias):
+            return
+        temp_path = os.path.join(self.installation_dir, f'.{uuid.uuid4().hex}.link')
+        os.link(blob, temp_path)
+        os.replace(temp_path, alias)
+
+    def link(self, checksum, filename):
+        """Create the friendly `filename` for an existing blob without copying any data"""
+        digest = parse_digest(checksum)
+        if digest is None or not os.path.exists(self.blob_path(digest)):
+            raise KeyError(checksum)
+        alias = self.alias_path(filename)
+        with self._lock:
+            self._link_alias(self.blob_path(digest), alias)
+        return alias
+
+    def ingest(self, path, checksum, filename):
+        """Move an already-hashed file into the store and alias it as `filename`"""
+        digest = parse_digest(checksum)
+        if digest is None:
+            raise ValueError(f'Unsupported checksum {checksum}')
+
+        blob = self.blob_path(digest)
+        alias = self.alias_path(filename)
+        with self._lock:
+            if os.path.exists(blob):
+                # Identical content is already stored; drop the new copy
+                os.remove(path)
+                logger.info(f"Deduplicated {filename} against existing blob {digest}")
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(path, blob)
+                os.chmod(blob, 0o444)
+            self._link_alias(blob, alias)
+        return alias
+
+    def _aliases_by_inode(self):
+        aliases = {}
+        for entry in os.scandir(self.installation_dir):
+            if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                continue
+            aliases.setdefault(entry.inode(), []).append(entry.name)
+        return aliases
+
+    def list(self, installations=()):
+        """Describe every blob: size, aliases, link count and whether an installation references it"""
+        referenced = self._referenced(installations)
+        aliases = self._aliases_by_inode()
+        blobs = []
+        for root, _, files in os.walk(self.blob_dir):
+            for digest in files:
+                st = os.stat(os.path.join(root, digest))
+                names = sorted(aliases.get(st.st_ino, []))
+                blobs.append({
+                    'checksum': f'sha256:{digest}',
+                    'size': st.st_size,
+                    'aliases': names,
+                    'refcount': st.st_nlink - 1,
+                    'referenced': digest in referenced[0] or any(name in referenced[1] for name in names)
+                })
+        return blobs
+
+    @staticmethod
+    def _referenced(installations):
+        digests = set()
+        filenames = set()
+        for installation in installations:
+            digest = parse_digest(installation.checksum)
+            if digest:
+                digests.add(digest)
+            if installation.filename:
+                filenames.add(os.path.basename(installation.filename))
+        return digests, filenames
+
+    def collect_garbage(self, installations, dry_run=False):
+        """Remove blobs, and their aliases, that no installation references by checksum or filename"""
+        removed = []
+        with self._lock:
+            for blob in self.list(installations):
+                if blob['referenced']:
+                    continue
+                removed.append(blob)
+                if dry_run:
+                    continue
+                for name in blob['aliases']:
+                    os.remove(os.path.join(self.installation_dir, name))
+                os.remove(self.blob_path(parse_digest(blob['checksum'])))
+                logger.info(f"Removed unreferenced blob {blob['checksum']}")
+        return removed
+
+
+class ChecksumCache:
+    """Persistent map of file path to digest, valid while the file's device, inode, size and mtime match"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Ignoring unreadable checksum cache {path}: {e}")
+
+    @staticmethod
+    def signature(path):
+        st = os.stat(path)
+        return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def get(self, path):
+        entry = self._entries.get(path)
+        if entry is None or entry['signature'] != self.signature(path):
+            return None
+        return entry['digest']
+
+    def put(self, path, digest, signature=None):
+        with self._lock:
+            self._entries[path] = {'signature': signature or self.signature(path), 'digest': digest}
+
+    def save(self):
+        """Atomically write the cache, dropping entries for files that no longer exist"""
+        with self._lock:
+            self._entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+
+
+class ArtifactVerifier:
+    """Verify archives against catalog checksums, hashing uncached files in parallel processes"""
+
+    def __init__(self, cache_file, workers=None):
+        self.cache = ChecksumCache(cache_file)
+        self.workers = workers or os.cpu_count() or 1
+
+    def record(self, path, checksum):
+        """Remember a digest computed elsewhere (e.g. while an upload streamed in)"""
+        digest = parse_digest(checksum)
+        if digest and os.path.exists(path):
+            self.cache.put(os.path.realpath(path), digest)
+            self.cache.save()
+
+    def verify(self, path, checksum):
+        return self.verify_many([(path, checksum)])[0]
+
+    def verify_many(self, items):
+        """Verify (path, checksum) pairs; returns one result dict per pair, in order"""
+        results = []
+        pending = {}
+        for path, checksum in items:
+            result = {'path': path, 'expected': checksum, 'actual': None, 'cached': False}
+            results.append(result)
+            if not os.path.isfile(path):
+                result['status'] = 'missing'
+                continue
+
+            real_path = os.path.realpath(path)
+            digest = self.cache.get(real_path)
+            if digest is not None:
+                result['cached'] = True
+                result['actual'] = digest
+            else:
+                pending.setdefault(real_path, []).append(result)
+
+        if pending:
+            # Capture signatures before hashing so a file modified mid-hash is not cached as valid
+            signatures = {path: self.cache.signature(path) for path in pending}
+            paths = list(pending)
+            if len(paths) == 1:
+                digests = [hash_file(paths[0])]
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+                    digests = list(pool.map(hash_file, paths))
+
+            for path, digest in zip(paths, digests):
+                self.cache.put(path, digest, signatures[path])
+                for result in pending[path]:
+                    result['actual'] = digest
+            self.cache.save()
+
+        for result in results:
+            if result['actual'] is None:
+                continue
+            expected = parse_digest(result['expected'])
+            result['actual'] = f"sha256:{result['actual']}"
+            if expected is None:
+                result['status'] = 'unverified'
+            else:
+                result['status'] = 'ok' if result['actual'] == f'sha256:{expected}' else 'mismatch'
+        return results
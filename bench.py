@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+HTTP load and latency benchmark for the Java Installation Wizard API
+Starts the app in a child process with a mocked ansible-runner (no hosts are contacted) and drives it with
+concurrent clients:
+
+- index / config: GET `/` and `/api/config` for a fixed duration
+- install: a burst of POST `/api/install`, then the time until every accepted job finished
+- sse: many long-lived `/api/progress/<id>` subscribers, through Flask or the asyncio hub
+
+Each scenario reports throughput, p50/p95/p99 latency and the server's peak thread count and RSS.
+Results are written as JSON; `--compare` prints the change against an earlier result file.
+
+    python bench.py run --output before.json
+    python bench.py run --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = ('index', 'config', 'install', 'sse')
+
+# Metrics compared by --compare, and whether a higher value is better
+COMPARED_METRICS = {
+    'throughput_rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'errors': False,
+    'threads_peak': False,
+    'rss_peak_mb': False
+}
+
+
+# Server side: the app with a mocked ansible-runner
+
+def mock_runner_run(hosts, task_delay):
+    """An ansible_runner.run replacement emitting ok results for every task of the playbook on every host
+
+    When the run enables the json_events callback plugin, task events go to its socket as the plugin would
+    write them, and runner events only carry stdout (see installer.run_playbook).
+    """
+    from event_stream import SOCKET_ENV
+    from installer import count_playbook_tasks
+
+    def run(event_handler=None, cancel_callback=None, playbook=None, ident=None, envvars=None, **kwargs):
+        counter = 0
+        stream = None
+        if (envvars or {}).get(SOCKET_ENV):
+            stream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stream.connect(envvars[SOCKET_ENV])
+
+        def emit(event, **event_data):
+            nonlocal counter
+            counter += 1
+            now = datetime.now().isoformat()
+            stdout = event_data.pop('stdout', '')
+            if stream is not None:
+                record = {'event': event, 'task': event_data.get('task'), 'time': time.time()}
+                if 'host' in event_data:
+                    record.update(host=event_data['host'], action='command', start=time.time() - task_delay,
+                                  end=time.time(), duration=task_delay,
+                                  changed=bool(event_data.get('res', {}).get('changed')))
+                stream.sendall(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+                event_data = {}
+            if event_handler is not None:
+                event_handler({
+                    'uuid': f'{ident}-{counter}', 'counter': counter, 'event': event, 'created': now,
+                    'stdout': stdout,
+                    'event_data': dict(event_data, start=now, end=now, duration=task_delay) if event_data else {}
+                })
+
+        try:
+            if playbook is None:
+                # Ad-hoc module run (pre-flight probe): every host answers without a Java version
+                for host in hosts:
+                    emit('runner_on_ok', host=host, res={'stdout': ''}, stdout=f'{host} | SUCCESS')
+                return SimpleNamespace(status='successful', rc=0)
+
+            for task in range(count_playbook_tasks(playbook)):
+                if cancel_callback is not None and cancel_callback():
+                    return SimpleNamespace(status='canceled', rc=-1)
+                emit('playbook_on_task_start', task=f'task {task}', stdout=f'TASK [task {task}] ' + '*' * 40)
+                time.sleep(task_delay)
+                for host in hosts:
+                    emit('runner_on_ok', host=host, task=f'task {task}', res={'changed': True},
+                         stdout=f'changed: [{host}]')
+            emit('playbook_on_stats', stdout='PLAY RECAP ' + '*' * 40)
+            return SimpleNamespace(status='successful', rc=0)
+        finally:
+            if stream is not None:
+                stream.close()
+
+    return run
+
+
+def write_bench_config(data_dir, args):
+    """A catalog with one small real archive, so artifact verification runs as in production"""
+    installation_dir = os.path.join(data_dir, 'installation')
+    os.makedirs(installation_dir, exist_ok=True)
+    archive = os.path.join(installation_dir, 'bench-jdk.tar.gz')
+    with tarfile.open(archive, 'w:gz') as tar:
+        payload = os.path.join(data_dir, 'release')
+        with open(payload, 'w') as f:
+            f.write('JAVA_VERSION="21.0.2"\n')
+        tar.add(payload, arcname='jdk-21/release')
+    with open(archive, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    import toml
+    with open(os.path.join(data_dir, 'java_updater.toml'), 'w') as f:
+        toml.dump({
+            'installation-bench': {
+                'friendly_name': 'Benchmark JDK', 'version': '21.0.2', 'vendor': 'openjdk', 'os': 'linux',
+                'filename': 'installation/bench-jdk.tar.gz', 'checksum': f'sha256:{digest}'
+            },
+            'profile-bench': {'friendly_name': 'Benchmark profile', 'install_path': '/opt/java'},
+            'settings': {
+                'max_concurrent_installations': args.workers,
+                'max_queued_installations': args.max_queued,
+                'sse_port': args.sse_port,
+                'job_store': 'sqlite'
+            }
+        }, f)
+
+
+def serve(args):
+    """Run the app against the mocked runner until terminated"""
+    os.environ['JAVA_UPDATER_DIR'] = args.data_dir
+    write_bench_config(args.data_dir, args)
+    sys.path.insert(0, APP_DIR)
+
+    import ansible_runner
+    ansible_runner.run = mock_runner_run([f'bench-host-{i}' for i in range(args.hosts)], args.task_delay)
+
+    import logging
+    from werkzeug.serving import make_server
+    import app as application
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    if not os.path.isdir(os.path.join(APP_DIR, application.app.template_folder)):
+        # Checkouts keep index.html next to app.py; the image build places it under templates/
+        application.app.template_folder = APP_DIR
+    if args.sse_port:
+        application.sse_hub.start('127.0.0.1', args.sse_port)
+    server = make_server('127.0.0.1', args.port, application.app, threaded=True)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+
+
+# Client side
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latency_summary(latencies):
+    """Latency percentiles in milliseconds"""
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None
+    }
+
+
+def descendants(pid):
+    """Ids of every live process below `pid`"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields after it are fixed
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+class ProcessSampler:
+    """Peak thread count and resident memory of a process (and optionally its descendants), sampled from /proc"""
+
+    def __init__(self, pid, interval=0.05, include_children=False):
+        self.pid = pid
+        self.interval = interval
+        self.include_children = include_children
+        self.threads_peak = 0
+        self.rss_peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """(threads, bytes); across a process tree memory is the proportional set size, so forked workers
+        sharing pages are not counted twice"""
+        if not self.include_children:
+            return self._sample_process(self.pid)
+        threads = memory = 0
+        for pid in [self.pid] + descendants(self.pid):
+            process_threads, _ = self._sample_process(pid)
+            threads += process_threads
+            try:
+                with open(f'/proc/{pid}/smaps_rollup') as f:
+                    for line in f:
+                        if line.startswith('Pss:'):
+                            memory += int(line.split()[1]) * 1024
+                            break
+            except OSError:
+                pass
+        return threads, memory
+
+    @staticmethod
+    def _sample_process(pid):
+        threads = rss = 0
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('Threads:'):
+                        threads = int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss = int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return threads, rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            threads, rss = self.sample()
+            self.threads_peak = max(self.threads_peak, threads)
+            self.rss_peak = max(self.rss_peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.threads_peak, self.rss_peak = self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        return {'threads_peak': self.threads_peak, 'rss_peak_mb': round(self.rss_peak / 2 ** 20, 1)}
+
+
+async def http_request(port, method, path, body=None, timeout=30):
+    """One request on a fresh connection; returns (status, response body)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+        if body is not None:
+            head += f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+        writer.write(head.encode() + b'\r\n' + payload)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    _, _, data = rest.partition(b'\r\n\r\n')
+    return int(status_line.split()[1]), data
+
+
+def install_request(args):
+    return {
+        'installation': {'id': 'installation-bench'},
+        'profile': {'id': 'profile-bench'},
+        'ansible': {'os': 'linux', 'inventory': [f'bench-host-{i}' for i in range(args.hosts)]},
+        'preflight': args.preflight
+    }
+
+
+async def run_fixed_duration(port, path, args):
+    """`concurrency` clients issuing GET `path` back to back for `duration` seconds"""
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + args.duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = await http_request(port, 'GET', path)
+            except (OSError, asyncio.TimeoutError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.monotonic() - started
+    return dict(requests=len(latencies), errors=errors, throughput_rps=round(len(latencies) / elapsed, 1),
+                **latency_summary(latencies))
+
+
+async def submit_installs(port, count, args):
+    """POST `count` installations at once; returns (accepted ids, submit latencies, rejected, errors)"""
+    async def submit():
+        started = time.perf_counter()
+        try:
+            status, data = await http_request(port, 'POST', '/api/install', install_request(args))
+        except (OSError, asyncio.TimeoutError):
+            return None, None, time.perf_counter() - started
+        return status, data, time.perf_counter() - started
+
+    results = await asyncio.gather(*(submit() for _ in range(count)))
+    accepted = [json.loads(data)['installation_id'] for status, data, _ in results if status == 200]
+    latencies = [latency for status, _, latency in results if status == 200]
+    rejected = sum(1 for status, _, _ in results if status == 429)
+    errors = sum(1 for status, _, _ in results if status not in (200, 429))
+    return accepted, latencies, rejected, errors
+
+
+async def wait_for_jobs(port, job_ids, timeout):
+    """Poll the job API until every job is final; returns {job_id: seconds from submission to finish}"""
+    pending = set(job_ids)
+    finished = {}
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            status, data = await http_request(port, 'GET', f'/api/jobs/{job_id}')
+            job = json.loads(data) if status == 200 else {}
+            if job.get('finished_at'):
+                pending.discard(job_id)
+                finished[job_id] = (datetime.fromisoformat(job['finished_at']) -
+                                    datetime.fromisoformat(job['created_at'])).total_seconds()
+        await asyncio.sleep(0.2)
+    return finished
+
+
+async def run_install(port, args):
+    started = time.monotonic()
+    accepted, latencies, rejected, errors = await submit_installs(port, args.installs, args)
+    submitted = time.monotonic() - started
+    finished = await wait_for_jobs(port, accepted, args.timeout)
+    elapsed = time.monotonic() - started
+    completion = list(finished.values())
+    return dict(
+        requests=len(accepted), rejected=rejected, errors=errors + len(accepted) - len(finished),
+        throughput_rps=round(len(accepted) / submitted, 1) if submitted else None,
+        jobs_per_second=round(len(finished) / elapsed, 2),
+        completion_p50_s=round(percentile(completion, 0.50), 2) if completion else None,
+        completion_p99_s=round(percentile(completion, 0.99), 2) if completion else None,
+        **latency_summary(latencies)
+    )
+
+
+async def subscribe(port, installation_id, timeout):
+    """Follow one progress stream to its end; returns (seconds to the first frame, frames, completed)"""
+    started = time.perf_counter()
+    first_frame = None
+    frames = 0
+    completed = False
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET /api/progress/{installation_id} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+        await writer.drain()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            line = await asyncio.wait_for(reader.readline(), deadline - time.monotonic())
+            if not line:
+                break
+            if line.startswith(b'id: '):
+                frames += 1
+                if first_frame is None:
+                    first_frame = time.perf_counter() - started
+            elif line.startswith(b'data: ') and b'"completed": true' in line:
+                completed = True
+                break
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+    return first_frame, frames, completed
+
+
+async def run_sse(port, sse_port, args):
+    target = sse_port if args.sse_via == 'hub' else port
+    accepted, _, _, _ = await submit_installs(port, args.sse_installs, args)
+    if not accepted:
+        return dict(requests=0, errors=args.subscribers)
+    started = time.monotonic()
+    results = await asyncio.gather(*(
+        subscribe(target, accepted[i % len(accepted)], args.timeout) for i in range(args.subscribers)
+    ))
+    elapsed = time.monotonic() - started
+    first_frames = [first for first, _, _ in results if first is not None]
+    frames = sum(count for _, count, _ in results)
+    completed = sum(1 for _, _, done in results if done)
+    return dict(
+        requests=len(results), errors=len(results) - completed, via=args.sse_via,
+        frames=frames, throughput_rps=round(frames / elapsed, 1),
+        **latency_summary(first_frames)
+    )
+
+
+def wait_for_server(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Benchmark server exited with status {process.returncode}')
+        try:
+            status, _ = asyncio.run(http_request(port, 'GET', '/api/queue', timeout=2))
+            if status == 200:
+                return
+        except (OSError, asyncio.TimeoutError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('Benchmark server did not start')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    data_dir = tempfile.mkdtemp(prefix='java-installer-bench-')
+    port = free_port()
+    sse_port = free_port()
+    command = [
+        sys.executable, os.path.abspath(__file__), 'serve', '--data-dir', data_dir, '--port', str(port),
+        '--sse-port', str(sse_port), '--hosts', str(args.hosts), '--task-delay', str(args.task_delay),
+        '--workers', str(args.workers), '--max-queued', str(args.max_queued)
+    ]
+    process = subprocess.Popen(command)
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('command', 'output', 'compare')},
+        'scenarios': {}
+    }
+    try:
+        wait_for_server(port, process)
+        for name in scenarios:
+            with ProcessSampler(process.pid) as sampler:
+                if name == 'index':
+                    result = asyncio.run(run_fixed_duration(port, '/', args))
+                elif name == 'config':
+                    result = asyncio.run(run_fixed_duration(port, '/api/config', args))
+                elif name == 'install':
+                    result = asyncio.run(run_install(port, args))
+                else:
+                    result = asyncio.run(run_sse(port, sse_port, args))
+            result.update(sampler.report())
+            results['scenarios'][name] = result
+            print(f"{name:8} " + ' '.join(f'{key}={value}' for key, value in result.items()), flush=True)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return results
+
+
+def compare(before, after):
+    """Print the relative change of each compared metric; positive means better"""
+    print(f"Compared with {before.get('revision')} ({before.get('timestamp')})")
+    for name, result in after['scenarios'].items():
+        previous = before.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100 * (1 if higher_is_better else -1)
+            changes.append(f'{metric} {old} -> {new} ({change:+.1f}%)')
+        print(f"{name:8} " + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Java Installation Wizard API against a mocked runner')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='start a server and run the benchmark scenarios')
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of ' + ', '.join(SCENARIOS))
+    run_parser.add_argument('--concurrency', type=int, default=16, help='clients for the index and config scenarios')
+    run_parser.add_argument('--duration', type=float, default=10, help='seconds per index and config scenario')
+    run_parser.add_argument('--installs', type=int, default=50, help='installations in the install burst')
+    run_parser.add_argument('--subscribers', type=int, default=200, help='progress stream subscribers')
+    run_parser.add_argument('--sse-installs', type=int, default=5, help='installations the subscribers follow')
+    run_parser.add_argument('--sse-via', choices=['flask', 'hub'], default='flask', help='server of the progress streams')
+    run_parser.add_argument('--output', help='write the results to this JSON file')
+    run_parser.add_argument('--compare', help='print the change against this earlier results file')
+    run_parser.add_argument('--timeout', type=float, default=300, help='longest wait for jobs and streams')
+
+    serve_parser = commands.add_parser('serve', help='run the app against the mocked runner (used by run)')
+    serve_parser.add_argument('--data-dir', required=True)
+    serve_parser.add_argument('--port', type=int, default=5000)
+    serve_parser.add_argument('--sse-port', type=int, default=0)
+
+    for sub in (run_parser, serve_parser):
+        sub.add_argument('--hosts', type=int, default=10, help='mocked hosts per installation')
+        sub.add_argument('--task-delay', type=float, default=0.05, help='mocked seconds per playbook task')
+        sub.add_argument('--workers', type=int, default=5, help='max_concurrent_installations')
+        sub.add_argument('--max-queued', type=int, default=100, help='max_queued_installations')
+    run_parser.add_argument('--preflight', action='store_true', help='include the mocked pre-flight probe')
+    serve_parser.set_defaults(preflight=False)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
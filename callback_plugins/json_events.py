@@ -0,0 +1,118 @@
+"""
+Compact task events for the Java installer (see event_stream.py)
+Writes one short JSON line per task start, host result and play recap to the Unix socket the installer listens
+on. Lines carry the task, host, status, changed flag and timing only: result payloads (module output, facts,
+diffs) never leave the Ansible process, so the cost per event does not grow with what a module returns.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: json_events
+    type: notification
+    short_description: stream compact task events to the Java installer
+    description:
+        - Sends line-delimited JSON task events to a Unix socket, without module result payloads.
+    author: java installer maintainers
+    requirements:
+      - enabled with ANSIBLE_CALLBACKS_ENABLED
+    options:
+      socket:
+        description: Path of the Unix socket the installer listens on; nothing is sent when unset.
+        type: str
+        env:
+          - name: JAVA_INSTALLER_EVENT_SOCKET
+'''
+
+import json
+import os
+import socket
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'notification'
+    CALLBACK_NAME = 'json_events'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display=display)
+        self._socket = None
+        self._failed = False
+        self._playbook = ''
+        # {(host, task uuid): start time}; entries are removed by the host's result
+        self._started = {}
+
+    def _send(self, record):
+        if self._socket is None:
+            if self._failed:
+                return
+            path = self.get_option('socket')
+            if not path:
+                self._failed = True
+                return
+            try:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.connect(path)
+            except OSError as e:
+                self._socket = None
+                self._failed = True
+                self._display.warning(u'json_events: cannot connect to %s: %s' % (path, e))
+                return
+        try:
+            self._socket.sendall(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+        except OSError as e:
+            self._socket.close()
+            self._socket = None
+            self._failed = True
+            self._display.warning(u'json_events: event stream closed: %s' % e)
+
+    def _result(self, event, result, ignore_errors=False):
+        end = time.time()
+        host = result._host.get_name()
+        task = result._task
+        start = self._started.pop((host, task._uuid), end)
+        record = {
+            'event': event,
+            'host': host,
+            'task': task.get_name(),
+            'action': task.action,
+            'changed': bool(result._result.get('changed')),
+            'start': start,
+            'end': end,
+            'duration': end - start
+        }
+        if ignore_errors:
+            record['ignore_errors'] = True
+        self._send(record)
+
+    def v2_playbook_on_start(self, playbook):
+        self._playbook = os.path.basename(playbook._file_name)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._send({'event': 'playbook_on_task_start', 'task': task.get_name(), 'time': time.time()})
+
+    def v2_runner_on_start(self, host, task):
+        self._started[(host.get_name(), task._uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        self._result('runner_on_ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._result('runner_on_failed', result, ignore_errors)
+
+    def v2_runner_on_skipped(self, result):
+        self._result('runner_on_skipped', result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._result('runner_on_unreachable', result)
+
+    def v2_playbook_on_stats(self, stats):
+        self._send({'event': 'playbook_on_stats', 'playbook': self._playbook, 'time': time.time()})
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
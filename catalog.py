@@ -0,0 +1,151 @@
+"""
+Installation and profile catalog
+Typed records for the installation-N and profile-N tables of java_updater.toml, with lookup indexes
+"""
+
+from collections import defaultdict
+
+INSTALLATION_PREFIX = 'installation-'
+PROFILE_PREFIX = 'profile-'
+
+
+def major_version(version):
+    """Return the Java major version of a version string ('1.8.0_401' and '8.0.401' are both '8')"""
+    parts = str(version).split('.')
+    if parts[0] == '1' and len(parts) > 1:
+        return parts[1]
+    return parts[0]
+
+
+class Installation:
+    """An installation package entry"""
+
+    __slots__ = ('id', 'order', 'friendly_name', 'version', 'os', 'filename', 'vendor',
+                 'install_command', 'checksum', 'size_mb')
+
+    def __init__(self, entry_id, order, entry):
+        self.id = entry_id
+        self.order = order
+        self.friendly_name = entry.get('friendly_name', entry_id)
+        self.version = str(entry.get('version', ''))
+        self.os = entry.get('os', '').lower()
+        self.filename = entry.get('filename', '')
+        self.vendor = entry.get('vendor', '').lower()
+        self.install_command = entry.get('install_command', '')
+        self.checksum = entry.get('checksum', '')
+        self.size_mb = entry.get('size_mb')
+
+    @property
+    def major_version(self):
+        return major_version(self.version)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'order'}
+
+
+class Profile:
+    """An installation profile entry"""
+
+    __slots__ = ('id', 'order', 'friendly_name', 'install_path', 'backup_enabled', 'backup_path',
+                 'base_path', 'symlink_enabled', 'symlink_path', 'environment_vars', 'os_compatibility')
+
+    def __init__(self, entry_id, order, entry):
+        self.id = entry_id
+        self.order = order
+        self.friendly_name = entry.get('friendly_name', entry_id)
+        self.install_path = entry.get('install_path', '')
+        self.backup_enabled = bool(entry.get('backup_enabled', False))
+        self.backup_path = entry.get('backup_path', '')
+        self.base_path = entry.get('base_path', '')
+        self.symlink_enabled = bool(entry.get('symlink_enabled', False))
+        self.symlink_path = entry.get('symlink_path', '')
+        self.environment_vars = tuple(entry.get('environment_vars', ()))
+        self.os_compatibility = tuple(os_name.lower() for os_name in entry.get('os_compatibility', ()))
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__ if name != 'order'}
+        data['environment_vars'] = list(self.environment_vars)
+        data['os_compatibility'] = list(self.os_compatibility)
+        return data
+
+
+# Fields that can be set on catalog entries through the API
+INSTALLATION_FIELDS = tuple(name for name in Installation.__slots__ if name not in ('id', 'order'))
+PROFILE_FIELDS = tuple(name for name in Profile.__slots__ if name not in ('id', 'order'))
+
+# JSON types accepted for each field; TOML has no null, so None is never accepted
+FIELD_TYPES = {
+    'version': (str, int, float),
+    'size_mb': (int, float),
+    'backup_enabled': bool,
+    'symlink_enabled': bool,
+    'environment_vars': list,
+    'os_compatibility': list
+}
+LIST_FIELDS = ('environment_vars', 'os_compatibility')
+
+
+def validate_fields(fields):
+    """Raise ValueError for field values of the wrong type; fields not in FIELD_TYPES are strings"""
+    for name, value in fields.items():
+        expected = FIELD_TYPES.get(name, str)
+        # bool is an int subclass, but not a number here
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ValueError(f'{name} must not be null' if value is None else f'Invalid value for {name}')
+        if name in LIST_FIELDS and not all(isinstance(item, str) for item in value):
+            raise ValueError(f'{name} must be a list of strings')
+
+
+class Catalog:
+    """Indexed view of the installations and profiles in a parsed configuration"""
+
+    def __init__(self, config):
+        self.installations = {}
+        self.profiles = {}
+        self._installation_index = {'os': defaultdict(set), 'vendor': defaultdict(set), 'version': defaultdict(set)}
+        self._profile_index = {'compatible_with': defaultdict(set)}
+
+        for order, (entry_id, entry) in enumerate(config.items()):
+            if not isinstance(entry, dict):
+                continue
+            if entry_id.startswith(INSTALLATION_PREFIX):
+                installation = Installation(entry_id, order, entry)
+                self.installations[entry_id] = installation
+                self._installation_index['os'][installation.os].add(entry_id)
+                self._installation_index['vendor'][installation.vendor].add(entry_id)
+                self._installation_index['version'][installation.major_version].add(entry_id)
+            elif entry_id.startswith(PROFILE_PREFIX):
+                profile = Profile(entry_id, order, entry)
+                self.profiles[entry_id] = profile
+                for os_name in profile.os_compatibility:
+                    self._profile_index['compatible_with'][os_name].add(entry_id)
+
+    @staticmethod
+    def _query(records, indexes, filters):
+        """Intersect the index buckets for each filter, smallest bucket first"""
+        buckets = []
+        for field, value in filters.items():
+            if value is None or field not in indexes:
+                continue
+            buckets.append(indexes[field].get(value.lower(), set()))
+        if not buckets:
+            return sorted(records.values(), key=lambda record: record.order)
+
+        buckets.sort(key=len)
+        matches = set(buckets[0]).intersection(*buckets[1:])
+        return sorted((records[entry_id] for entry_id in matches), key=lambda record: record.order)
+
+    def find_installations(self, os=None, vendor=None, version=None):
+        """Return installations matching every given filter; `version` matches a major or a version prefix"""
+        filters = {'os': os, 'vendor': vendor}
+        if version is not None:
+            filters['version'] = major_version(version)
+        results = self._query(self.installations, self._installation_index, filters)
+        if version is not None and version != major_version(version):
+            results = [installation for installation in results
+                       if installation.version == version or installation.version.startswith(version + '.')]
+        return results
+
+    def find_profiles(self, compatible_with=None):
+        """Return profiles compatible with the given OS"""
+        return self._query(self.profiles, self._profile_index, {'compatible_with': compatible_with})
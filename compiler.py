@@ -0,0 +1,206 @@
+"""
+Playbook compiler
+Renders an installation and profile into one play per inventory group with the platform's tasks only,
+so hosts do not evaluate (and skip) the other platforms' tasks or gather facts to tell them apart.
+Compiled playbooks are cached on disk under the hash of their inputs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import yaml
+
+from artifacts import parse_digest
+from installer import OS_GROUPS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the generated tasks change so cached playbooks are rendered again
+COMPILER_VERSION = 3
+
+# Compiled playbooks kept on disk; the least recently used ones are removed beyond this
+MAX_CACHED_PLAYBOOKS = 64
+
+POSIX_OWNER_GROUPS = {'linux': 'root', 'aix': 'system'}
+
+
+def transfer_tasks(package):
+    """Stat the staged archive and send it only when it does not match the catalog checksum"""
+    dest = f'/tmp/{package}'
+    return [
+        {'name': 'Check for an existing installation file',
+         'stat': {'path': dest, 'get_checksum': "{{ java_installation_checksum | length > 0 }}",
+                  'checksum_algorithm': 'sha256'},
+         'register': 'java_archive_stat'},
+        {'name': 'Compare existing installation file with the catalog checksum',
+         'set_fact': {'java_archive_present': "{{ java_installation_checksum | length > 0 and "
+                                              "java_archive_stat.stat.checksum | default('') == java_installation_checksum }}"}},
+        # synchronize runs rsync on both ends; the controller image may not have it
+        {'name': 'Check for rsync on the controller', 'shell': 'command -v rsync', 'register': 'java_controller_rsync',
+         'delegate_to': 'localhost', 'run_once': True, 'become': False, 'changed_when': False, 'failed_when': False},
+        {'name': 'Check for rsync on target', 'shell': 'command -v rsync', 'register': 'java_rsync',
+         'changed_when': False, 'failed_when': False, 'when': 'not java_archive_present'},
+        # --partial keeps an interrupted copy as the basis of the next delta transfer; a stale file of the
+        # same name is rewritten rather than appended to
+        {'name': 'Transfer Java installation file to target, resuming partial copies',
+         'synchronize': {'src': '{{ java_installation_file }}', 'dest': dest,
+                         'rsync_opts': ['--partial', '--chmod=F644']},
+         'when': 'not java_archive_present and java_rsync.rc == 0 and java_controller_rsync.rc == 0'},
+        {'name': 'Copy Java installation file to target',
+         'copy': {'src': '{{ java_installation_file }}', 'dest': dest, 'mode': '0644'},
+         'when': 'not java_archive_present and (java_rsync.rc != 0 or java_controller_rsync.rc != 0)'}
+    ]
+
+
+def posix_tasks(platform, package, profile, staged):
+    owner_group = POSIX_OWNER_GROUPS[platform]
+    tasks = [
+        {'name': 'Create installation directory',
+         'file': {'path': '{{ install_path }}', 'state': 'directory', 'owner': 'root', 'group': owner_group,
+                  'mode': '0755'}}
+    ]
+    if profile.get('backup_enabled'):
+        tasks.append({'name': 'Backup existing Java installation',
+                      'archive': {'path': '{{ install_path }}',
+                                  'dest': "{{ install_path }}_backup_{{ now().strftime('%s') }}.tar.gz"},
+                      'ignore_errors': True})
+    if not staged:
+        tasks.extend(transfer_tasks(package))
+    if package.endswith('.tar.gz'):
+        tasks.append({'name': 'Extract Java installation',
+                      'unarchive': {'src': f'/tmp/{package}', 'dest': '{{ install_path }}', 'remote_src': True}})
+    tasks.extend([
+        {'name': 'Set JAVA_HOME environment variable',
+         'lineinfile': {'path': '/etc/environment', 'regexp': '^JAVA_HOME=', 'line': 'JAVA_HOME={{ install_path }}',
+                        'create': True}},
+        {'name': 'Update PATH environment variable',
+         'lineinfile': {'path': '/etc/environment', 'line': 'PATH=$PATH:{{ install_path }}/bin', 'create': True}}
+    ])
+    if profile.get('symlink_enabled'):
+        tasks.append({'name': 'Create symlink for Java executable',
+                      'file': {'src': '{{ install_path }}/bin/java', 'dest': profile.get('symlink_path') or '/usr/bin/java',
+                               'state': 'link', 'force': True}})
+    tasks.extend([
+        {'name': 'Verify Java installation', 'command': '{{ install_path }}/bin/java -version',
+         'register': 'java_version_output', 'changed_when': False},
+        {'name': 'Display Java version', 'debug': {'msg': '{{ java_version_output.stderr }}'}}
+    ])
+    return tasks
+
+
+def windows_tasks(package, profile, staged):
+    dest = f'C:\\temp\\{package}'
+    tasks = [
+        {'name': 'Create installation directory', 'win_file': {'path': '{{ install_path }}', 'state': 'directory'}}
+    ]
+    if profile.get('backup_enabled'):
+        tasks.append({'name': 'Backup existing Java installation',
+                      'win_shell': 'Compress-Archive -Path "{{ install_path }}" -DestinationPath '
+                                   "\"{{ install_path }}_backup_{{ now().strftime('%s') }}.zip\"",
+                      'ignore_errors': True})
+    if not staged:
+        tasks.extend([
+            {'name': 'Check for an existing installation file',
+             'win_stat': {'path': dest, 'get_checksum': "{{ java_installation_checksum | length > 0 }}",
+                          'checksum_algorithm': 'sha256'},
+             'register': 'java_archive_stat'},
+            {'name': 'Copy Java installation file to target',
+             'win_copy': {'src': '{{ java_installation_file }}', 'dest': dest},
+             'when': "java_installation_checksum | length == 0 or "
+                     "java_archive_stat.stat.checksum | default('') | lower != java_installation_checksum"}
+        ])
+    if package.endswith('.zip'):
+        tasks.append({'name': 'Extract Java installation',
+                      'win_unzip': {'src': dest, 'dest': '{{ install_path }}'}})
+    tasks.extend([
+        {'name': 'Set JAVA_HOME environment variable',
+         'win_environment': {'name': 'JAVA_HOME', 'value': '{{ install_path }}', 'level': 'machine'}},
+        {'name': 'Verify Java installation', 'win_shell': '{{ install_path }}\\bin\\java.exe -version',
+         'register': 'java_version_output'},
+        {'name': 'Display Java version', 'debug': {'msg': '{{ java_version_output.stdout }}'}}
+    ])
+    return tasks
+
+
+def compiled_groups(installation):
+    """Inventory groups the installation applies to: its own OS, or every group when it names none"""
+    group = OS_GROUPS.get(str(installation.get('os', '')).lower())
+    return [group] if group else list(OS_GROUPS.values())
+
+
+def compile_plays(installation, profile, updater_dir, staged=False):
+    """Return one play per inventory group with the variables fixed and the platform's tasks only"""
+    package = os.path.basename(installation.get('filename', ''))
+    play_vars = {
+        'java_installation_file': os.path.join(updater_dir, installation.get('filename', '')),
+        'java_installation_checksum': parse_digest(installation.get('checksum')) or '',
+        'java_version': str(installation.get('version', '')),
+        'java_vendor': installation.get('vendor', 'openjdk'),
+        'install_path': profile.get('install_path', '/opt/java')
+    }
+
+    plays = []
+    for platform, group in OS_GROUPS.items():
+        if group not in compiled_groups(installation):
+            continue
+        if platform == 'windows':
+            tasks = windows_tasks(package, profile, staged)
+        else:
+            tasks = posix_tasks(platform, package, profile, staged)
+        plays.append({
+            'name': f'Install Java on {group}',
+            'hosts': group,
+            'become': platform != 'windows',
+            # Nothing below branches on facts, so the play skips gathering entirely
+            'gather_facts': False,
+            'vars': play_vars,
+            'tasks': tasks
+        })
+    return plays
+
+
+def cache_key(installation, profile, updater_dir, staged):
+    payload = json.dumps([COMPILER_VERSION, installation, profile, updater_dir, staged], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PlaybookCompiler:
+    """Compile and cache per-group playbooks under `cache_dir/<input hash>.yml`"""
+
+    def __init__(self, cache_dir, updater_dir, max_entries=MAX_CACHED_PLAYBOOKS):
+        self.cache_dir = cache_dir
+        self.updater_dir = updater_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def compile(self, installation, profile, staged=False):
+        """Return the path of the compiled playbook, rendering it only when the inputs are new"""
+        path = os.path.join(self.cache_dir, f'{cache_key(installation, profile, self.updater_dir, staged)}.yml')
+        if os.path.exists(path):
+            # Refresh the mtime so pruning drops the least recently used playbooks first
+            os.utime(path)
+            return path
+
+        plays = compile_plays(installation, profile, self.updater_dir, staged)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            yaml.safe_dump(plays, f, sort_keys=False)
+        os.replace(temp_path, path)
+        logger.info(f"Compiled playbook {os.path.basename(path)} for {installation.get('filename')}")
+        self._prune()
+        return path
+
+    def _prune(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.yml')),
+            key=lambda entry: entry.stat().st_mtime_ns,
+            reverse=True
+        )
+        for entry in entries[self.max_entries:]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,165 @@
+"""
+Configuration store for java_updater.toml
+Caches the parsed configuration and its JSON serialization until the file changes on disk,
+and applies catalog edits under a file lock with atomic replace
+"""
+
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+from collections import namedtuple
+
+import toml
+
+from catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['config', 'body', 'etag', 'generation'])
+
+
+class EntryNotFound(Exception):
+    """Raised when a catalog entry does not exist"""
+
+
+class PreconditionFailed(Exception):
+    """Raised when a write was based on a configuration version that is no longer current"""
+
+
+class ConfigStore:
+    """Parsed configuration cache, invalidated by the file's inode, size and mtime, with locked atomic writes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # (stat signature, snapshot) replaced as a single reference so lock-free readers stay consistent
+        self._current = (None, None)
+        self._catalog = (None, None)
+
+    @property
+    def generation(self):
+        """Version of the configuration file, the same in every process reading it (see _install)"""
+        return self.get().generation
+
+    def _stat_signature(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _install(self, config, signature):
+        body = json.dumps(config, sort_keys=True, separators=(',', ':'))
+        etag = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+        # The file's mtime: it grows with every write, and every worker sharing the file sees the same value
+        snapshot = ConfigSnapshot(config, body, etag, signature[2])
+        self._current = (signature, snapshot)
+        return snapshot
+
+    def get(self):
+        """Return the current ConfigSnapshot, re-parsing the file only if it changed"""
+        signature = self._stat_signature()
+        cached_signature, snapshot = self._current
+        if snapshot is not None and signature == cached_signature:
+            return snapshot
+
+        with self._lock:
+            # Another request may have reloaded while we waited for the lock
+            cached_signature, snapshot = self._current
+            if snapshot is not None and signature == cached_signature:
+                return snapshot
+
+            snapshot = self._load(signature)
+            logger.info(f"Loaded configuration from {self.path}")
+            return snapshot
+
+    def _load(self, signature):
+        with open(self.path, 'r') as f:
+            config = toml.load(f)
+        return self._install(config, signature)
+
+    def catalog(self):
+        """Return the indexed Catalog for the current configuration"""
+        snapshot = self.get()
+        cached_snapshot, catalog = self._catalog
+        if cached_snapshot is snapshot:
+            return catalog
+
+        catalog = Catalog(snapshot.config)
+        self._catalog = (snapshot, catalog)
+        return catalog
+
+    def _write(self, config):
+        """Write the configuration to a temporary file and atomically move it into place"""
+        directory = os.path.dirname(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.java_updater.', suffix='.tmp')
+        try:
+            os.fchmod(fd, stat.S_IMODE(os.stat(self.path).st_mode))
+            with os.fdopen(fd, 'w') as f:
+                toml.dump(config, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def mutate(self, mutator, expected_etag=None):
+        """Apply `mutator` to a copy of the configuration and persist it; returns (snapshot, result)"""
+        with self._write_lock, open(self.lock_path, 'a') as lock_file:
+            # The file lock serializes writers in other processes, the thread lock those in this one
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                snapshot = self.get()
+                if expected_etag is not None and expected_etag != snapshot.etag:
+                    raise PreconditionFailed('Configuration has changed since it was read')
+
+                config = copy.deepcopy(snapshot.config)
+                result = mutator(config)
+                self._write(config)
+                # Parse what was written rather than reuse `config`, so this process computes the same ETag as
+                # every other one reading the file
+                with self._lock:
+                    snapshot = self._load(self._stat_signature())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        logger.info(f"Configuration updated to generation {snapshot.generation}")
+        return snapshot, result
+
+    def add_entry(self, prefix, fields, expected_etag=None):
+        """Add a catalog entry under the next free `<prefix>N` key and return its id"""
+        def add(config):
+            pattern = re.compile(re.escape(prefix) + r'(\d+)')
+            numbers = [int(match.group(1)) for match in map(pattern.fullmatch, config) if match]
+            entry_id = f"{prefix}{max(numbers, default=0) + 1}"
+            config[entry_id] = dict(fields)
+            return entry_id
+
+        return self.mutate(add, expected_etag)
+
+    def update_entry(self, entry_id, fields, expected_etag=None):
+        """Merge `fields` into an existing catalog entry"""
+        def update(config):
+            if entry_id not in config:
+                raise EntryNotFound(entry_id)
+            config[entry_id].update(fields)
+            return entry_id
+
+        return self.mutate(update, expected_etag)
+
+    def delete_entry(self, entry_id, expected_etag=None):
+        """Remove a catalog entry"""
+        def delete(config):
+            if config.pop(entry_id, None) is None:
+                raise EntryNotFound(entry_id)
+            return entry_id
+
+        return self.mutate(delete, expected_etag)
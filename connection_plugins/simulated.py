@@ -0,0 +1,199 @@
+"""
+Simulated connection for scale testing (see fleet.py)
+Nothing runs on a target: module results are synthesized on the controller after the host's configured
+latency, file transfers take size / bandwidth seconds, and failures are injected per host and module.
+Paths created by file, copy and unarchive are recorded as empty markers under sim_state_dir.
+Everything the controller does for a real host (templating, action plugins, forks, events) still happens.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: simulated
+    short_description: simulate a remote host without contacting it
+    description:
+        - Synthesizes module results after a per-host delay, for measuring controller-side cost at scale.
+    author: java installer maintainers
+    extends_documentation_fragment:
+        - connection_pipelining
+    options:
+      sim_latency:
+        description: Seconds each command round trip takes.
+        type: float
+        default: 0.05
+        vars:
+          - name: sim_latency
+      sim_bandwidth:
+        description: Bytes per second for file transfers.
+        type: float
+        default: 12500000
+        vars:
+          - name: sim_bandwidth
+      sim_failure_rate:
+        description: Probability that a module fails on this host.
+        type: float
+        default: 0
+        vars:
+          - name: sim_failure_rate
+      sim_unreachable_rate:
+        description: Probability that the host is unreachable when a module runs.
+        type: float
+        default: 0
+        vars:
+          - name: sim_unreachable_rate
+      sim_java_version:
+        description: Version reported by C(java -version); empty when Java is not installed.
+        type: str
+        default: ''
+        vars:
+          - name: sim_java_version
+      sim_installed_version:
+        description: Version reported by C(java -version) modules run by the playbook, after it installed Java.
+        type: str
+        default: ''
+        vars:
+          - name: java_version
+      sim_state_dir:
+        description: Directory recording the paths modules created on each simulated host, so later stat calls see them.
+        type: str
+        default: /tmp/simulated
+        vars:
+          - name: sim_state_dir
+      sim_seed:
+        description: Seed of the failure injection; the same seed fails the same hosts and modules.
+        type: int
+        default: 0
+        vars:
+          - name: sim_seed
+'''
+
+import ast
+import json
+import os
+import random
+import re
+import time
+
+from ansible.errors import AnsibleConnectionFailure
+from ansible.plugins.connection import ConnectionBase
+
+TMP_PATTERN = re.compile(r'(ansible-tmp-[\d.]+-\d+-\d+)')
+MODULE_PATTERN = re.compile(r"mod_name='ansible\.(?:legacy\.|builtin\.)?(?:modules\.)?([\w.]+)'")
+PARAMS_PATTERN = re.compile(r'^\s*ANSIBALLZ_PARAMS = (.*)$', re.MULTILINE)
+SCRIPT_PATTERN = re.compile(r'AnsiballZ_(\w+)\.py')
+
+
+class Connection(ConnectionBase):
+    ''' Simulated remote host '''
+
+    transport = 'simulated'
+    has_pipelining = True
+
+    def _connect(self):
+        self._connected = True
+        return self
+
+    @property
+    def host(self):
+        return self._play_context.remote_addr
+
+    def _delay(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _chance(self, option, key):
+        rate = float(self.get_option(option) or 0)
+        return rate > 0 and random.Random(f"{self.get_option('sim_seed')}-{self.host}-{key}").random() < rate
+
+    def exec_command(self, cmd, in_data=None, sudoable=True):
+        super(Connection, self).exec_command(cmd, in_data=in_data, sudoable=sudoable)
+        self._delay(float(self.get_option('sim_latency')))
+
+        payload = in_data.decode('utf-8', errors='replace') if isinstance(in_data, bytes) else in_data or ''
+        module = MODULE_PATTERN.search(payload)
+        script = SCRIPT_PATTERN.search(cmd)
+        if module or script:
+            name = module.group(1) if module else script.group(1)
+            if self._chance('sim_unreachable_rate', name):
+                raise AnsibleConnectionFailure(f'Simulated host {self.host} is unreachable')
+            return self._module_result(name.rsplit('.', 1)[-1], self._module_args(payload))
+
+        tmp = TMP_PATTERN.search(cmd)
+        if tmp and 'mkdir' in cmd:
+            return 0, f'{tmp.group(1)}={self._state_path("/tmp/" + tmp.group(1))}\n'.encode(), b''
+        if cmd.strip().startswith('echo ~'):
+            return 0, b'/root\n', b''
+        if '-version' in cmd:
+            return self._java_version()
+        return 0, b'', b''
+
+    def _state_path(self, path):
+        return os.path.join(self.get_option('sim_state_dir'), self.host, str(path).lstrip('/'))
+
+    def _record(self, path, directory=False):
+        state_path = self._state_path(path)
+        os.makedirs(state_path if directory else os.path.dirname(state_path), exist_ok=True)
+        if not directory and not os.path.isdir(state_path):
+            open(state_path, 'a').close()
+
+    def _stat(self, path):
+        state_path = self._state_path(path)
+        if not os.path.exists(state_path):
+            return {'exists': False}
+        directory = os.path.isdir(state_path)
+        return {'exists': True, 'isdir': directory, 'isreg': not directory, 'path': path, 'mode': '0755'}
+
+    def _module_args(self, payload):
+        match = PARAMS_PATTERN.search(payload)
+        if not match:
+            return {}
+        try:
+            params = ast.literal_eval(match.group(1))
+            return json.loads(params).get('ANSIBLE_MODULE_ARGS', {})
+        except (ValueError, SyntaxError):
+            return {}
+
+    def _java_version(self):
+        version = self.get_option('sim_java_version')
+        if not version:
+            return 127, b'', b'java: command not found\n'
+        return 0, f'openjdk version "{version}"\nOpenJDK Runtime Environment\n'.encode(), b''
+
+    def _module_result(self, name, args):
+        if self._chance('sim_failure_rate', name):
+            result = {'failed': True, 'msg': f'Simulated {name} failure on {self.host}'}
+        elif name == 'stat':
+            result = {'changed': False, 'stat': self._stat(args.get('path', ''))}
+        elif name in ('command', 'shell'):
+            raw = str(args.get('_raw_params', ''))
+            rc, stdout, stderr = 0, b'', b''
+            if '-version' in raw:
+                stderr = f'openjdk version "{self.get_option("sim_installed_version")}"'.encode()
+            elif raw.startswith('command -v'):
+                # Simulated hosts have no optional tools, so the fallback paths run
+                rc, stderr = 1, b''
+            result = {'changed': True, 'rc': rc, 'stdout': stdout.decode(), 'stderr': stderr.decode(), 'cmd': raw}
+        else:
+            if name == 'file' and args.get('state') == 'directory':
+                self._record(args.get('path'), directory=True)
+            elif name in ('copy', 'unarchive') and args.get('dest'):
+                self._record(args['dest'], directory=name == 'unarchive')
+            result = {'changed': True}
+        result['invocation'] = {'module_args': args}
+        return 0, json.dumps(result).encode(), b''
+
+    def put_file(self, in_path, out_path):
+        super(Connection, self).put_file(in_path, out_path)
+        try:
+            size = os.path.getsize(in_path)
+        except OSError:
+            size = 0
+        self._delay(float(self.get_option('sim_latency')) + size / float(self.get_option('sim_bandwidth')))
+
+    def fetch_file(self, in_path, out_path):
+        super(Connection, self).fetch_file(in_path, out_path)
+        self._delay(float(self.get_option('sim_latency')))
+
+    def close(self):
+        self._connected = False
@@ -0,0 +1,201 @@
+"""
+Tiered artifact distribution
+The controller copies the archive to one seed host per inventory group and subnet; every host that
+has the archive then serves it over HTTP to up to `fanout` peers in the next wave, so the number of
+sources grows with each wave and total distribution time grows logarithmically with fleet size
+"""
+
+import ipaddress
+import os
+from collections import OrderedDict
+
+import yaml
+from ansible.inventory.manager import InventoryManager
+from ansible.parsing.dataloader import DataLoader
+
+from artifacts import parse_digest
+from installer import OS_GROUPS
+
+# Directory on POSIX hosts that is staged into and served over HTTP (never /tmp itself)
+SERVE_DIR = '/tmp/jiw-dist'
+
+
+def parse_distribution(options):
+    """Validate distribution options from an install request; returns None when tiered distribution is off"""
+    if not options:
+        return None
+    if not isinstance(options, dict):
+        raise ValueError('distribution must be an object')
+    if not options.get('enabled', True):
+        return None
+    fanout = int(options.get('fanout', 2))
+    if fanout < 1:
+        raise ValueError('fanout must be at least 1')
+    return {'fanout': fanout}
+
+
+def can_serve(group):
+    """Windows hosts only receive; POSIX hosts serve with python3 -m http.server"""
+    return group != OS_GROUPS['windows']
+
+
+def inventory_hosts(inventory):
+    """Return {group: [(host, address)]} for a wizard-built inventory dict or an inventory file"""
+    hosts = OrderedDict()
+    if isinstance(inventory, dict):
+        for group, definition in inventory.get('all', {}).get('children', {}).items():
+            for host, host_vars in (definition.get('hosts') or {}).items():
+                hosts.setdefault(group, []).append((host, (host_vars or {}).get('ansible_host', host)))
+        return hosts
+
+    manager = InventoryManager(loader=DataLoader(), sources=[inventory])
+    for group in OS_GROUPS.values():
+        if group not in manager.groups:
+            continue
+        for host in manager.groups[group].get_hosts():
+            hosts.setdefault(group, []).append((host.name, host.vars.get('ansible_host', host.name)))
+    return hosts
+
+
+def subnet_key(group, address, prefix=24):
+    """Hosts in the same group and subnet share seeds; hostnames fall back to the group alone"""
+    try:
+        network = ipaddress.ip_network(f'{address}/{prefix}', strict=False)
+    except ValueError:
+        return group, None
+    return group, str(network)
+
+
+def plan_distribution(hosts_by_group, fanout=2, excluded=()):
+    """Return waves of (host, source) pairs; a source of None means the controller"""
+    excluded = set(excluded)
+    groups = {}
+    pending = OrderedDict()
+    for group, hosts in hosts_by_group.items():
+        for host, address in hosts:
+            if host in excluded:
+                continue
+            groups[host] = group
+            pending.setdefault(subnet_key(group, address), []).append(host)
+    if not pending:
+        return []
+
+    any_server = any(can_serve(groups[hosts[0]]) for hosts in pending.values())
+    servers = {key: [] for key in pending}
+    all_servers = []
+
+    # Wave 0: the controller seeds every group/subnet; receive-only keys take everything
+    # from the controller when no host in the fleet can serve
+    wave = []
+    for key, hosts in pending.items():
+        seeds = hosts if not any_server else hosts[:1]
+        for host in seeds:
+            wave.append((host, None))
+            if can_serve(groups[host]):
+                servers[key].append(host)
+                all_servers.append(host)
+        del hosts[:len(seeds)]
+    waves = [wave]
+
+    while any(pending.values()):
+        wave = []
+        load = {}
+        received = []
+        for key, hosts in pending.items():
+            # Prefer sources in the same group and subnet, fall back to any serving host
+            sources = servers[key] or all_servers
+            for source in sources:
+                while hosts and load.get(source, 0) < fanout:
+                    host = hosts.pop(0)
+                    wave.append((host, source))
+                    load[source] = load.get(source, 0) + 1
+                    received.append((key, host))
+        for key, host in received:
+            if can_serve(groups[host]):
+                servers[key].append(host)
+                all_servers.append(host)
+        waves.append(wave)
+    return waves
+
+
+def build_distribution_playbook(waves, installation_file, checksum, port=8765):
+    """Build the plays that stage the archive on every host, wave by wave"""
+    package = os.path.basename(installation_file)
+    digest = parse_digest(checksum)
+    url = "http://{{ hostvars[dist_sources[inventory_hostname]].ansible_host | default(dist_sources[inventory_hostname]) }}:" \
+          f"{port}/{package}"
+    is_windows = "'" + OS_GROUPS['windows'] + "' in group_names"
+    serving = []
+
+    posix = f'not ({is_windows})'
+    from_controller = 'dist_sources[inventory_hostname] is none'
+    from_peer = 'dist_sources[inventory_hostname] is not none'
+    get_url = {'url': url, 'dest': f'{SERVE_DIR}/{package}', 'mode': '0644'}
+    win_get_url = {'url': url, 'dest': f'C:\\temp\\{package}'}
+    if digest:
+        get_url['checksum'] = f'sha256:{digest}'
+        win_get_url.update({'checksum': digest, 'checksum_algorithm': 'sha256'})
+    # The interpreter Ansible found on the host (AIX keeps python3 under /opt/freeware), unless the inventory sets one
+    interpreter = "{{ ansible_facts.discovered_interpreter_python | default(ansible_python_interpreter) " \
+                  "| default('python3') }}"
+    serve = f"nohup {interpreter} -m http.server {port} --directory {SERVE_DIR} >/dev/null 2>&1 &"
+    tasks = [
+        {'name': 'Create distribution directory',
+         'file': {'path': SERVE_DIR, 'state': 'directory', 'mode': '0755'}, 'when': posix},
+        {'name': 'Copy installation file from controller',
+         'copy': {'src': installation_file, 'dest': f'{SERVE_DIR}/{package}', 'mode': '0644'},
+         'when': f'{from_controller} and {posix}'},
+        {'name': 'Copy installation file from controller (Windows)',
+         'win_copy': {'src': installation_file, 'dest': f'C:\\temp\\{package}'},
+         'when': f'{from_controller} and ({is_windows})'},
+        {'name': 'Fetch installation file from peer', 'get_url': get_url, 'when': f'{from_peer} and {posix}'},
+        {'name': 'Fetch installation file from peer (Windows)', 'win_get_url': win_get_url,
+         'when': f'{from_peer} and ({is_windows})'},
+        {'name': 'Link staged file where the installation expects it',
+         'file': {'src': f'{SERVE_DIR}/{package}', 'dest': f'/tmp/{package}', 'state': 'hard', 'force': True},
+         'when': posix},
+        {'name': 'Serve installation file to the next wave', 'shell': serve,
+         'when': f'{posix} and inventory_hostname in dist_servers'},
+        # The next wave fetches as soon as this play ends
+        {'name': 'Wait for the HTTP server', 'wait_for': {'port': port, 'timeout': 30},
+         'when': f'{posix} and inventory_hostname in dist_servers'}
+    ]
+
+    plays = []
+    for index, wave in enumerate(waves):
+        sources = {host: source for host, source in wave}
+        wave_servers = [host for host, _ in wave]
+        if index == len(waves) - 1:
+            # Nobody fetches from the last wave
+            wave_servers = []
+        serving.extend(wave_servers)
+        plays.append({
+            'name': f'Distribute installation file (wave {index})',
+            'hosts': list(sources),
+            'gather_facts': False,
+            'become': True,
+            'vars': {'dist_sources': sources, 'dist_servers': wave_servers},
+            'tasks': tasks
+        })
+
+    if serving:
+        plays.append({
+            'name': 'Stop distribution servers',
+            'hosts': serving,
+            'gather_facts': False,
+            'become': True,
+            'tasks': [
+                # [.] keeps the pattern from matching the shell running pkill itself
+                {'name': 'Stop HTTP server', 'shell': f"pkill -f 'http[.]server {port}' || true", 'when': posix},
+                {'name': 'Remove distribution directory', 'file': {'path': SERVE_DIR, 'state': 'absent'}, 'when': posix}
+            ]
+        })
+    return plays
+
+
+def write_distribution_playbook(path, waves, installation_file, checksum, port=8765):
+    """Write the distribution plays to `path`"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        yaml.safe_dump(build_distribution_playbook(waves, installation_file, checksum, port), f, sort_keys=False)
+    return path
@@ -0,0 +1,114 @@
+"""
+Structured task events from the bundled json_events callback plugin
+A playbook run gets a Unix socket; the plugin (callback_plugins/json_events.py) writes one compact JSON line per
+task start, host result and recap to it, and a reader thread hands each line on as a runner-shaped event.
+Progress, history and metrics then read task, host, status and timing without ansible-runner's full event
+payloads, which grow with every module's output.
+"""
+
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CALLBACK_PLUGINS = os.path.join(APP_DIR, 'callback_plugins')
+CALLBACK_NAME = 'json_events'
+SOCKET_ENV = 'JAVA_INSTALLER_EVENT_SOCKET'
+
+# Keep sockets well under the 108 byte UNIX socket path limit (like the SSH control paths)
+SOCKET_ROOT = os.path.join(tempfile.gettempdir(), 'jiw-ev')
+
+# How often the reader checks whether the run is over while no plugin is connected
+ACCEPT_INTERVAL = 0.5
+
+
+def runner_event(record):
+    """The ansible-runner shaped event for one line written by the plugin"""
+    event_data = {'host': record.get('host'), 'task': record.get('task')}
+    if 'end' in record:
+        event_data.update(start=record['start'], end=record['end'], duration=record['duration'],
+                          task_action=record.get('action'), ignore_errors=record.get('ignore_errors', False),
+                          res={'changed': record.get('changed', False)})
+    if 'playbook' in record:
+        event_data['playbook'] = record['playbook']
+    created = record.get('end', record.get('time'))
+    return {
+        'event': record.get('event'),
+        'created': datetime.fromtimestamp(created).isoformat() if created else None,
+        'event_data': event_data
+    }
+
+
+class EventStreamListener:
+    """Socket the json_events plugin of one playbook run writes to; `handler` gets every event, in order
+
+    Use as a context manager around the run: on exit, events still in flight are delivered before it returns.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        os.makedirs(SOCKET_ROOT, mode=0o700, exist_ok=True)
+        self._dir = tempfile.mkdtemp(dir=SOCKET_ROOT)
+        self.path = os.path.join(self._dir, 's')
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(4)
+        self._server.settimeout(ACCEPT_INTERVAL)
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+
+    def envvars(self, envvars=None):
+        """Runner environment variables enabling the plugin, added to `envvars`"""
+        envvars = dict(envvars or {})
+        envvars['ANSIBLE_CALLBACK_PLUGINS'] = ':'.join(filter(None, (envvars.get('ANSIBLE_CALLBACK_PLUGINS'),
+                                                                      CALLBACK_PLUGINS)))
+        envvars['ANSIBLE_CALLBACKS_ENABLED'] = ','.join(filter(None, (envvars.get('ANSIBLE_CALLBACKS_ENABLED'),
+                                                                      CALLBACK_NAME)))
+        envvars[SOCKET_ENV] = self.path
+        return envvars
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        # The playbook has exited: connections it made are already queued, and each ends with EOF
+        self._closing.set()
+        self._thread.join()
+        self._server.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except socket.timeout:
+                if self._closing.is_set():
+                    return
+                continue
+            except OSError as e:
+                logger.error(f"Event stream {self.path} failed: {e}")
+                return
+            with connection:
+                connection.settimeout(None)
+                self._read(connection)
+
+    def _read(self, connection):
+        with connection.makefile('rb') as lines:
+            for line in lines:
+                try:
+                    event = runner_event(json.loads(line))
+                except ValueError as e:
+                    logger.warning(f"Skipping malformed event from {self.path}: {e}")
+                    continue
+                try:
+                    self.handler(event)
+                except Exception as e:
+                    logger.error(f"Event handler failed on {event.get('event')}: {e}")
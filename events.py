@@ -0,0 +1,200 @@
+"""
+Installation event buffers
+Bounded, sequence-numbered event storage shared between installation workers and progress streams.
+Each event is encoded as an SSE frame once, when it is published; every subscriber reads the same frames
+through its own cursor, so watching a run costs the same however many people watch it.
+"""
+
+import bisect
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+
+
+def encode_frame(seq, event):
+    """The SSE frame for one event"""
+    return f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+
+
+class EventBuffer:
+    """Bounded buffer of events for a single installation; sequence numbers continue after `start_seq`"""
+
+    def __init__(self, maxlen=1000, start_seq=0):
+        self._events = deque(maxlen=maxlen)
+        self._condition = threading.Condition()
+        self._last_seq = start_seq
+        self.subscribers = 0
+        # Bumped by appends and by touch(), so log followers can wait for any job output
+        self._activity = 0
+        # Called after every change; used by the asynchronous stream hub, so they must not block
+        self._listeners = []
+        self.closed = False
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    @property
+    def activity(self):
+        return self._activity
+
+    def add_listener(self, listener):
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self):
+        self._condition.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def append(self, event):
+        """Append an event and wake up every waiting reader"""
+        with self._condition:
+            self._last_seq += 1
+            self._events.append((self._last_seq, encode_frame(self._last_seq, event)))
+            self._activity += 1
+            self._notify()
+            return self._last_seq
+
+    def append_frame(self, seq, frame):
+        """Append a frame encoded elsewhere (e.g. copied from the job store), keeping its sequence number"""
+        with self._condition:
+            if seq <= self._last_seq:
+                return
+            self._last_seq = seq
+            self._events.append((seq, frame))
+            self._activity += 1
+            self._notify()
+
+    def touch(self):
+        """Wake up waiting readers without appending an event (e.g. after the job log grew)"""
+        with self._condition:
+            self._activity += 1
+            self._notify()
+
+    def wait_for_activity(self, after, timeout=None):
+        """Block until activity moves past `after` or the buffer closes; returns whether it is closed"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._activity != after or self.closed, timeout)
+            return self.closed
+
+    def close(self):
+        """Mark the buffer as finished; readers drain it and stop"""
+        with self._condition:
+            self.closed = True
+            self._notify()
+
+    def _since(self, after):
+        """Entries newer than `after`; while sequence numbers are contiguous, skip straight to the first unseen one"""
+        if not self._events or self._last_seq <= after:
+            return []
+        first_seq = self._events[0][0]
+        if self._last_seq - first_seq + 1 == len(self._events):
+            start = max(after - first_seq + 1, 0)
+        else:
+            # Copied frames can have gaps where the store missed some
+            start = bisect.bisect_right(self._events, after, key=lambda entry: entry[0])
+        return list(itertools.islice(self._events, start, None))
+
+    def frames(self, after=0):
+        """Return (seq, frame) pairs newer than `after` without blocking"""
+        with self._condition:
+            return self._since(after)
+
+    def subscribe(self, after=None, replay=100, max_lag=None):
+        """Attach a subscriber resuming after sequence `after`, or replaying the last `replay` events"""
+        with self._condition:
+            if after is None:
+                after = max(self._last_seq - replay, 0)
+            self.subscribers += 1
+            return Subscription(self, after, max_lag)
+
+    def _unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+
+class Subscription:
+    """One subscriber's cursor into a shared EventBuffer
+
+    A subscriber more than `max_lag` events behind skips the oldest ones it has not sent (drop-oldest);
+    skipped events, including ones already evicted from the buffer, are reported in a `dropped` frame.
+    """
+
+    def __init__(self, buffer, after, max_lag=None):
+        self.buffer = buffer
+        self.last_seq = after
+        self.max_lag = max_lag
+        self.dropped = 0
+        self._closed = False
+
+    @property
+    def done(self):
+        """True once the buffer is closed and every event has been handed out"""
+        return self.buffer.closed and self.last_seq >= self.buffer.last_seq
+
+    def poll(self, timeout=None):
+        """Return SSE frames for the events since the last poll, blocking up to `timeout` seconds for new ones"""
+        buffer = self.buffer
+        with buffer._condition:
+            if buffer.last_seq <= self.last_seq and not buffer.closed:
+                buffer._condition.wait(timeout)
+            entries = buffer._since(self.last_seq)
+        if not entries:
+            return []
+
+        skipped = entries[0][0] - self.last_seq - 1
+        if self.max_lag is not None and len(entries) > self.max_lag:
+            skipped += len(entries) - self.max_lag
+            entries = entries[-self.max_lag:]
+        self.last_seq = entries[-1][0]
+        frames = [frame for _, frame in entries]
+        if skipped > 0:
+            self.dropped += skipped
+            frames.insert(0, f"event: dropped\ndata: {json.dumps({'dropped': skipped})}\n\n")
+        return frames
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.buffer._unsubscribe()
+
+
+class EventBufferRegistry:
+    """Per-installation event buffers, keeping only the most recent finished ones"""
+
+    def __init__(self, buffer_size=1000, max_finished=100):
+        self.buffer_size = buffer_size
+        self.max_finished = max_finished
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, installation_id, start_seq=0):
+        with self._lock:
+            buffer = EventBuffer(self.buffer_size, start_seq)
+            self._buffers[installation_id] = buffer
+            self._evict()
+            return buffer
+
+    def get(self, installation_id):
+        with self._lock:
+            return self._buffers.get(installation_id)
+
+    def buffers(self):
+        with self._lock:
+            return list(self._buffers.values())
+
+    def discard(self, installation_id):
+        with self._lock:
+            self._buffers.pop(installation_id, None)
+
+    def _evict(self):
+        finished = [key for key, buffer in self._buffers.items() if buffer.closed]
+        for key in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._buffers[key]
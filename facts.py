@@ -0,0 +1,79 @@
+"""
+Host fact cache
+Facts gathered by installation runs are cached as JSON files under JAVA_UPDATER_DIR so repeat runs skip gathering
+"""
+
+import json
+import logging
+import os
+import time
+
+import ansible_runner
+
+logger = logging.getLogger(__name__)
+
+# Fact subsets the playbook and roles rely on (os family, system, PATH)
+GATHER_SUBSET = ['!all', '!min', 'distribution', 'platform', 'env']
+
+
+class FactCache:
+    """Access to the jsonfile fact cache that ansible writes one file per host into"""
+
+    def __init__(self, directory, timeout=86400):
+        self.directory = directory
+        self.timeout = int(timeout)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, host):
+        name = os.path.basename(host)
+        if not name or name.startswith('.'):
+            raise ValueError(f'Invalid host name {host}')
+        return os.path.join(self.directory, name)
+
+    def age(self, host):
+        """Seconds since the host's facts were cached, or None if they are missing or expired"""
+        try:
+            age = time.time() - os.stat(self.path(host)).st_mtime
+        except FileNotFoundError:
+            return None
+        return age if self.timeout == 0 or age < self.timeout else None
+
+    def get(self, host):
+        if self.age(host) is None:
+            return None
+        with open(self.path(host), 'r') as f:
+            return json.load(f)
+
+    def hosts(self):
+        """Summary of every cached host"""
+        summary = []
+        for name in sorted(os.listdir(self.directory)):
+            age = self.age(name)
+            summary.append({'host': name, 'age_seconds': None if age is None else int(age), 'expired': age is None})
+        return summary
+
+    def invalidate(self, host):
+        """Drop a host's cached facts; returns whether anything was removed"""
+        try:
+            os.remove(self.path(host))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def refresh(self, hosts, inventory, private_data_dir, **runner_options):
+        """Re-gather facts for `hosts` with an ad-hoc setup run, which repopulates the cache"""
+        for host in hosts:
+            self.invalidate(host)
+
+        os.makedirs(private_data_dir, exist_ok=True)
+        runner = ansible_runner.run(
+            private_data_dir=private_data_dir,
+            host_pattern=':'.join(hosts),
+            module='setup',
+            module_args=f"gather_subset={','.join(GATHER_SUBSET)}",
+            inventory=inventory,
+            quiet=True,
+            **runner_options
+        )
+        logger.info(f"Fact refresh for {len(hosts)} hosts finished with status {runner.status}")
+        return {host: 'cached' if self.age(host) is not None else 'failed' for host in hosts}
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Simulated fleet scale test
+Runs the real install pipeline (pre-flight probe, playbook compilation, ansible-runner with the compiled playbook)
+against thousands of synthetic hosts on one Linux box, without network access. Hosts use the `simulated`
+connection plugin (connection_plugins/simulated.py): nothing is executed on a target, but every host gets
+the latency, bandwidth and failure rates of the inventory.ini group it mimics, so the controller does the
+same work it would for a real fleet.
+
+The report gives, per fleet size, total wall time, controller CPU and peak memory, the cost of each phase,
+host outcomes and the slowest tasks.
+
+    python fleet.py --hosts 100,500,2000 --forks 50 --output fleet.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from bench import ProcessSampler
+from compiler import PlaybookCompiler
+from events import EventBuffer
+from history import RunHistory
+from installer import OS_GROUPS, build_extravars, run_playbook
+from preflight import exclusion_limit, run_preflight
+from runner_config import job_runner_options, remove_control_path_dir
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CONNECTION_PLUGINS = os.path.join(APP_DIR, 'connection_plugins')
+
+# Behaviour of hosts mimicking each inventory.ini group: seconds per command, bytes per second,
+# probability of a failed module and of an unreachable host per module
+FLEET_PROFILES = {
+    'linux': {'sim_latency': 0.02, 'sim_bandwidth': 100e6, 'sim_failure_rate': 0.002, 'sim_unreachable_rate': 0.002},
+    'windows': {'sim_latency': 0.15, 'sim_bandwidth': 25e6, 'sim_failure_rate': 0.005, 'sim_unreachable_rate': 0.005},
+    'aix': {'sim_latency': 0.08, 'sim_bandwidth': 12.5e6, 'sim_failure_rate': 0.005, 'sim_unreachable_rate': 0.01}
+}
+
+SIMULATED_VERSION = '21.0.2'
+
+
+def parse_mix(value):
+    """'linux=70,windows=20,aix=10' -> {'linux': 0.7, 'windows': 0.2, 'aix': 0.1}"""
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in FLEET_PROFILES:
+            raise ValueError(f"Unknown host profile {name.strip()}; expected one of {', '.join(FLEET_PROFILES)}")
+        weights[name.strip()] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def build_fleet_inventory(count, mix, args, state_dir):
+    """Runner inventory of `count` simulated hosts
+
+    Hosts keep their group's latency, bandwidth and failure profile but all sit in linux_hosts: the plays
+    for Windows and AIX need a Windows target or AIX users and groups, which the controller cannot stand in for.
+    """
+    rng = random.Random(args.seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    hosts = {}
+    for index in range(count):
+        profile = rng.choices(names, weights)[0]
+        host_vars = {key: value * args.latency_scale if key == 'sim_latency' else value
+                     for key, value in FLEET_PROFILES[profile].items()}
+        host_vars['sim_failure_rate'] *= args.failure_scale
+        host_vars['sim_unreachable_rate'] *= args.failure_scale
+        host_vars['sim_java_version'] = SIMULATED_VERSION if rng.random() < args.compliant else ''
+        host_vars['sim_profile'] = profile
+        hosts[f'sim-{profile}-{index:05d}'] = host_vars
+    return {'all': {
+        'vars': {'ansible_connection': 'simulated', 'ansible_python_interpreter': sys.executable,
+                 'sim_seed': args.seed, 'sim_state_dir': os.path.join(state_dir, 'hosts')},
+        'children': {OS_GROUPS['linux']: {'hosts': hosts}}
+    }}
+
+
+class Phase:
+    """Wall time, controller CPU (this process and every finished child) and peak memory of one phase"""
+
+    def __init__(self, name, report):
+        self.name = name
+        self.report = report
+
+    @staticmethod
+    def cpu():
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    def __enter__(self):
+        self.sampler = ProcessSampler(os.getpid(), interval=0.2, include_children=True).__enter__()
+        self.started = time.monotonic()
+        self.cpu_started = self.cpu()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.monotonic() - self.started
+        cpu = self.cpu() - self.cpu_started
+        self.sampler.__exit__(*exc)
+        self.report[self.name] = {
+            'wall_s': round(wall, 2),
+            'cpu_s': round(cpu, 2),
+            'memory_peak_mb': round(self.sampler.rss_peak / 2 ** 20, 1),
+            'processes_threads_peak': self.sampler.threads_peak
+        }
+
+
+def write_archive(path, size_mb):
+    """A sparse archive of the given size; simulated hosts only need its size for transfer times"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(int(size_mb * 2 ** 20))
+
+
+def run_fleet(count, mix, args, work_dir):
+    """Run the pipeline against `count` simulated hosts and return the report for that size"""
+    run_id = f'fleet-{count}'
+    updater_dir = os.path.join(work_dir, run_id)
+    private_data_dir = os.path.join(updater_dir, 'runner')
+    installation = {
+        'friendly_name': 'Simulated JDK', 'version': SIMULATED_VERSION, 'vendor': 'openjdk', 'os': 'linux',
+        'filename': 'installation/sim-jdk.tar.gz'
+    }
+    profile = {'friendly_name': 'Simulated profile', 'install_path': '/opt/java'}
+    write_archive(os.path.join(updater_dir, installation['filename']), args.archive_mb)
+
+    settings = {'ansible_forks': args.forks, 'connection_timeout': 30, 'default_timeout': 600}
+    runner_options = job_runner_options(private_data_dir, run_id, settings)
+    runner_options['envvars']['ANSIBLE_CONNECTION_PLUGINS'] = CONNECTION_PLUGINS
+    history = RunHistory(os.path.join(updater_dir, 'history.sqlite'))
+    phases = {}
+    started = time.monotonic()
+    cpu_started = Phase.cpu()
+
+    with Phase('inventory', phases):
+        inventory = build_fleet_inventory(count, mix, args, updater_dir)
+        extravars = build_extravars(installation, profile, updater_dir)
+
+    compliant = []
+    if args.preflight:
+        with Phase('preflight', phases):
+            probes = run_preflight(private_data_dir, inventory, extravars['install_path'], SIMULATED_VERSION,
+                                   'openjdk', **runner_options)
+            compliant = sorted(host for host, probe in probes.items() if probe['status'] == 'compliant')
+        phases['preflight']['compliant_hosts'] = len(compliant)
+        if compliant:
+            runner_options['limit'] = exclusion_limit(compliant, os.path.join(private_data_dir, 'limit'))
+
+    with Phase('compile', phases):
+        playbook = PlaybookCompiler(os.path.join(updater_dir, 'compiled'), updater_dir).compile(installation, profile)
+
+    buffer = EventBuffer()
+    history.start_run(run_id, {'hosts': count})
+    with Phase('install', phases):
+        runner = run_playbook(
+            run_id, private_data_dir, inventory, extravars, buffer, os.path.join(updater_dir, f'{run_id}.log'),
+            playbook=playbook, event_callback=lambda event: history.record_event(run_id, event),
+            structured_events=args.structured_events, **runner_options
+        )
+    phases['install']['events'] = buffer.last_seq
+    remove_control_path_dir(run_id)
+    history.finish_run(run_id, runner.status)
+    history.flush()
+
+    run = history.run(run_id)
+    outcomes = {}
+    for host in run['hosts']:
+        outcomes[host['status']] = outcomes.get(host['status'], 0) + 1
+    wall = time.monotonic() - started
+    cpu = Phase.cpu() - cpu_started
+    return {
+        'hosts': count,
+        'status': runner.status,
+        'wall_s': round(wall, 2),
+        'cpu_s': round(cpu, 2),
+        'cpu_ms_per_host': round(cpu / count * 1000, 1),
+        'memory_peak_mb': max(phase['memory_peak_mb'] for phase in phases.values()),
+        'phases': phases,
+        'outcomes': outcomes,
+        'slowest_tasks': history.slowest_tasks(limit=args.top_tasks)
+    }
+
+
+def print_report(results):
+    print(f"{'hosts':>7} {'wall s':>8} {'cpu s':>8} {'cpu ms/host':>12} {'mem MB':>8}  phases (wall s / cpu s)")
+    for result in results:
+        phases = ', '.join(f"{name} {phase['wall_s']}/{phase['cpu_s']}" for name, phase in result['phases'].items())
+        print(f"{result['hosts']:>7} {result['wall_s']:>8} {result['cpu_s']:>8} {result['cpu_ms_per_host']:>12} "
+              f"{result['memory_peak_mb']:>8}  {phases}")
+        print(f"{'':>7} outcomes: {result['outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scale-test the install pipeline against a simulated fleet')
+    parser.add_argument('--hosts', default='100,500,2000', help='comma-separated fleet sizes')
+    parser.add_argument('--mix', default='linux=70,windows=20,aix=10', help='share of each host profile')
+    parser.add_argument('--forks', type=int, default=50, help='ansible forks')
+    parser.add_argument('--archive-mb', type=float, default=190, help='installation archive size')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiplier of every profile latency')
+    parser.add_argument('--failure-scale', type=float, default=1.0, help='multiplier of every failure rate')
+    parser.add_argument('--compliant', type=float, default=0.1, help='share of hosts already running the version')
+    parser.add_argument('--no-preflight', dest='preflight', action='store_false', help='skip the pre-flight probe')
+    parser.add_argument('--runner-events', dest='structured_events', action='store_false',
+                        help='read task events from ansible-runner instead of the json_events callback plugin')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the fleet layout and failure injection')
+    parser.add_argument('--top-tasks', type=int, default=5, help='slowest tasks listed per size')
+    parser.add_argument('--work-dir', help='keep run directories here instead of a removed temporary directory')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='java-installer-fleet-')
+    results = []
+    try:
+        for count in [int(value) for value in args.hosts.split(',') if value.strip()]:
+            results.append(run_fleet(count, mix, args, work_dir))
+            print_report(results[-1:])
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpus': os.cpu_count(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('output', 'work_dir')},
+        'mix': mix,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Run history
+Jobs, per-host outcomes and per-task timings in an embedded SQLite database (WAL mode).
+Runner events are queued and written in batches by a single writer thread, so recording
+never blocks the event stream.
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    installation TEXT,
+    profile TEXT,
+    request TEXT,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS task_results (
+    run_id TEXT NOT NULL,
+    host TEXT NOT NULL,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS run_hosts (
+    run_id TEXT NOT NULL,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tasks INTEGER NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (run_id, host)
+);
+CREATE INDEX IF NOT EXISTS task_results_run ON task_results (run_id, host);
+CREATE INDEX IF NOT EXISTS task_results_task ON task_results (task);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+"""
+
+RESULT_EVENTS = {
+    'runner_on_ok': 'ok',
+    'runner_on_failed': 'failed',
+    'runner_on_skipped': 'skipped',
+    'runner_on_unreachable': 'unreachable'
+}
+
+# Rows written per transaction, and the longest a queued row waits for its batch
+BATCH_SIZE = 500
+BATCH_INTERVAL = 0.5
+
+
+def epoch(value):
+    """Seconds since the epoch for an ISO timestamp (or a number of seconds) from a runner event, or None"""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def iso(value):
+    return datetime.fromtimestamp(value).isoformat() if value is not None else None
+
+
+class RunHistory:
+    """Record installation runs and query them; writes go through a background batch writer"""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._reader.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name='run-history', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        # Readers never block the writer and commits need no fsync of the main database file
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def start_run(self, run_id, request):
+        """Open a run; `request` is stored as given, so callers strip credentials first"""
+        self._queue.put(('INSERT OR REPLACE INTO runs VALUES (?, NULL, NULL, ?, ?, ?, NULL)',
+                         (run_id, json.dumps(request), 'running', time.time())))
+
+    def describe_run(self, run_id, installation, profile):
+        """Label the run with the catalog installation and profile it resolved to"""
+        self._queue.put(('UPDATE runs SET installation = ?, profile = ? WHERE id = ?', (
+            installation.get('friendly_name') or installation.get('filename'),
+            profile.get('friendly_name') or profile.get('install_path'),
+            run_id
+        )))
+
+    def record_event(self, run_id, event):
+        """Queue the timing of a task result; other runner events are ignored"""
+        status = RESULT_EVENTS.get(event.get('event'))
+        if status is None:
+            return
+        event_data = event.get('event_data') or {}
+        if status == 'ok' and (event_data.get('res') or {}).get('changed'):
+            status = 'changed'
+        elif status == 'failed' and event_data.get('ignore_errors'):
+            status = 'ignored'
+        finished_at = epoch(event_data.get('end')) or epoch(event.get('created')) or time.time()
+        started_at = epoch(event_data.get('start'))
+        duration = event_data.get('duration')
+        if duration is None and started_at is not None:
+            duration = finished_at - started_at
+        self._queue.put(('INSERT INTO task_results VALUES (?, ?, ?, ?, ?, ?, ?)', (
+            run_id,
+            event_data.get('host'),
+            event_data.get('task') or '',
+            status,
+            started_at,
+            finished_at,
+            duration
+        )))
+
+    def finish_run(self, run_id, status):
+        """Close the run and summarize its hosts; queued behind the run's task results"""
+        self._queue.put(('UPDATE runs SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), run_id)))
+        self._queue.put(("""
+            INSERT OR REPLACE INTO run_hosts
+            SELECT run_id, host,
+                   CASE WHEN SUM(status = 'unreachable') THEN 'unreachable'
+                        WHEN SUM(status = 'failed') THEN 'failed' ELSE 'ok' END,
+                   COUNT(*), MIN(COALESCE(started_at, finished_at)), MAX(finished_at)
+            FROM task_results WHERE run_id = ? GROUP BY host
+        """, (run_id,)))
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is committed"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if isinstance(batch[-1], threading.Event):
+                    break
+
+            waiters = [item for item in batch if isinstance(item, threading.Event)]
+            try:
+                with connection:
+                    for item in batch:
+                        if not isinstance(item, threading.Event):
+                            connection.execute(*item)
+            except sqlite3.Error as e:
+                logger.error(f"Could not record {len(batch)} history rows: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return [dict(row) for row in self._reader.execute(sql, params).fetchall()]
+
+    def runs(self, status=None, limit=50, offset=0):
+        """Most recent runs first, with their duration and host counts"""
+        where = 'WHERE r.status = ?' if status else ''
+        params = ([status] if status else []) + [limit, offset]
+        rows = self._query(f"""
+            SELECT r.id, r.installation, r.profile, r.status, r.started_at, r.finished_at,
+                   r.finished_at - r.started_at AS duration,
+                   COUNT(h.host) AS hosts, COALESCE(SUM(h.status != 'ok'), 0) AS failed_hosts
+            FROM runs r LEFT JOIN run_hosts h ON h.run_id = r.id
+            {where}
+            GROUP BY r.id
+            ORDER BY r.started_at DESC
+            LIMIT ? OFFSET ?
+        """, params)
+        for row in rows:
+            row['started_at'] = iso(row['started_at'])
+            row['finished_at'] = iso(row['finished_at'])
+        return rows
+
+    def run(self, run_id):
+        """One run with its request and per-host durations, slowest hosts first"""
+        runs = self._query('SELECT * FROM runs WHERE id = ?', (run_id,))
+        if not runs:
+            return None
+        run = runs[0]
+        run['request'] = json.loads(run['request']) if run['request'] else None
+        run['duration'] = run['finished_at'] - run['started_at'] if run['finished_at'] else None
+        run['started_at'] = iso(run['started_at'])
+        run['finished_at'] = iso(run['finished_at'])
+        run['hosts'] = self._query("""
+            SELECT host, COUNT(*) AS tasks,
+                   CASE WHEN SUM(status = 'unreachable') THEN 'unreachable'
+                        WHEN SUM(status = 'failed') THEN 'failed' ELSE 'ok' END AS status,
+                   SUM(duration) AS task_time,
+                   MAX(finished_at) - MIN(COALESCE(started_at, finished_at)) AS duration
+            FROM task_results WHERE run_id = ?
+            GROUP BY host
+            ORDER BY duration DESC
+        """, (run_id,))
+        return run
+
+    def slowest_tasks(self, limit=20, since=None):
+        """Tasks ranked by mean duration across runs and hosts"""
+        where = 'WHERE t.finished_at >= ?' if since else ''
+        params = ([epoch(since)] if since else []) + [limit]
+        return self._query(f"""
+            SELECT t.task, COUNT(*) AS results, COUNT(DISTINCT t.run_id) AS runs,
+                   AVG(t.duration) AS mean_duration, MAX(t.duration) AS max_duration, SUM(t.duration) AS total_duration
+            FROM task_results t
+            {where}
+            GROUP BY t.task
+            HAVING COUNT(t.duration) > 0
+            ORDER BY mean_duration DESC
+            LIMIT ?
+        """, params)
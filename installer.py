@@ -0,0 +1,295 @@
+"""
+Ansible execution engine for the Java Installation Wizard
+Drives java-install.yml through ansible-runner and translates runner events into progress events
+"""
+
+import contextlib
+import os
+import logging
+import threading
+from datetime import datetime
+
+import yaml
+import ansible_runner
+
+from artifacts import parse_digest
+from event_stream import EventStreamListener
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PLAYBOOK_FILE = os.path.join(APP_DIR, 'java-install.yml')
+INVENTORY_FILE = os.path.join(APP_DIR, 'inventory.ini')
+
+# Inventory group used for each target operating system (matches inventory.ini)
+OS_GROUPS = {
+    'linux': 'linux_hosts',
+    'windows': 'windows_hosts',
+    'aix': 'aix_hosts'
+}
+
+# Runner events that are reported to progress streams, and the status they map to
+REPORTED_EVENTS = {
+    'playbook_on_task_start': 'started',
+    'runner_on_ok': 'ok',
+    'runner_on_failed': 'failed',
+    'runner_on_skipped': 'skipped',
+    'runner_on_unreachable': 'unreachable',
+    'playbook_on_stats': 'finished'
+}
+
+# Credentials in the wizard's ansible section, and host variables in its inventory lines that hold them
+SECRET_FIELDS = ('password', 'sshKey', 'becomePassword')
+SECRET_VARIABLE_MARKERS = ('pass', 'secret', 'private_key')
+
+# Prompts of ansible's --ask-pass and --ask-become-pass, answered by ansible-runner
+PASSWORD_PROMPT = r'^SSH password:\s*?$'
+BECOME_PASSWORD_PROMPT = r'^BECOME password.*:\s*?$'
+
+
+def count_playbook_tasks(playbook_file):
+    """Count the tasks of a playbook, including one fact gathering task per play"""
+    with open(playbook_file, 'r') as f:
+        plays = yaml.safe_load(f) or []
+
+    total = 0
+    for play in plays:
+        total += len(play.get('tasks') or [])
+        if play.get('gather_facts', True):
+            total += 1
+    return max(total, 1)
+
+
+def resolve_installation(data, config, installation_dir):
+    """Return the catalog installation entry selected in the wizard data"""
+    section = data.get('installation') or {}
+
+    if section.get('source') == 'upload':
+        filename = (section.get('file') or {}).get('name', '')
+        return {
+            'friendly_name': section.get('friendlyName', filename),
+            'os': section.get('os', 'linux'),
+            'filename': os.path.join(os.path.basename(installation_dir), filename),
+            'install_command': section.get('command', '')
+        }
+
+    entry = dict(section.get('installation') or {})
+    entry_id = entry.get('id') or section.get('id')
+    if entry_id in config:
+        entry.update(config[entry_id])
+        entry['id'] = entry_id
+    return entry
+
+
+def resolve_profile(data, config):
+    """Return the profile selected or defined in the wizard data"""
+    section = data.get('profile') or {}
+
+    if section.get('source') == 'new':
+        return {
+            'friendly_name': section.get('profileName', ''),
+            'install_path': section.get('installPath', '/opt/java'),
+            'base_path': section.get('basePath', ''),
+            'backup_enabled': bool(section.get('backupEnabled')),
+            'backup_path': section.get('backupPath', ''),
+            'symlink_enabled': bool(section.get('symlinkEnabled')),
+            'symlink_path': section.get('symlinkPath', '')
+        }
+
+    entry = dict(section.get('profile') or {})
+    entry_id = entry.get('id') or section.get('id')
+    if entry_id in config:
+        entry.update(config[entry_id])
+        entry['id'] = entry_id
+    return entry
+
+
+def build_extravars(installation, profile, updater_dir):
+    """Build the playbook variables for an installation and profile"""
+    return {
+        'java_installation_file': os.path.join(updater_dir, installation.get('filename', '')),
+        # Bare SHA-256 hex digest ('' when the catalog has none), compared with files already on the targets
+        'java_installation_checksum': parse_digest(installation.get('checksum')) or '',
+        'java_version': str(installation.get('version', '')),
+        'java_vendor': installation.get('vendor', 'openjdk'),
+        'install_path': profile.get('install_path', '/opt/java'),
+        'backup_enabled': bool(profile.get('backup_enabled', False)),
+        'symlink_enabled': bool(profile.get('symlink_enabled', False))
+    }
+
+
+def build_inventory(data):
+    """Build a runner inventory from the wizard host list, falling back to inventory.ini
+
+    Credentials are not part of it; they go to ansible-runner through runner_credentials.
+    """
+    ansible = data.get('ansible') or {}
+    lines = [line.strip() for line in ansible.get('inventory') or [] if line.strip()]
+    if not lines:
+        return INVENTORY_FILE
+
+    hosts = {}
+    for line in lines:
+        name, *assignments = line.split()
+        hosts[name] = dict(item.split('=', 1) for item in assignments if '=' in item) or None
+
+    target_os = ansible.get('os', 'linux')
+    group_vars = {}
+    if ansible.get('username'):
+        group_vars['ansible_user'] = ansible['username']
+    if target_os == 'windows':
+        group_vars['ansible_connection'] = 'winrm'
+        group_vars['ansible_winrm_server_cert_validation'] = 'ignore'
+
+    group = OS_GROUPS.get(target_os, OS_GROUPS['linux'])
+    return {'all': {'children': {group: {'hosts': hosts, 'vars': group_vars}}}}
+
+
+def runner_credentials(data):
+    """ansible-runner options supplying the wizard's credentials (see build_inventory)
+
+    Passwords answer ansible's prompts and the SSH key is handed to ssh-agent, and env files are suppressed, so
+    neither is written to the runner's private data directory like inventory variables would be.
+    """
+    ansible = data.get('ansible') or {}
+    passwords = {}
+    cmdline = []
+    if ansible.get('password'):
+        passwords[PASSWORD_PROMPT] = ansible['password']
+        cmdline.append('--ask-pass')
+    if ansible.get('becomePassword'):
+        passwords[BECOME_PASSWORD_PROMPT] = ansible['becomePassword']
+        cmdline.append('--ask-become-pass')
+
+    options = {}
+    if passwords:
+        options.update(passwords=passwords, cmdline=' '.join(cmdline))
+    if ansible.get('sshKey'):
+        options['ssh_key'] = ansible['sshKey']
+    if options:
+        options['suppress_env_files'] = True
+    return options
+
+
+def redact_request(data):
+    """A copy of the wizard data without credentials, for logs and run history"""
+    ansible = data.get('ansible')
+    if not isinstance(ansible, dict):
+        return data
+
+    ansible = {key: value for key, value in ansible.items() if key not in SECRET_FIELDS}
+    lines = ansible.get('inventory')
+    if isinstance(lines, list):
+        ansible['inventory'] = [redact_inventory_line(line) if isinstance(line, str) else line for line in lines]
+    return dict(data, ansible=ansible)
+
+
+def redact_inventory_line(line):
+    """An inventory line with the values of credential host variables masked"""
+    if not line.strip():
+        return line
+    name, *assignments = line.split()
+    for index, item in enumerate(assignments):
+        key, separator, _ = item.partition('=')
+        if separator and any(marker in key.lower() for marker in SECRET_VARIABLE_MARKERS):
+            assignments[index] = f'{key}=***'
+    return ' '.join([name, *assignments])
+
+
+class RunnerEventTranslator:
+    """Translate raw ansible-runner events into progress events"""
+
+    def __init__(self, total_tasks):
+        self.total_tasks = total_tasks
+        self.tasks_started = 0
+        # Shared by concurrent runs of a rollout
+        self._lock = threading.Lock()
+
+    def progress(self):
+        return min(int(self.tasks_started / self.total_tasks * 100), 99)
+
+    def translate(self, event):
+        status = REPORTED_EVENTS.get(event.get('event'))
+        if status is None:
+            return None
+
+        event_data = event.get('event_data') or {}
+        if status == 'started':
+            with self._lock:
+                self.tasks_started += 1
+        elif status == 'failed' and event_data.get('ignore_errors'):
+            status = 'ignored'
+
+        return {
+            'step': event_data.get('task') or os.path.basename(event_data.get('playbook', '')),
+            'host': event_data.get('host'),
+            'status': status,
+            'progress': self.progress(),
+            'timestamp': event.get('created') or datetime.now().isoformat(),
+            'completed': False
+        }
+
+
+def run_playbook(installation_id, private_data_dir, inventory, extravars, buffer, log_file, cancel_callback=None,
+                 playbook=None, translator=None, tags=None, report_completion=True, event_callback=None,
+                 structured_events=False, **runner_options):
+    """Run a playbook (java-install.yml by default) with ansible-runner, publishing progress events into `buffer`
+
+    `event_callback`, if given, also receives every raw runner event.
+    With `structured_events`, task events come from the bundled json_events callback plugin (see event_stream.py)
+    instead of ansible-runner's events, which then only feed the log file.
+    Extra keyword arguments (envvars, timeout, ...) are passed through to ansible_runner.run.
+    """
+    playbook = playbook or PLAYBOOK_FILE
+    translator = translator or RunnerEventTranslator(count_playbook_tasks(playbook))
+    os.makedirs(private_data_dir, exist_ok=True)
+
+    def publish(event):
+        progress_event = translator.translate(event)
+        if progress_event is not None:
+            progress_event.update(tags or {})
+            buffer.append(progress_event)
+        if event_callback is not None:
+            event_callback(event)
+        return progress_event
+
+    with open(log_file, 'a') as log, contextlib.ExitStack() as stack:
+        if structured_events:
+            listener = stack.enter_context(EventStreamListener(publish))
+            runner_options['envvars'] = listener.envvars(runner_options.get('envvars'))
+            # Runner's own events still carry stdout for the log, but no longer encode result payloads
+            runner_options.setdefault('omit_event_data', True)
+
+        def event_handler(event):
+            if event.get('stdout'):
+                log.write(event['stdout'] + '\n')
+                log.flush()
+            if structured_events or publish(event) is None:
+                if event.get('stdout'):
+                    buffer.touch()
+            # Events are kept in the buffer and log file, so skip runner's per-event artifact files
+            return False
+
+        runner = ansible_runner.run(
+            private_data_dir=private_data_dir,
+            ident=installation_id,
+            playbook=playbook,
+            inventory=inventory,
+            extravars=extravars,
+            event_handler=event_handler,
+            cancel_callback=cancel_callback,
+            quiet=True,
+            **runner_options
+        )
+
+    if report_completion:
+        succeeded = runner.status == 'successful'
+        buffer.append({
+            'step': 'Installation complete' if succeeded else f'Installation {runner.status}',
+            'status': runner.status,
+            'rc': runner.rc,
+            'progress': 100,
+            'timestamp': datetime.now().isoformat(),
+            'completed': True
+        })
+    return runner
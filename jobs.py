@@ -0,0 +1,609 @@
+"""
+Shared job registry
+Installation jobs, their queue order, cancellation flags and progress frames live in a store every app worker
+can reach, so any worker can accept, run, report on or cancel any job. Backends:
+
+- sqlite: a WAL-mode database on the shared data volume (default)
+- memory: in-process only, for a single worker
+- remote: a MemoryJobStore served over TCP by `python jobs.py serve`, standing in for a network store
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from events import EventBufferRegistry, encode_frame
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('successful', 'failed', 'error', 'canceled', 'lost')
+
+# The remote backend unpickles what clients send, so its authkey is a secret: taken from the job_store_authkey
+# setting or this environment variable, never defaulted. The key earlier versions shipped is refused.
+AUTHKEY_ENV = 'JOB_STORE_AUTHKEY'
+PUBLISHED_AUTHKEYS = ('java-installer',)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    owner TEXT,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    frame TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class JobCanceled(Exception):
+    """Raised by a running job that noticed its cancellation between phases"""
+
+
+def final_event(step, status):
+    return {'step': step, 'status': status, 'progress': 100, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'completed': True}
+
+
+class JobStore:
+    """Interface of the job registry backends; jobs are returned as plain dicts
+
+    create(job_id, data, priority, max_queued, owner) -> queue position, or None when the queue is full
+    claim(worker) -> the next queued job owned by no other worker, now running on `worker`, or None
+    get(job_id), list_jobs(status=None, limit=100), position(job_id), counts()
+    finish(job_id, status)
+    request_cancel(job_id) -> 'canceled' for queued jobs, 'cancelling' for running ones, or None
+    cancel_requested(job_id)
+    append_events(job_id, [(seq, frame)]), events_since(job_id, after), last_event_seq(job_id)
+    heartbeat(worker), expire(stale_after) -> ids of running jobs whose worker stopped heartbeating, and of queued
+        jobs whose owner did
+    prune(older_than) -> finished jobs removed
+    """
+
+
+class MemoryJobStore(JobStore):
+    """Job registry held in memory; also the state behind the remote backend's server"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._events = {}
+        self._workers = {}
+        self._counter = 0
+
+    def _queued(self, worker=None):
+        """Queued jobs in claim order; with `worker`, only the ones it may claim"""
+        return sorted((job for job in self._jobs.values()
+                       if job['status'] == 'queued' and (worker is None or job['owner'] in (None, worker))),
+                      key=lambda job: (-job['priority'], job['order']))
+
+    def _public(self, job):
+        return {key: value for key, value in job.items() if key != 'order'}
+
+    def create(self, job_id, data, priority=0, max_queued=None, owner=None):
+        with self._lock:
+            if max_queued is not None and len(self._queued()) >= max_queued:
+                return None
+            self._counter += 1
+            self._jobs[job_id] = {
+                'id': job_id, 'status': 'queued', 'priority': int(priority), 'data': data, 'owner': owner,
+                'worker': None, 'cancel_requested': False, 'created_at': time.time(), 'started_at': None,
+                'finished_at': None, 'order': self._counter
+            }
+            self._events[job_id] = {}
+            return self._position(job_id)
+
+    def claim(self, worker):
+        with self._lock:
+            queued = self._queued(worker)
+            if not queued:
+                return None
+            job = queued[0]
+            job.update(status='running', worker=worker, started_at=time.time())
+            return self._public(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def list_jobs(self, status=None, limit=100):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if status is None or job['status'] == status]
+            jobs.sort(key=lambda job: job['created_at'], reverse=True)
+            return [self._public(job) for job in jobs[:limit]]
+
+    def _position(self, job_id):
+        for position, job in enumerate(self._queued(), start=1):
+            if job['id'] == job_id:
+                return position
+        return None
+
+    def position(self, job_id):
+        with self._lock:
+            return self._position(job_id)
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+    def finish(self, job_id, status):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, finished_at=time.time())
+
+    def _append_final(self, job_id, event):
+        events = self._events.setdefault(job_id, {})
+        seq = max(events, default=0) + 1
+        events[seq] = encode_frame(seq, event)
+
+    def request_cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINAL_STATUSES:
+                return None
+            if job['status'] == 'queued':
+                job.update(status='canceled', finished_at=time.time())
+                self._append_final(job_id, final_event('Installation canceled', 'canceled'))
+                return 'canceled'
+            job['cancel_requested'] = True
+            return 'cancelling'
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return bool(job and job['cancel_requested'])
+
+    def append_events(self, job_id, frames):
+        with self._lock:
+            self._events.setdefault(job_id, {}).update(frames)
+
+    def events_since(self, job_id, after=0):
+        with self._lock:
+            events = self._events.get(job_id, {})
+            return sorted((seq, frame) for seq, frame in events.items() if seq > after)
+
+    def last_event_seq(self, job_id):
+        with self._lock:
+            return max(self._events.get(job_id, {}), default=0)
+
+    def heartbeat(self, worker):
+        with self._lock:
+            self._workers[worker] = time.time()
+
+    def expire(self, stale_after):
+        with self._lock:
+            cutoff = time.time() - stale_after
+            lost = [job for job in self._jobs.values()
+                    if (job['status'] == 'running' and self._workers.get(job['worker'], 0) < cutoff)
+                    or (job['status'] == 'queued' and job['owner'] and self._workers.get(job['owner'], 0) < cutoff)]
+            for job in lost:
+                job.update(status='lost', finished_at=time.time())
+                self._append_final(job['id'], final_event('Installation lost with its worker', 'lost'))
+            return [job['id'] for job in lost]
+
+    def prune(self, older_than):
+        with self._lock:
+            cutoff = time.time() - older_than
+            old = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in FINAL_STATUSES and (job['finished_at'] or 0) < cutoff]
+            for job_id in old:
+                del self._jobs[job_id]
+                self._events.pop(job_id, None)
+            return len(old)
+
+
+class SQLiteJobStore(JobStore):
+    """Job registry in a WAL-mode SQLite database; safe to share between processes on one volume"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['data'] = json.loads(job['data'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def _position(self, db, job_id):
+        row = db.execute("""
+            SELECT COUNT(*) + 1 FROM jobs q, jobs j
+            WHERE j.id = ? AND j.status = 'queued' AND q.status = 'queued'
+              AND (q.priority > j.priority OR (q.priority = j.priority AND q.rowid < j.rowid))
+        """, (job_id,)).fetchone()
+        status = db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if status and status[0] == 'queued' else None
+
+    def create(self, job_id, data, priority=0, max_queued=None, owner=None):
+        with self._transaction() as db:
+            if max_queued is not None:
+                queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= max_queued:
+                    return None
+            db.execute('INSERT INTO jobs (id, status, priority, data, owner, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                       (job_id, 'queued', int(priority), json.dumps(data), owner, time.time()))
+            return self._position(db, job_id)
+
+    def claim(self, worker):
+        with self._transaction() as db:
+            row = db.execute("""
+                UPDATE jobs SET status = 'running', worker = ?, started_at = ?
+                WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND (owner IS NULL OR owner = ?)
+                            ORDER BY priority DESC, rowid LIMIT 1)
+                RETURNING *
+            """, (worker, time.time(), worker)).fetchone()
+            return self._row(row)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row(self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def list_jobs(self, status=None, limit=100):
+        where = 'WHERE status = ?' if status else ''
+        params = ([status] if status else []) + [limit]
+        with self._lock:
+            rows = self._db.execute(f'SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?', params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def position(self, job_id):
+        with self._lock:
+            return self._position(self._db, job_id)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def finish(self, job_id, status):
+        with self._transaction() as db:
+            db.execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), job_id))
+
+    def _append_final(self, db, job_id, event):
+        seq = db.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?', (job_id,)).fetchone()[0]
+        db.execute('INSERT INTO job_events VALUES (?, ?, ?)', (job_id, seq, encode_frame(seq, event)))
+
+    def request_cancel(self, job_id):
+        with self._transaction() as db:
+            row = db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None or row[0] in FINAL_STATUSES:
+                return None
+            if row[0] == 'queued':
+                db.execute("UPDATE jobs SET status = 'canceled', finished_at = ? WHERE id = ?", (time.time(), job_id))
+                self._append_final(db, job_id, final_event('Installation canceled', 'canceled'))
+                return 'canceled'
+            db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+            return 'cancelling'
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            row = self._db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def append_events(self, job_id, frames):
+        with self._transaction() as db:
+            db.executemany('INSERT OR REPLACE INTO job_events VALUES (?, ?, ?)',
+                           [(job_id, seq, frame) for seq, frame in frames])
+
+    def events_since(self, job_id, after=0):
+        with self._lock:
+            return [tuple(row) for row in self._db.execute(
+                'SELECT seq, frame FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, after)
+            ).fetchall()]
+
+    def last_event_seq(self, job_id):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?',
+                                    (job_id,)).fetchone()[0]
+
+    def heartbeat(self, worker):
+        with self._transaction() as db:
+            db.execute('INSERT OR REPLACE INTO workers VALUES (?, ?)', (worker, time.time()))
+
+    def expire(self, stale_after):
+        with self._transaction() as db:
+            lost = [row[0] for row in db.execute("""
+                SELECT j.id FROM jobs j
+                LEFT JOIN workers w ON w.id = CASE j.status WHEN 'running' THEN j.worker ELSE j.owner END
+                WHERE (j.status = 'running' OR (j.status = 'queued' AND j.owner IS NOT NULL))
+                  AND COALESCE(w.heartbeat_at, 0) < ?
+            """, (time.time() - stale_after,)).fetchall()]
+            for job_id in lost:
+                db.execute("UPDATE jobs SET status = 'lost', finished_at = ? WHERE id = ?", (time.time(), job_id))
+                self._append_final(db, job_id, final_event('Installation lost with its worker', 'lost'))
+            return lost
+
+    def prune(self, older_than):
+        statuses = ', '.join('?' * len(FINAL_STATUSES))
+        with self._transaction() as db:
+            old = [row[0] for row in db.execute(
+                f'SELECT id FROM jobs WHERE status IN ({statuses}) AND finished_at < ?',
+                FINAL_STATUSES + (time.time() - older_than,)
+            ).fetchall()]
+            db.executemany('DELETE FROM job_events WHERE job_id = ?', [(job_id,) for job_id in old])
+            db.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in old])
+            return len(old)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT under the store's thread lock, so read-modify-write is atomic across processes"""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+
+
+class JobStoreServer(BaseManager):
+    pass
+
+
+class JobStoreClient(BaseManager):
+    pass
+
+
+JobStoreClient.register('store')
+
+
+def check_authkey(authkey):
+    """The authkey as bytes; raises ValueError when it is missing or publicly known"""
+    if not authkey:
+        raise ValueError(f'The remote job store needs an authkey (job_store_authkey or ${AUTHKEY_ENV})')
+    if authkey in PUBLISHED_AUTHKEYS:
+        raise ValueError('The remote job store authkey must not be the published default')
+    return authkey.encode()
+
+
+def serve_job_store(address, authkey):
+    """Serve one MemoryJobStore over TCP until interrupted"""
+    store = MemoryJobStore()
+    JobStoreServer.register('store', callable=lambda: store)
+    manager = JobStoreServer(address=address, authkey=authkey)
+    logger.info(f"Serving job store on {address[0]}:{address[1]}")
+    manager.get_server().serve_forever()
+
+
+class RemoteJobStore(JobStore):
+    """Client of a job store served by serve_job_store; every call is a round trip to the server"""
+
+    def __init__(self, address, authkey):
+        self._manager = JobStoreClient(address=address, authkey=authkey)
+        self._manager.connect()
+        self._store = self._manager.store()
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+
+def open_job_store(settings, sqlite_path):
+    """Build the backend named by the `job_store` setting"""
+    backend = settings.get('job_store', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteJobStore(sqlite_path)
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'remote':
+        host, port = settings.get('job_store_address', '127.0.0.1:5002').rsplit(':', 1)
+        authkey = check_authkey(settings.get('job_store_authkey') or os.environ.get(AUTHKEY_ENV))
+        return RemoteJobStore((host, int(port)), authkey)
+    raise ValueError(f'Unknown job store backend {backend}')
+
+
+class CancelCheck:
+    """ansible-runner cancel_callback asking the store whether a job was canceled, at most every `interval` seconds"""
+
+    def __init__(self, store, job_id, interval=1.0):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self._checked_at = 0
+        self._canceled = False
+
+    def __call__(self):
+        now = time.monotonic()
+        if not self._canceled and now - self._checked_at >= self.interval:
+            self._checked_at = now
+            try:
+                self._canceled = self.store.cancel_requested(self.job_id)
+            except Exception as e:
+                logger.error(f"Could not check cancellation of {self.job_id}: {e}")
+        return self._canceled
+
+
+class EventForwarder:
+    """Copy frames from local event buffers into the job store in batches, off the producers' threads
+
+    Like a lagging stream subscriber, the store misses frames evicted from a buffer before they were copied.
+    """
+
+    def __init__(self, store, interval=0.2):
+        self.store = store
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._dirty = {}
+        self._attached = {}
+        threading.Thread(target=self._forward_loop, name='event-forwarder', daemon=True).start()
+
+    def attach(self, job_id, buffer):
+        """Forward every event appended to `buffer` from now on"""
+        listener = lambda: self._mark(job_id)
+        with self._condition:
+            self._attached[job_id] = [buffer, buffer.last_seq, listener]
+        buffer.add_listener(listener)
+
+    def _mark(self, job_id):
+        with self._condition:
+            self._dirty[job_id] = True
+            self._condition.notify()
+
+    def flush(self, job_id, timeout=10):
+        """Forward the job's remaining frames now and stop following its buffer"""
+        with self._condition:
+            entry = self._attached.pop(job_id, None)
+            self._dirty.pop(job_id, None)
+        if entry is None:
+            return
+        buffer, cursor, listener = entry
+        buffer.remove_listener(listener)
+        self._forward(job_id, buffer, cursor)
+
+    def _forward(self, job_id, buffer, cursor):
+        frames = buffer.frames(cursor)
+        if frames:
+            try:
+                self.store.append_events(job_id, frames)
+            except Exception as e:
+                logger.error(f"Could not forward {len(frames)} events of {job_id}: {e}")
+                return cursor
+        return frames[-1][0] if frames else cursor
+
+    def _forward_loop(self):
+        while True:
+            with self._condition:
+                while not self._dirty:
+                    self._condition.wait()
+            # Let a burst of events accumulate into one write
+            time.sleep(self.interval)
+            with self._condition:
+                dirty = list(self._dirty)
+                self._dirty.clear()
+                entries = {job_id: self._attached[job_id] for job_id in dirty if job_id in self._attached}
+            for job_id, entry in entries.items():
+                entry[1] = self._forward(job_id, entry[0], entry[1])
+
+
+class EventMirror:
+    """Local event buffers following jobs that run on other workers (or ran before this process started)
+
+    One thread polls the store for each mirrored job every `interval` seconds and appends the new frames to the
+    job's mirror buffer; streams subscribe to that buffer like to a local job's, so a job costs one query per
+    interval on each worker however many streams follow it. Mirrors nobody subscribed to for `linger` seconds
+    are dropped.
+    """
+
+    def __init__(self, store, buffer_size=1000, interval=1.0, linger=60):
+        self.store = store
+        self.buffer_size = buffer_size
+        self.interval = interval
+        self.linger = linger
+        self._buffers = EventBufferRegistry(buffer_size)
+        self._lock = threading.Lock()
+        # {job_id: buffer} of mirrors still polled, and when each last had no subscribers
+        self._open = {}
+        self._idle_since = {}
+        threading.Thread(target=self._poll_loop, name='event-mirror', daemon=True).start()
+
+    def get(self, job_id):
+        """The mirror buffer of a job, filled with its recent frames; None when the store does not know the job"""
+        buffer = self._buffers.get(job_id)
+        if buffer is not None:
+            return buffer
+        if self.store.get(job_id) is None:
+            return None
+        with self._lock:
+            buffer = self._buffers.get(job_id)
+            if buffer is None:
+                start_seq = max(self.store.last_event_seq(job_id) - self.buffer_size, 0)
+                buffer = self._buffers.create(job_id, start_seq=start_seq)
+                self._poll(job_id, buffer)
+                if not buffer.closed:
+                    self._open[job_id] = buffer
+                    self._idle_since[job_id] = time.monotonic()
+            return buffer
+
+    def buffers(self):
+        return self._buffers.buffers()
+
+    def _poll(self, job_id, buffer):
+        """Copy new frames into the buffer; closes it once the job has finished and every frame is copied"""
+        # Status first: workers store a job's last frames before its final status
+        job = self.store.get(job_id)
+        for seq, frame in self.store.events_since(job_id, buffer.last_seq):
+            buffer.append_frame(seq, frame)
+        if job is None or job['status'] in FINAL_STATUSES:
+            buffer.close()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                mirrors = list(self._open.items())
+            for job_id, buffer in mirrors:
+                try:
+                    self._poll(job_id, buffer)
+                except Exception as e:
+                    logger.error(f"Could not poll events of {job_id}: {e}")
+                    continue
+                now = time.monotonic()
+                with self._lock:
+                    if buffer.subscribers:
+                        self._idle_since[job_id] = now
+                    if buffer.closed or now - self._idle_since[job_id] >= self.linger:
+                        self._open.pop(job_id, None)
+                        self._idle_since.pop(job_id, None)
+                        if not buffer.closed:
+                            buffer.close()
+                            self._buffers.discard(job_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a shared in-memory job store for several app workers')
+    parser.add_argument('command', choices=['serve'])
+    parser.add_argument('--address', default='127.0.0.1:5002')
+    parser.add_argument('--authkey', default=os.environ.get(AUTHKEY_ENV),
+                        help=f'shared secret of the store and its clients (default: ${AUTHKEY_ENV})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        authkey = check_authkey(args.authkey)
+    except ValueError as e:
+        parser.error(str(e))
+    host, port = args.address.rsplit(':', 1)
+    serve_job_store((host, int(port)), authkey)
@@ -0,0 +1,316 @@
+"""
+Installation log streaming and archive
+Follows `installation_<id>.log` from a byte offset, waking on the job's event buffer instead of polling the file,
+and compresses finished logs into an indexed, block-compressed archive
+"""
+
+import fcntl
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the log per chunk; chunks end on a line boundary so offsets never split a line
+READ_SIZE = 64 * 1024
+
+# Ansible result lines: "ok: [host]", "changed: [host -> delegate]", "fatal: [host]: UNREACHABLE! => ..."
+RESULT_PATTERN = re.compile(r'^(ok|changed|failed|fatal|skipping|unreachable|rescued|ignored): \[([^\]\s]+)[^\]]*\](: UNREACHABLE!)?')
+TASK_PATTERN = re.compile(r'^TASK \[(.*)\] \*+')
+STARTED_PATTERN = re.compile(r'^Installation started at (\S+ \S+)')
+
+# Uncompressed bytes per archive block; a search decompresses only the blocks holding its hits
+BLOCK_SIZE = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    installation_id TEXT NOT NULL UNIQUE,
+    segment TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    log INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    segment_offset INTEGER NOT NULL,
+    compressed_size INTEGER NOT NULL,
+    PRIMARY KEY (log, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS names (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS entries (
+    host INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    log INTEGER NOT NULL,
+    task INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    PRIMARY KEY (host, status, log, task)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_status ON entries (status, log);
+CREATE INDEX IF NOT EXISTS logs_started ON logs (started_at);
+"""
+
+# Every task result with these statuses is indexed; other statuses keep one entry per host and log
+FAILED_STATUSES = ('failed', 'unreachable')
+
+
+def log_path(log_dir, installation_id):
+    return os.path.join(log_dir, f'installation_{installation_id}.log')
+
+
+def read_lines(f, offset):
+    """Read complete lines starting at `offset`; returns (data, new_offset)"""
+    f.seek(offset)
+    data = f.read(READ_SIZE)
+    end = data.rfind(b'\n')
+    if end == -1:
+        # A single line longer than READ_SIZE is sent as is rather than waiting forever
+        return (data, offset + len(data)) if len(data) == READ_SIZE else (b'', offset)
+    return data[:end + 1], offset + end + 1
+
+
+def follow_log(path, offset=0, buffer=None, timeout=None):
+    """Yield (offset, text) for each new chunk of the log and None when `timeout` passes idle
+
+    Stops at the end of the file once `buffer` is closed, or immediately at the end when there is no
+    buffer (the installation finished before this process started or was evicted).
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = min(max(offset, 0), size)
+        while True:
+            activity = buffer.activity if buffer is not None else None
+            data, offset = read_lines(f, offset)
+            if data:
+                yield offset, data.decode('utf-8', errors='replace')
+                continue
+
+            if buffer is None or buffer.closed:
+                # Flush a final line without a trailing newline
+                f.seek(offset)
+                rest = f.read()
+                if rest:
+                    yield offset + len(rest), rest.decode('utf-8', errors='replace')
+                return
+            if not buffer.wait_for_activity(activity, timeout) and buffer.activity == activity:
+                yield None
+
+
+def split_blocks(data):
+    """Split a log into blocks of about BLOCK_SIZE bytes, each ending on a line boundary"""
+    blocks = []
+    start = 0
+    while start < len(data):
+        end = data.rfind(b'\n', start, start + BLOCK_SIZE)
+        end = len(data) if start + BLOCK_SIZE >= len(data) or end == -1 else end + 1
+        blocks.append(data[start:end])
+        start = end
+    return blocks
+
+
+def scan_block(text, task=None):
+    """Return ([(host, task, status, line number)], last task) for the result lines of one block"""
+    entries = []
+    for number, line in enumerate(text.split('\n')):
+        match = TASK_PATTERN.match(line)
+        if match:
+            task = match.group(1)
+            continue
+        match = RESULT_PATTERN.match(line)
+        if match:
+            status = 'unreachable' if match.group(3) else 'failed' if match.group(1) == 'fatal' else match.group(1)
+            entries.append((match.group(2), task or '', status, number))
+    return entries, task
+
+
+class LogArchive:
+    """Finished logs as zlib blocks appended to monthly segment files, indexed in SQLite by host and status"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Serializes archiving across processes sharing the directory (see archive())
+        self.lock_path = os.path.join(directory, 'archive.lock')
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def has(self, installation_id):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM logs WHERE installation_id = ?', (installation_id,)).fetchone() is not None
+
+    def _name_ids(self, names):
+        self._db.executemany('INSERT OR IGNORE INTO names (name) VALUES (?)', [(name,) for name in names])
+        ids = {}
+        for name in names:
+            ids[name] = self._db.execute('SELECT id FROM names WHERE name = ?', (name,)).fetchone()[0]
+        return ids
+
+    def archive(self, installation_id, path):
+        """Compress and index a finished log, then remove the plain-text file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        finished_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+        header = STARTED_PATTERN.match(data[:200].decode('utf-8', errors='replace'))
+        started_at = datetime.fromisoformat(header.group(1)).isoformat() if header else None
+
+        blocks = []
+        entries = {}
+        task = None
+        start = 0
+        for index, block in enumerate(split_blocks(data)):
+            block_entries, task = scan_block(block.decode('utf-8', errors='replace'), task)
+            for host, task_name, status, line in block_entries:
+                key = (host, status, task_name if status in FAILED_STATUSES else None)
+                entries.setdefault(key, (task_name, index, line))
+            blocks.append((index, start, len(block), zlib.compress(block, 6)))
+            start += len(block)
+        status = 'failed' if any(key[1] in FAILED_STATUSES for key in entries) else 'ok'
+
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            # The file lock keeps other processes from appending to the segment between the offset computed
+            # here and the index rows recording it, the thread lock does the same for this one
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._db.execute('SELECT 1 FROM logs WHERE installation_id = ?', (installation_id,)).fetchone():
+                    os.remove(path)
+                    return
+                segment = f"logs-{datetime.now().strftime('%Y%m')}.z"
+                with open(os.path.join(self.directory, segment), 'ab') as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    block_rows = []
+                    for index, block_start, size, compressed in blocks:
+                        f.write(compressed)
+                        block_rows.append((index, block_start, size, offset, len(compressed)))
+                        offset += len(compressed)
+                    f.flush()
+                    os.fsync(f.fileno())
+                with self._db:
+                    log = self._db.execute(
+                        'INSERT INTO logs (installation_id, segment, size, status, started_at, finished_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (installation_id, segment, len(data), status, started_at, finished_at)
+                    ).lastrowid
+                    self._db.executemany('INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)',
+                                         [(log,) + row for row in block_rows])
+                    names = self._name_ids({key[0] for key in entries} | {value[0] for value in entries.values()})
+                    self._db.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)', [
+                        (names[host], entry_status, log, names[task_name], block, line)
+                        for (host, entry_status, _), (task_name, block, line) in entries.items()
+                    ])
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        os.remove(path)
+        logger.info(f"Archived log of {installation_id}: {len(data)} bytes in {len(blocks)} blocks")
+
+    def archive_directory(self, log_dir, finished=None):
+        """Archive the plain-text logs in `log_dir` left behind by earlier runs
+
+        `finished(installation_id)`, if given, tells whether a log is complete; logs of jobs still running
+        (e.g. on other workers sharing the directory) are left alone.
+        """
+        for name in sorted(os.listdir(log_dir)):
+            match = re.fullmatch(r'installation_(.+)\.log', name)
+            if not match or (finished is not None and not finished(match.group(1))):
+                continue
+            try:
+                self.archive(match.group(1), os.path.join(log_dir, name))
+            except (OSError, ValueError, sqlite3.Error) as e:
+                logger.error(f"Could not archive {name}: {e}")
+
+    def _read_block(self, segment, row, handles):
+        if segment not in handles:
+            handles[segment] = open(os.path.join(self.directory, segment), 'rb')
+        f = handles[segment]
+        f.seek(row['segment_offset'])
+        return zlib.decompress(f.read(row['compressed_size']))
+
+    def read_chunks(self, installation_id, offset=0):
+        """Yield (end offset, text) per archived block from `offset` on, like follow_log does"""
+        with self._lock:
+            log = self._db.execute('SELECT id, segment FROM logs WHERE installation_id = ?', (installation_id,)).fetchone()
+            rows = [] if log is None else self._db.execute(
+                'SELECT * FROM blocks WHERE log = ? AND start + size > ? ORDER BY block', (log['id'], offset)
+            ).fetchall()
+        handles = {}
+        try:
+            for row in rows:
+                data = self._read_block(log['segment'], row, handles)[max(offset - row['start'], 0):]
+                yield row['start'] + row['size'], data.decode('utf-8', errors='replace')
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def search(self, host=None, status=None, task=None, since=None, until=None, limit=50):
+        """Find indexed results by host, status, task substring and start time, with the matching log line
+
+        Only the blocks holding the returned results are decompressed.
+        """
+        clauses = []
+        params = []
+        if host:
+            clauses.append('h.name = ?')
+            params.append(host)
+        if status:
+            clauses.append('e.status = ?')
+            params.append(status)
+        if task:
+            clauses.append('t.name LIKE ?')
+            params.append(f'%{task}%')
+        if since:
+            clauses.append('l.started_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('l.started_at < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        query = f"""
+            SELECT l.installation_id, l.segment, l.started_at, l.finished_at, h.name AS host, t.name AS task,
+                   e.status, e.block, e.line, b.segment_offset, b.compressed_size
+            FROM entries e
+            JOIN names h ON h.id = e.host
+            JOIN names t ON t.id = e.task
+            JOIN logs l ON l.id = e.log
+            JOIN blocks b ON b.log = e.log AND b.block = e.block
+            {where}
+            ORDER BY l.started_at DESC, e.block, e.line
+            LIMIT ?
+        """
+        with self._lock:
+            rows = self._db.execute(query, params + [int(limit)]).fetchall()
+
+        # Each block is decompressed at most once, however many results it holds
+        blocks = {}
+        handles = {}
+        results = []
+        try:
+            for row in rows:
+                key = (row['installation_id'], row['block'])
+                if key not in blocks:
+                    blocks[key] = self._read_block(row['segment'], row, handles).decode('utf-8', errors='replace').split('\n')
+                results.append({
+                    'installation_id': row['installation_id'],
+                    'host': row['host'],
+                    'task': row['task'],
+                    'status': row['status'],
+                    'started_at': row['started_at'],
+                    'finished_at': row['finished_at'],
+                    'line': blocks[key][row['line']]
+                })
+        finally:
+            for f in handles.values():
+                f.close()
+        return results
@@ -0,0 +1,195 @@
+"""
+Service metrics in the Prometheus text exposition format
+Counters and histograms keep their values in a fixed set of shards, each with its own lock, picked by the
+recording thread; concurrent installations and request threads rarely touch the same shard, and a scrape
+adds the shards up. Gauges are read from callbacks at scrape time, so they cost nothing in between.
+"""
+
+import bisect
+import itertools
+import math
+import threading
+
+# Shards per metric; a power of two well above the usual number of busy threads
+SHARDS = 16
+
+# Threads take shards round-robin on first use; thread idents are aligned addresses, so ident % SHARDS is
+# the same for nearly every thread
+_thread_shard = threading.local()
+_next_shard = itertools.count()
+
+
+def shard_index():
+    try:
+        return _thread_shard.index
+    except AttributeError:
+        _thread_shard.index = next(_next_shard) % SHARDS
+        return _thread_shard.index
+
+# Histogram buckets in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+HOST_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Shard:
+    __slots__ = ('lock', 'values')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._shards = [_Shard() for _ in range(SHARDS)]
+
+    def _shard(self):
+        return self._shards[shard_index()]
+
+    def _key(self, labels):
+        # Label values are kept as given and rendered with str(); callers pass them with consistent types
+        if len(labels) != len(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}')
+        return labels
+
+    def _merged(self, merge):
+        merged = {}
+        for shard in self._shards:
+            with shard.lock:
+                items = list(shard.values.items())
+            for key, value in items:
+                merged[key] = merge(merged[key], value) if key in merged else merge(None, value)
+        return merged
+
+    def header(self):
+        return f'# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n'
+
+
+class Counter(_Metric):
+    """Monotonic counter; inc() takes the label values positionally"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        shard = self._shard()
+        with shard.lock:
+            shard.values[key] = shard.values.get(key, 0) + amount
+
+    def collect(self):
+        merged = self._merged(lambda total, value: (total or 0) + value)
+        lines = [f'{self.name}{format_labels(self.labels, key)} {format_value(value)}\n'
+                 for key, value in sorted(merged.items())]
+        return self.header() + ''.join(lines)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; observe() takes the value, then the label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        shard = self._shard()
+        with shard.lock:
+            entry = shard.values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                entry = shard.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def collect(self):
+        def merge(total, entry):
+            entry = list(entry)
+            return entry if total is None else [a + b for a, b in zip(total, entry)]
+
+        lines = []
+        for key, entry in sorted(self._merged(merge).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(self.labels, key, [("le", format_value(bound))])} '
+                             f'{cumulative}\n')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {format_value(entry[-1])}\n')
+            lines.append(f'{self.name}_count{format_labels(self.labels, key)} {cumulative}\n')
+        return self.header() + ''.join(lines)
+
+
+class Gauge(_Metric):
+    """Value read at scrape time from `callback`, returning a number or {label values tuple: number}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labels=()):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def collect(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f'{self.name}{format_labels(self.labels, key)} {format_value(value)}\n'
+                 for key, value in sorted(values.items())]
+        return self.header() + ''.join(lines)
+
+
+class MetricsRegistry:
+    """Metrics exposed together on one /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=REQUEST_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, callback, labels=()):
+        return self.register(Gauge(name, documentation, callback, labels))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        parts = []
+        for metric in metrics:
+            try:
+                parts.append(metric.collect())
+            except Exception as e:
+                # One failing gauge callback must not hide the other metrics
+                parts.append(f'# {metric.name} unavailable: {escape(e)}\n')
+        return ''.join(parts)
@@ -0,0 +1,131 @@
+"""
+Pre-flight Java version probe
+Checks every target with a raw `java -version` before the main run so hosts already at the
+requested version and vendor can be left out of it
+"""
+
+import logging
+import os
+import re
+import threading
+
+import ansible_runner
+
+from installer import OS_GROUPS
+
+logger = logging.getLogger(__name__)
+
+VERSION_PATTERN = re.compile(r'version "([^"]+)"')
+
+# Substrings of `java -version` output identifying a vendor, checked in order
+VENDOR_MARKERS = (
+    ('zulu', 'azul'),
+    ('ibm', 'ibm'),
+    ('j9', 'ibm'),
+    ('temurin', 'temurin'),
+    ('corretto', 'amazon'),
+    ('java(tm)', 'oracle'),
+    ('openjdk', 'openjdk')
+)
+
+
+def parse_java_version(output):
+    """Return (version, vendor) from `java -version` output; either may be None"""
+    match = VERSION_PATTERN.search(output or '')
+    if not match:
+        return None, None
+    lowered = output.lower()
+    vendor = next((vendor for marker, vendor in VENDOR_MARKERS if marker in lowered), None)
+    return match.group(1), vendor
+
+
+def version_tuple(version):
+    """Numeric components of a Java version, with legacy '1.8.0_401' normalized to (8, 0, 401)"""
+    parts = [int(part) for part in re.findall(r'\d+', str(version))]
+    if len(parts) > 1 and parts[0] == 1:
+        parts = parts[1:]
+    return tuple(parts)
+
+
+def is_compliant(installed_version, installed_vendor, target_version, target_vendor):
+    """True when the installed Java matches the target version (as a prefix) and vendor
+
+    With a target vendor, an installation whose vendor could not be recognized does not match.
+    """
+    if not installed_version or not target_version:
+        return False
+    target = version_tuple(target_version)
+    if version_tuple(installed_version)[:len(target)] != target:
+        return False
+    return not target_vendor or installed_vendor == target_vendor.lower()
+
+
+def probe_command(group, install_path):
+    """Raw command printing `java -version` for the group's platform, preferring the profile path"""
+    if group == OS_GROUPS['windows']:
+        java = f'{install_path}\\bin\\java.exe'
+        return f'if (Test-Path "{java}") {{ & "{java}" -version 2>&1 }} else {{ java -version 2>&1 }}'
+    java = f'{install_path}/bin/java'
+    return f'if [ -x "{java}" ]; then "{java}" -version 2>&1; else java -version 2>&1; fi'
+
+
+def probe_groups(inventory):
+    if isinstance(inventory, dict):
+        return list(inventory.get('all', {}).get('children', {}))
+    return list(OS_GROUPS.values())
+
+
+def run_preflight(private_data_dir, inventory, install_path, target_version, target_vendor, **runner_options):
+    """Probe all inventory groups in parallel; returns {host: {'status', 'version', 'vendor'}}"""
+    results = {}
+    lock = threading.Lock()
+
+    def probe(group):
+        def event_handler(event):
+            status = {'runner_on_ok': 'ok', 'runner_on_failed': 'failed',
+                      'runner_on_unreachable': 'unreachable'}.get(event.get('event'))
+            if status is None:
+                return False
+            event_data = event.get('event_data') or {}
+            res = event_data.get('res') or {}
+            version, vendor = parse_java_version(res.get('stdout', ''))
+            if is_compliant(version, vendor, target_version, target_vendor):
+                status = 'compliant'
+            with lock:
+                results[event_data.get('host')] = {'status': status, 'version': version, 'vendor': vendor}
+            return False
+
+        group_dir = os.path.join(private_data_dir, 'preflight', group)
+        os.makedirs(group_dir, exist_ok=True)
+        try:
+            ansible_runner.run(
+                private_data_dir=group_dir,
+                host_pattern=group,
+                module='raw',
+                module_args=probe_command(group, install_path),
+                inventory=inventory,
+                event_handler=event_handler,
+                quiet=True,
+                **runner_options
+            )
+        except Exception as e:
+            logger.error(f"Pre-flight probe of {group} failed: {e}")
+
+    threads = [threading.Thread(target=probe, args=(group,), name=f'preflight-{group}') for group in probe_groups(inventory)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def exclusion_limit(compliant_hosts, path):
+    """ansible --limit selecting every host except the compliant ones
+
+    The patterns go to a limit file at `path`, one per line, since a single argument naming thousands of hosts
+    can pass the kernel's per-argument size limit; returns the '@path' form that reads it.
+    """
+    with open(path, 'w') as f:
+        # No trailing newline: ansible would read an empty pattern after it
+        f.write('\n'.join(['all'] + [f'!{host}' for host in sorted(compliant_hosts)]))
+    return f'@{path}'
@@ -0,0 +1,154 @@
+"""
+Rolling (wave) deployments
+Runs java-install.yml once per inventory group in parallel, each play with its own serial waves,
+max_fail_percentage stop condition and strategy
+"""
+
+import copy
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+import yaml
+
+from installer import OS_GROUPS, PLAYBOOK_FILE, RunnerEventTranslator, count_playbook_tasks, run_playbook
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('linear', 'free')
+WAVE_PATTERN = re.compile(r'\d+%?')
+
+
+def parse_rollout(options):
+    """Validate rollout options from an install request; returns None when rollout mode is off"""
+    if not options:
+        return None
+    if not isinstance(options, dict):
+        raise ValueError('rollout must be an object')
+    if not options.get('enabled', True):
+        return None
+
+    serial = options.get('serial', 1)
+    waves = serial if isinstance(serial, list) else [serial]
+    if not waves or not all(WAVE_PATTERN.fullmatch(str(wave)) for wave in waves):
+        raise ValueError("serial must be a host count, a percentage like '25%', or a list of them")
+    waves = [wave if isinstance(wave, int) or str(wave).endswith('%') else int(wave) for wave in waves]
+
+    max_fail_percentage = options.get('max_fail_percentage')
+    if max_fail_percentage is not None and not 0 <= int(max_fail_percentage) <= 100:
+        raise ValueError('max_fail_percentage must be between 0 and 100')
+
+    strategy = options.get('strategy', 'linear')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+
+    groups = options.get('groups') or list(OS_GROUPS.values())
+    if not isinstance(groups, list) or not all(isinstance(group, str) for group in groups):
+        raise ValueError('groups must be a list of inventory group names')
+    unknown = sorted(set(groups) - set(OS_GROUPS.values()))
+    if unknown:
+        raise ValueError(f"Unknown inventory groups: {', '.join(unknown)}")
+
+    return {
+        'serial': waves if isinstance(serial, list) else waves[0],
+        'max_fail_percentage': None if max_fail_percentage is None else int(max_fail_percentage),
+        'strategy': strategy,
+        'groups': groups
+    }
+
+
+def inventory_groups(inventory, requested):
+    """Restrict the requested groups to the ones a wizard-built inventory actually defines"""
+    if isinstance(inventory, dict):
+        defined = inventory.get('all', {}).get('children', {})
+        return [group for group in requested if group in defined]
+    return list(requested)
+
+
+def write_group_playbook(path, group, rollout, base_playbook=None):
+    """Write a copy of the base playbook targeting one group with the rollout play settings
+
+    Plays for other groups (in a compiled playbook) are dropped; returns None when no play is left.
+    """
+    with open(base_playbook or PLAYBOOK_FILE, 'r') as f:
+        plays = yaml.safe_load(f) or []
+
+    group_plays = []
+    for play in plays:
+        if play.get('hosts') not in ('all', group):
+            continue
+        play = copy.deepcopy(play)
+        play['hosts'] = group
+        play['serial'] = rollout['serial']
+        play['strategy'] = rollout['strategy']
+        if rollout['max_fail_percentage'] is not None:
+            play['max_fail_percentage'] = rollout['max_fail_percentage']
+        group_plays.append(play)
+    if not group_plays:
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        yaml.safe_dump(group_plays, f, sort_keys=False)
+    return path
+
+
+def run_rollout(installation_id, private_data_dir, inventory, extravars, buffer, log_file, rollout,
+                cancel_callback=None, base_playbook=None, event_callback=None, **runner_options):
+    """Run one rollout play per inventory group concurrently; returns {group: runner}"""
+    playbooks = {}
+    for group in inventory_groups(inventory, rollout['groups']):
+        path = os.path.join(private_data_dir, group, 'project', 'java-install.yml')
+        playbook = write_group_playbook(path, group, rollout, base_playbook)
+        if playbook:
+            playbooks[group] = playbook
+    if not playbooks:
+        raise ValueError('None of the rollout groups has hosts in the inventory')
+
+    translator = RunnerEventTranslator(sum(count_playbook_tasks(playbook) for playbook in playbooks.values()))
+    runners = {}
+    errors = {}
+
+    def run_group(group):
+        group_dir = os.path.join(private_data_dir, group)
+        try:
+            runners[group] = run_playbook(
+                f'{installation_id}-{group}',
+                group_dir,
+                inventory,
+                extravars,
+                buffer,
+                log_file,
+                cancel_callback=cancel_callback,
+                playbook=playbooks[group],
+                translator=translator,
+                tags={'group': group},
+                report_completion=False,
+                event_callback=event_callback,
+                **runner_options
+            )
+        except Exception as e:
+            logger.error(f"Rollout of {installation_id} to {group} failed: {e}")
+            errors[group] = str(e)
+
+    threads = [threading.Thread(target=run_group, args=(group,), name=f'rollout-{group}') for group in playbooks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = {group: runner.status for group, runner in runners.items()}
+    statuses.update({group: 'error' for group in errors})
+    succeeded = all(status == 'successful' for status in statuses.values())
+    outcome = 'successful' if succeeded else 'canceled' if 'canceled' in statuses.values() else 'failed'
+    buffer.append({
+        'step': 'Installation complete' if succeeded else f'Installation {outcome}',
+        'status': outcome,
+        'groups': statuses,
+        'progress': 100,
+        'timestamp': datetime.now().isoformat(),
+        'completed': True
+    })
+    return runners
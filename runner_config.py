@@ -0,0 +1,73 @@
+"""
+Per-job Ansible configuration
+Generates an ansible.cfg for every installation with SSH multiplexing, pipelining, forks and timeouts
+"""
+
+import configparser
+import os
+import shutil
+import tempfile
+
+# Keep control sockets well under the 108 byte UNIX socket path limit
+CONTROL_PATH_ROOT = os.path.join(tempfile.gettempdir(), 'jiw-cp')
+
+
+def control_path_dir(job_id):
+    return os.path.join(CONTROL_PATH_ROOT, job_id.replace('-', '')[:12])
+
+
+def remove_control_path_dir(job_id):
+    """Remove a finished job's control sockets; masters still persisting exit once their ControlPersist ends"""
+    shutil.rmtree(control_path_dir(job_id), ignore_errors=True)
+
+
+def build_ansible_cfg(job_id, settings, fact_cache_dir=None):
+    """Return the ansible.cfg contents for a job as a ConfigParser"""
+    control_persist = int(settings.get('ssh_control_persist', 60))
+    cfg = configparser.ConfigParser(interpolation=None)
+    cfg['defaults'] = {
+        'forks': str(settings.get('ansible_forks', 25)),
+        'timeout': str(settings.get('connection_timeout', 30)),
+        # default_timeout bounds each task rather than the whole run, which grows with fleet size
+        'task_timeout': str(settings.get('default_timeout', 300)),
+        'internal_poll_interval': '0.005',
+        'retry_files_enabled': 'False',
+        'nocows': '1'
+    }
+    if fact_cache_dir:
+        # Reuse cached facts across runs; only hosts without fresh facts are gathered
+        cfg['defaults'].update({
+            'gathering': 'smart',
+            'fact_caching': 'jsonfile',
+            'fact_caching_connection': fact_cache_dir,
+            'fact_caching_timeout': str(settings.get('fact_cache_timeout', 86400))
+        })
+    # Pipelining runs modules over the open session instead of copying temp files first;
+    # core reads it from [connection], the ssh plugin from [ssh_connection]
+    cfg['connection'] = {'pipelining': 'True'}
+    cfg['ssh_connection'] = {
+        'pipelining': 'True',
+        'ssh_args': f'-C -o ControlMaster=auto -o ControlPersist={control_persist}s -o ServerAliveInterval=15',
+        'control_path_dir': control_path_dir(job_id),
+        # %C hashes host, port and user, so the socket name stays short
+        'control_path': '%(directory)s/%%C',
+        'retries': '2'
+    }
+    return cfg
+
+
+def job_runner_options(private_data_dir, job_id, settings, fact_cache_dir=None):
+    """Write the job's ansible.cfg and return the extra ansible-runner options that use it"""
+    os.makedirs(private_data_dir, exist_ok=True)
+    os.makedirs(control_path_dir(job_id), mode=0o700, exist_ok=True)
+
+    cfg_path = os.path.join(private_data_dir, 'ansible.cfg')
+    with open(cfg_path, 'w') as f:
+        build_ansible_cfg(job_id, settings, fact_cache_dir).write(f)
+
+    options = {'envvars': {'ANSIBLE_CONFIG': cfg_path}}
+    if fact_cache_dir:
+        # ansible-runner otherwise points the jsonfile cache at a per-run artifact directory via
+        # environment variables, which take precedence over ansible.cfg
+        options['fact_cache_type'] = None
+    return options
@@ -0,0 +1,186 @@
+"""
+Installation job scheduler
+Fixed-size worker pool claiming jobs from a shared job store, higher priority first.
+Several app workers can share one store; each runs its own pool and heartbeats, and jobs left
+running by a worker that stopped heartbeating are marked lost.
+Requests carrying credentials are stored redacted: the full request stays in the memory of the worker that
+accepted it, which is then the only one allowed to run the job.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the waiting queue has no room for another job"""
+
+    def __init__(self, retry_after):
+        super().__init__('Installation queue is full')
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Run jobs from `store` on `workers` threads, higher priority first, FIFO within a priority
+
+    `target(job_id, data)` returns the job's final status, which is recorded in the store.
+    `redact(data)`, if given, returns the copy of a request that may be stored (see the module docstring).
+    """
+
+    def __init__(self, target, store, worker_id, workers=5, max_queued=50, initial_duration=300,
+                 poll_interval=1.0, heartbeat_interval=10, stale_after=60, retention=604800, prune_interval=3600,
+                 redact=None):
+        self.target = target
+        self.store = store
+        self.redact = redact
+        self.worker_id = worker_id
+        self.workers = max(int(workers), 1)
+        self.max_queued = max(int(max_queued), 0)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        # Finished jobs and their progress frames are deleted `retention` seconds after they end
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._condition = threading.Condition()
+        self._running = set()
+        # {job id: full request} of queued and running jobs submitted here whose stored request is redacted
+        self._secrets = {}
+        # Exponential moving average of job duration, used for ETAs and Retry-After
+        self._avg_duration = float(initial_duration)
+
+        self.store.heartbeat(self.worker_id)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'installation-worker-{i}')
+            thread.daemon = True
+            thread.start()
+        thread = threading.Thread(target=self._maintain, name='installation-heartbeat')
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def running(self):
+        return len(self._running)
+
+    def submit(self, job_id, data, priority=0):
+        """Queue a job and return its (1-based) queue position and ETA in seconds"""
+        stored = self.redact(data) if self.redact else data
+        owner = self.worker_id if stored != data else None
+        with self._condition:
+            # Idle workers pick jobs up immediately, so they add to the waiting capacity
+            idle = self.workers - len(self._running)
+            if owner:
+                self._secrets[job_id] = data
+            position = self.store.create(job_id, stored, priority, self.max_queued + idle, owner)
+            if position is None:
+                self._secrets.pop(job_id, None)
+                raise QueueFull(self._retry_after())
+            self._condition.notify()
+            return position, self._eta(position)
+
+    def cancel(self, job_id):
+        """Cancel a job through the store (see JobStore.request_cancel), dropping its request once it is over"""
+        result = self.store.request_cancel(job_id)
+        if result == 'canceled':
+            with self._condition:
+                self._secrets.pop(job_id, None)
+        return result
+
+    def status(self, job_id):
+        """Return ('running', 0, 0), ('queued', position, eta), (final status, 0, 0) or None for unknown jobs"""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job['status'] != 'queued':
+            return job['status'], 0, 0
+        position = self.store.position(job_id)
+        return 'queued', position, self._eta(position)
+
+    def stats(self):
+        counts = self.store.counts()
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'running': len(self._running),
+                'queued': counts.get('queued', 0),
+                'running_everywhere': counts.get('running', 0),
+                'max_queued': self.max_queued,
+                'average_duration': round(self._avg_duration, 1)
+            }
+
+    def _eta(self, position):
+        # Every `workers` jobs ahead of this one (including running ones) cost one average duration
+        ahead = position - 1 + len(self._running)
+        return int(ahead // self.workers * self._avg_duration)
+
+    def _retry_after(self):
+        return max(int(self._avg_duration / self.workers), 1)
+
+    def _claim(self):
+        """Wait for a job; submissions on this worker wake it at once, others are seen within poll_interval"""
+        while True:
+            try:
+                job = self.store.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {e}")
+                job = None
+            if job is not None:
+                return job
+            with self._condition:
+                self._condition.wait(self.poll_interval)
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            job_id = job['id']
+            with self._condition:
+                self._running.add(job_id)
+
+            with self._condition:
+                data = self._secrets.get(job_id, job['data'])
+            started = time.monotonic()
+            status = 'error'
+            try:
+                status = self.target(job_id, data) or 'error'
+            except Exception as e:
+                logger.error(f"Job {job_id} raised: {e}")
+            finally:
+                duration = time.monotonic() - started
+                try:
+                    self.store.finish(job_id, status)
+                except Exception as e:
+                    logger.error(f"Could not record the end of job {job_id}: {e}")
+                with self._condition:
+                    self._running.discard(job_id)
+                    self._secrets.pop(job_id, None)
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+    def _maintain(self):
+        last_prune = 0
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat(self.worker_id)
+                for job_id in self.store.expire(self.stale_after):
+                    logger.warning(f"Job {job_id} lost its worker")
+                self._drop_finished_secrets()
+                if time.monotonic() - last_prune >= self.prune_interval:
+                    last_prune = time.monotonic()
+                    pruned = self.store.prune(self.retention)
+                    if pruned:
+                        logger.info(f"Pruned {pruned} finished jobs")
+            except Exception as e:
+                logger.error(f"Job store maintenance failed: {e}")
+
+    def _drop_finished_secrets(self):
+        """Forget the requests of queued jobs that were canceled through another worker"""
+        with self._condition:
+            waiting = [job_id for job_id in self._secrets if job_id not in self._running]
+        for job_id in waiting:
+            job = self.store.get(job_id)
+            # A running job may just have been claimed here; its worker thread drops the request when it ends
+            if job is None or job['status'] not in ('queued', 'running'):
+                with self._condition:
+                    self._secrets.pop(job_id, None)
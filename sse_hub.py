@@ -0,0 +1,240 @@
+"""
+Asynchronous server-sent events hub
+Serves the progress and log streams from one asyncio event loop on its own port, so an idle browser tab
+costs a socket and a coroutine instead of a server thread. Event buffers wake the loop once per change,
+however many streams are attached to them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+
+from logs import log_path, read_lines
+
+logger = logging.getLogger(__name__)
+
+ROUTE_PATTERN = re.compile(r'^/api/(progress|logs)/([A-Za-z0-9_.-]+)$')
+
+# Largest request head accepted from a client
+MAX_REQUEST_HEAD = 16 * 1024
+
+
+class Topic:
+    """Streams attached to one event buffer, woken together by a single buffer listener"""
+
+    def __init__(self, hub, buffer):
+        self.buffer = buffer
+        self.waiters = set()
+        self._listener = lambda: hub.loop.call_soon_threadsafe(self.wake)
+        buffer.add_listener(self._listener)
+
+    def wake(self):
+        for waiter in self.waiters:
+            waiter.set()
+
+    def detach(self):
+        self.buffer.remove_listener(self._listener)
+
+
+class SSEHub:
+    """Progress (`/api/progress/<id>`) and log (`/api/logs/<id>`) streams served from an asyncio loop"""
+
+    def __init__(self, event_buffers, log_dir, log_archive=None, event_mirror=None, heartbeat=15, replay=100,
+                 max_lag=200):
+        self.event_buffers = event_buffers
+        self.log_dir = log_dir
+        self.log_archive = log_archive
+        # Buffers of jobs this process does not run, fed from the job store (jobs.EventMirror)
+        self.event_mirror = event_mirror
+        self.heartbeat = heartbeat
+        self.replay = replay
+        self.max_lag = max_lag
+        self.loop = None
+        self.connections = 0
+        self._topics = {}
+        self._ready = threading.Event()
+        # Why the loop could not start listening, raised again by start()
+        self._error = None
+
+    def start(self, host='0.0.0.0', port=5001):
+        """Run the hub's event loop in a daemon thread; raises what kept it from listening (e.g. port in use)"""
+        thread = threading.Thread(target=self._run, args=(host, port), name='sse-hub', daemon=True)
+        thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            thread.join()
+            raise self._error
+        return thread
+
+    def _run(self, host, port):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle, host, port, limit=MAX_REQUEST_HEAD, backlog=1024
+            ))
+        except Exception as e:
+            self._error = e
+            self.loop.close()
+            return
+        finally:
+            self._ready.set()
+        logger.info(f"SSE hub listening on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+        self.loop.run_forever()
+
+    def _subscribe(self, installation_id, buffer):
+        topic = self._topics.get(installation_id)
+        if topic is None or topic.buffer is not buffer:
+            topic = self._topics[installation_id] = Topic(self, buffer)
+        waiter = asyncio.Event()
+        topic.waiters.add(waiter)
+        return topic, waiter
+
+    def _unsubscribe(self, installation_id, topic, waiter):
+        topic.waiters.discard(waiter)
+        if not topic.waiters:
+            topic.detach()
+            if self._topics.get(installation_id) is topic:
+                del self._topics[installation_id]
+
+    async def _wait(self, waiter):
+        """Wait for the buffer to change; returns False when the heartbeat interval passed first"""
+        try:
+            await asyncio.wait_for(waiter.wait(), self.heartbeat)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in header_lines:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            path, _, query = target.partition('?')
+            match = ROUTE_PATTERN.match(path)
+            if method != 'GET' or not match:
+                await self._respond_error(writer, 404, 'Not found')
+                return
+            stream, installation_id = match.groups()
+            if stream == 'progress':
+                await self._progress(writer, installation_id, headers)
+            else:
+                await self._log(writer, installation_id, headers, query)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except (ConnectionError, OSError):
+            # Client went away mid-stream
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _respond_error(self, writer, status, message):
+        body = json.dumps({'error': message}).encode()
+        reason = {400: 'Bad Request', 404: 'Not Found'}[status]
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+
+    async def _start_stream(self, writer):
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+            b'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'
+        )
+        await writer.drain()
+
+    async def _progress(self, writer, installation_id, headers):
+        try:
+            resume_seq = int(headers['last-event-id'])
+        except (KeyError, ValueError):
+            resume_seq = None
+        buffer = self.event_buffers.get(installation_id)
+        if buffer is None and self.event_mirror is not None:
+            buffer = await self.loop.run_in_executor(None, self.event_mirror.get, installation_id)
+        if buffer is None:
+            await self._respond_error(writer, 404, 'Unknown installation')
+            return
+
+        await self._start_stream(writer)
+        subscription = buffer.subscribe(resume_seq, replay=self.replay, max_lag=self.max_lag)
+        topic, waiter = self._subscribe(installation_id, buffer)
+        try:
+            while not subscription.done:
+                waiter.clear()
+                frames = subscription.poll(timeout=0)
+                if frames:
+                    writer.write(''.join(frames).encode())
+                    await writer.drain()
+                elif not subscription.done and not await self._wait(waiter):
+                    writer.write(b': keepalive\n\n')
+                    await writer.drain()
+        finally:
+            subscription.close()
+            self._unsubscribe(installation_id, topic, waiter)
+
+    async def _log(self, writer, installation_id, headers, query):
+        params = dict(part.partition('=')[::2] for part in query.split('&') if part)
+        try:
+            offset = int(headers.get('last-event-id') or params.get('offset', 0))
+        except ValueError:
+            await self._respond_error(writer, 400, 'offset must be an integer')
+            return
+
+        path = log_path(self.log_dir, installation_id)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            if self.log_archive is None or not self.log_archive.has(installation_id):
+                await self._respond_error(writer, 404, 'Unknown installation log')
+                return
+            await self._start_stream(writer)
+            chunks = await self.loop.run_in_executor(None, list, self.log_archive.read_chunks(installation_id, offset))
+            for end, text in chunks:
+                await self._send_log_chunk(writer, end, text)
+            return
+
+        with f:
+            # Logs of jobs running on another worker are followed until the job store reports them finished; the
+            # mirror only sees progress frames, so output in between is picked up at every heartbeat
+            buffer = self.event_buffers.get(installation_id)
+            if buffer is None and self.event_mirror is not None:
+                buffer = await self.loop.run_in_executor(None, self.event_mirror.get, installation_id)
+            await self._start_stream(writer)
+            offset = min(max(offset, 0), os.fstat(f.fileno()).st_size)
+            topic, waiter = self._subscribe(installation_id, buffer) if buffer is not None else (None, None)
+            try:
+                while True:
+                    if waiter is not None:
+                        waiter.clear()
+                    data, offset = read_lines(f, offset)
+                    if data:
+                        await self._send_log_chunk(writer, offset, data.decode('utf-8', errors='replace'))
+                        continue
+                    if buffer is None or buffer.closed:
+                        f.seek(offset)
+                        rest = f.read()
+                        if rest:
+                            await self._send_log_chunk(writer, offset + len(rest), rest.decode('utf-8', errors='replace'))
+                        break
+                    if not await self._wait(waiter):
+                        writer.write(b': keepalive\n\n')
+                        await writer.drain()
+            finally:
+                if topic is not None:
+                    self._unsubscribe(installation_id, topic, waiter)
+
+    async def _send_log_chunk(self, writer, end, text):
+        lines = ''.join(f"data: {line}\n" for line in text.splitlines())
+        writer.write(f"id: {end}\n{lines}\n".encode())
+        await writer.drain()
@@ -0,0 +1,70 @@
+import pytest
+
+from catalog import INSTALLATION_PREFIX, PROFILE_PREFIX, Catalog, major_version, validate_fields
+
+CONFIG = {
+    f'{INSTALLATION_PREFIX}1': {'version': '1.8.0_401', 'os': 'Linux', 'vendor': 'Oracle'},
+    f'{INSTALLATION_PREFIX}2': {'version': '17.0.2', 'os': 'linux', 'vendor': 'openjdk'},
+    f'{INSTALLATION_PREFIX}3': {'version': '17.0.10', 'os': 'windows', 'vendor': 'openjdk'},
+    f'{INSTALLATION_PREFIX}4': {'version': 21, 'os': 'linux', 'vendor': 'openjdk'},
+    f'{PROFILE_PREFIX}1': {'install_path': '/opt/java', 'os_compatibility': ['Linux', 'aix']},
+    f'{PROFILE_PREFIX}2': {'install_path': 'C:\\Java', 'os_compatibility': ['windows']},
+    'settings': {'default_timeout': 300}
+}
+
+
+def ids(records):
+    return [record.id for record in records]
+
+
+@pytest.mark.parametrize('version, major', [('1.8.0_401', '8'), ('8.0.401', '8'), ('17.0.2', '17'), (21, '21')])
+def test_major_version(version, major):
+    assert major_version(version) == major
+
+
+def test_entries_are_typed_and_other_tables_ignored():
+    catalog = Catalog(CONFIG)
+
+    assert list(catalog.installations) == [f'{INSTALLATION_PREFIX}{n}' for n in range(1, 5)]
+    assert list(catalog.profiles) == [f'{PROFILE_PREFIX}1', f'{PROFILE_PREFIX}2']
+    assert catalog.installations[f'{INSTALLATION_PREFIX}4'].version == '21'
+    assert catalog.profiles[f'{PROFILE_PREFIX}1'].to_dict()['os_compatibility'] == ['linux', 'aix']
+
+
+def test_find_installations_intersects_indexes_in_file_order():
+    catalog = Catalog(CONFIG)
+
+    assert ids(catalog.find_installations()) == list(catalog.installations)
+    assert ids(catalog.find_installations(os='LINUX')) == [f'{INSTALLATION_PREFIX}{n}' for n in (1, 2, 4)]
+    assert ids(catalog.find_installations(os='linux', vendor='openjdk')) == [f'{INSTALLATION_PREFIX}{n}' for n in (2, 4)]
+    assert ids(catalog.find_installations(version='8')) == [f'{INSTALLATION_PREFIX}1']
+    assert ids(catalog.find_installations(vendor='azul')) == []
+
+
+def test_find_installations_by_version_prefix():
+    catalog = Catalog(CONFIG)
+
+    assert ids(catalog.find_installations(version='17')) == [f'{INSTALLATION_PREFIX}2', f'{INSTALLATION_PREFIX}3']
+    assert ids(catalog.find_installations(version='17.0.1')) == []
+    assert ids(catalog.find_installations(version='17.0.10')) == [f'{INSTALLATION_PREFIX}3']
+
+
+def test_find_profiles():
+    catalog = Catalog(CONFIG)
+
+    assert ids(catalog.find_profiles(compatible_with='aix')) == [f'{PROFILE_PREFIX}1']
+    assert ids(catalog.find_profiles()) == [f'{PROFILE_PREFIX}1', f'{PROFILE_PREFIX}2']
+
+
+@pytest.mark.parametrize('fields', [
+    {'version': None}, {'size_mb': True}, {'backup_enabled': 'yes'}, {'os_compatibility': 'linux'},
+    {'environment_vars': ['JAVA_HOME=/opt/java', 1]}, {'friendly_name': 3}
+])
+def test_validate_fields_rejects_wrong_types(fields):
+    with pytest.raises(ValueError):
+        validate_fields(fields)
+
+
+def test_validate_fields_accepts_catalog_types():
+    validate_fields({'version': 17, 'size_mb': 190.5, 'backup_enabled': False, 'os_compatibility': ['linux'],
+                     'friendly_name': 'OpenJDK 17'})
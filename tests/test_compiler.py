@@ -0,0 +1,63 @@
+import os
+
+import yaml
+
+from compiler import PlaybookCompiler, compile_plays, compiled_groups
+
+INSTALLATION = {'friendly_name': 'OpenJDK 17', 'filename': 'installation/openjdk-17.tar.gz', 'version': '17',
+                'vendor': 'openjdk', 'os': 'linux', 'checksum': 'sha256:' + 'ab' * 32}
+PROFILE = {'install_path': '/opt/java17', 'backup_enabled': True, 'symlink_enabled': False}
+
+
+def task_names(play):
+    return [task['name'] for task in play['tasks']]
+
+
+def test_compiled_groups():
+    assert compiled_groups({'os': 'Windows'}) == ['windows_hosts']
+    assert compiled_groups({}) == ['linux_hosts', 'windows_hosts', 'aix_hosts']
+
+
+def test_compile_plays_for_one_platform():
+    plays = compile_plays(INSTALLATION, PROFILE, '/data')
+
+    assert len(plays) == 1
+    play = plays[0]
+    assert (play['hosts'], play['become'], play['gather_facts']) == ('linux_hosts', True, False)
+    assert play['vars']['java_installation_file'] == '/data/installation/openjdk-17.tar.gz'
+    assert play['vars']['java_installation_checksum'] == 'ab' * 32
+    names = task_names(play)
+    assert 'Backup existing Java installation' in names
+    assert 'Create symlink for Java executable' not in names
+    assert names.index('Copy Java installation file to target') < names.index('Extract Java installation')
+
+
+def test_compile_plays_without_os_targets_every_group():
+    plays = compile_plays(dict(INSTALLATION, os=''), PROFILE, '/data')
+
+    assert [play['hosts'] for play in plays] == ['linux_hosts', 'windows_hosts', 'aix_hosts']
+    windows = plays[1]
+    assert not windows['become']
+    assert all(not any(key in task for key in ('file', 'lineinfile', 'unarchive')) for task in windows['tasks'])
+    aix = plays[2]
+    assert aix['tasks'][0]['file']['group'] == 'system'
+
+
+def test_staged_artifacts_skip_the_transfer():
+    names = task_names(compile_plays(INSTALLATION, PROFILE, '/data', staged=True)[0])
+
+    assert not any('Transfer' in name or 'Copy' in name or 'rsync' in name for name in names)
+
+
+def test_compiler_caches_by_inputs(tmp_path):
+    compiler = PlaybookCompiler(str(tmp_path / 'compiled'), '/data', max_entries=2)
+
+    path = compiler.compile(INSTALLATION, PROFILE)
+    assert compiler.compile(dict(INSTALLATION), dict(PROFILE)) == path
+    with open(path) as f:
+        assert yaml.safe_load(f) == compile_plays(INSTALLATION, PROFILE, '/data')
+
+    other = compiler.compile(INSTALLATION, PROFILE, staged=True)
+    assert other != path
+    compiler.compile(dict(INSTALLATION, version='17.0.2'), PROFILE)
+    assert len(os.listdir(tmp_path / 'compiled')) == 2
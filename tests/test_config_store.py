@@ -0,0 +1,72 @@
+import pytest
+import toml
+
+from catalog import INSTALLATION_PREFIX, PROFILE_PREFIX
+from config_store import ConfigStore, EntryNotFound, PreconditionFailed
+
+CONFIG = {
+    f'{INSTALLATION_PREFIX}1': {
+        'friendly_name': 'OpenJDK 17', 'filename': 'openjdk-17.tar.gz', 'version': '17', 'os': 'linux'
+    },
+    f'{PROFILE_PREFIX}1': {'friendly_name': 'Default', 'install_path': '/opt/java', 'os_compatibility': ['linux']},
+    'settings': {'default_timeout': 300}
+}
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'java_updater.toml'
+    path.write_text(toml.dumps(CONFIG))
+    return str(path)
+
+
+def test_snapshot_is_reused_until_the_file_changes(config_path):
+    store = ConfigStore(config_path)
+    snapshot = store.get()
+
+    assert store.get() is snapshot
+    assert snapshot.config == CONFIG
+
+    with open(config_path, 'a') as f:
+        f.write('\n[profile-2]\nfriendly_name = "Second"\n')
+    assert store.get() is not snapshot
+    assert store.get().etag != snapshot.etag
+    assert store.catalog().profiles[f'{PROFILE_PREFIX}2'].friendly_name == 'Second'
+
+
+def test_etag_and_generation_match_across_instances(config_path):
+    first, second = ConfigStore(config_path), ConfigStore(config_path)
+
+    assert first.get().etag == second.get().etag
+    assert first.generation == second.generation
+
+
+def test_if_match_round_trip_across_instances(config_path):
+    writer, reader = ConfigStore(config_path), ConfigStore(config_path)
+    etag = reader.get().etag
+
+    snapshot, entry_id = writer.add_entry(INSTALLATION_PREFIX, {'friendly_name': 'OpenJDK 21'}, expected_etag=etag)
+
+    assert entry_id == f'{INSTALLATION_PREFIX}2'
+    assert snapshot.etag != etag
+    # The other instance sees the written file and computes the same ETag for it
+    assert reader.get().etag == snapshot.etag
+    assert reader.get().generation == snapshot.generation
+    assert reader.get().config[entry_id] == {'friendly_name': 'OpenJDK 21'}
+
+    # A write based on the version read before the change is refused
+    with pytest.raises(PreconditionFailed):
+        reader.update_entry(f'{INSTALLATION_PREFIX}1', {'version': '17.0.1'}, expected_etag=etag)
+    reader.update_entry(f'{INSTALLATION_PREFIX}1', {'version': '17.0.1'}, expected_etag=snapshot.etag)
+    assert writer.get().config[f'{INSTALLATION_PREFIX}1']['version'] == '17.0.1'
+    assert writer.catalog().installations[f'{INSTALLATION_PREFIX}1'].version == '17.0.1'
+
+
+def test_delete_entry(config_path):
+    store = ConfigStore(config_path)
+
+    store.delete_entry(f'{PROFILE_PREFIX}1')
+
+    assert f'{PROFILE_PREFIX}1' not in ConfigStore(config_path).get().config
+    with pytest.raises(EntryNotFound):
+        store.delete_entry(f'{PROFILE_PREFIX}1')
@@ -0,0 +1,74 @@
+import pytest
+
+from distribution import parse_distribution, plan_distribution, subnet_key
+
+
+def linux(count):
+    return [(f'l{n}', f'10.0.0.{n + 1}') for n in range(count)]
+
+
+def sources_of(waves):
+    return {host: source for wave in waves for host, source in wave}
+
+
+def test_parse_distribution():
+    assert parse_distribution(None) is None
+    assert parse_distribution({'enabled': False}) is None
+    assert parse_distribution({'fanout': '3'}) == {'fanout': 3}
+    for options in (True, {'fanout': 0}, {'fanout': 'many'}):
+        with pytest.raises((ValueError, TypeError)):
+            parse_distribution(options)
+
+
+def test_subnet_key():
+    assert subnet_key('linux_hosts', '10.0.0.7') == ('linux_hosts', '10.0.0.0/24')
+    assert subnet_key('linux_hosts', 'web1.example.com') == ('linux_hosts', None)
+
+
+def test_plan_seeds_once_then_fans_out():
+    waves = plan_distribution({'linux_hosts': linux(7)}, fanout=2)
+
+    assert waves[0] == [('l0', None)]
+    assert [len(wave) for wave in waves] == [1, 2, 4]
+    # Every host receives exactly once, and no source serves more than `fanout` hosts in a wave
+    assert sorted(sources_of(waves)) == [f'l{n}' for n in range(7)]
+    for wave in waves[1:]:
+        sources = [source for _, source in wave]
+        assert all(sources.count(source) <= 2 for source in sources)
+
+
+def test_plan_seeds_every_group_and_subnet():
+    hosts = {
+        'linux_hosts': [('l0', '10.0.0.1'), ('l1', '10.0.0.2'), ('l2', '10.0.0.3'), ('m0', '10.0.1.1'),
+                        ('m1', '10.0.1.2')],
+        'aix_hosts': [('a0', '10.0.0.50')]
+    }
+
+    waves = plan_distribution(hosts, fanout=2)
+
+    assert waves[0] == [('l0', None), ('m0', None), ('a0', None)]
+    # Peers are served from their own group and subnet
+    assert waves[1] == [('l1', 'l0'), ('l2', 'l0'), ('m1', 'm0')]
+    assert len(waves) == 2
+
+
+def test_plan_windows_hosts_only_receive():
+    waves = plan_distribution({'windows_hosts': [('w0', '10.0.2.1'), ('w1', '10.0.2.2')],
+                               'linux_hosts': linux(1)})
+
+    sources = sources_of(waves)
+    assert sources['w0'] is None
+    assert sources['w1'] == 'l0'
+    assert 'w0' not in sources.values()
+
+
+def test_plan_windows_only_fleet_takes_everything_from_the_controller():
+    waves = plan_distribution({'windows_hosts': [('w0', '10.0.2.1'), ('w1', '10.0.2.2')]})
+
+    assert waves == [[('w0', None), ('w1', None)]]
+
+
+def test_plan_skips_excluded_hosts():
+    assert plan_distribution({'linux_hosts': linux(2)}, excluded=['l0', 'l1']) == []
+    waves = plan_distribution({'linux_hosts': linux(3)}, excluded=['l0'])
+    assert waves[0] == [('l1', None)]
@@ -0,0 +1,51 @@
+import json
+import os
+import socket
+from datetime import datetime
+
+from event_stream import CALLBACK_PLUGINS, SOCKET_ENV, EventStreamListener, runner_event
+
+
+def test_task_start_event():
+    event = runner_event({'event': 'playbook_on_task_start', 'task': 'Unpack', 'time': 1767261600.0})
+
+    assert event == {
+        'event': 'playbook_on_task_start',
+        'created': datetime.fromtimestamp(1767261600.0).isoformat(),
+        'event_data': {'host': None, 'task': 'Unpack'}
+    }
+
+
+def test_result_event_carries_timing_and_outcome():
+    event = runner_event({'event': 'runner_on_failed', 'host': 'web1', 'task': 'Remove old', 'action': 'file',
+                          'start': 1767261600.0, 'end': 1767261602.5, 'duration': 2.5,
+                          'changed': True, 'ignore_errors': True})
+
+    assert event['created'] == datetime.fromtimestamp(1767261602.5).isoformat()
+    assert event['event_data'] == {
+        'host': 'web1', 'task': 'Remove old', 'start': 1767261600.0, 'end': 1767261602.5, 'duration': 2.5,
+        'task_action': 'file', 'ignore_errors': True, 'res': {'changed': True}
+    }
+
+
+def test_listener_delivers_every_line_in_order_and_skips_malformed_ones():
+    events = []
+    with EventStreamListener(events.append) as listener:
+        envvars = listener.envvars({'ANSIBLE_CALLBACK_PLUGINS': '/plugins'})
+        assert envvars['ANSIBLE_CALLBACK_PLUGINS'] == f'/plugins:{CALLBACK_PLUGINS}'
+        assert envvars['ANSIBLE_CALLBACKS_ENABLED'] == 'json_events'
+        assert envvars[SOCKET_ENV] == listener.path
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(listener.path)
+        with client:
+            for line in (json.dumps({'event': 'playbook_on_task_start', 'task': 'Copy'}).encode(),
+                         b'{not json',
+                         json.dumps({'event': 'runner_on_ok', 'host': 'web1', 'task': 'Copy',
+                                     'start': 1.0, 'end': 2.0, 'duration': 1.0}).encode()):
+                client.sendall(line + b'\n')
+
+    assert [(event['event'], event['event_data']['task']) for event in events] == [
+        ('playbook_on_task_start', 'Copy'), ('runner_on_ok', 'Copy')
+    ]
+    assert not os.path.exists(listener.path)
@@ -0,0 +1,85 @@
+import json
+
+from events import EventBuffer, EventBufferRegistry, encode_frame
+
+
+def fill(buffer, count):
+    for n in range(count):
+        buffer.append({'n': n})
+
+
+def seqs(frames):
+    return [int(frame.split('\n', 1)[0][len('id: '):]) for frame in frames if frame.startswith('id: ')]
+
+
+def subscription_frames(buffer, after):
+    return [frame.split('\n', 1)[0] for frame in buffer.subscribe(after=after).poll(0)]
+
+
+def test_encode_frame():
+    assert encode_frame(7, {'status': 'ok'}) == 'id: 7\ndata: {"status": "ok"}\n\n'
+
+
+def test_subscribe_replays_recent_events_or_resumes_after_a_sequence():
+    buffer = EventBuffer(start_seq=10)
+    fill(buffer, 5)
+
+    assert seqs(buffer.subscribe(replay=2).poll(0)) == [14, 15]
+    assert seqs(buffer.subscribe(after=12).poll(0)) == [13, 14, 15]
+    assert buffer.subscribers == 2
+
+    subscription = buffer.subscribe(after=15)
+    assert subscription.poll(0) == []
+    buffer.append({'n': 5})
+    assert seqs(subscription.poll(0)) == [16]
+    subscription.close()
+    subscription.close()
+    assert buffer.subscribers == 2
+
+
+def test_lagging_subscriber_drops_the_oldest_events():
+    buffer = EventBuffer(maxlen=5)
+    subscription = buffer.subscribe(after=0, max_lag=2)
+    fill(buffer, 8)
+
+    frames = subscription.poll(0)
+    # Three events fell out of the buffer and three more were skipped to catch up
+    assert frames[0] == f"event: dropped\ndata: {json.dumps({'dropped': 6})}\n\n"
+    assert seqs(frames) == [7, 8]
+    assert subscription.dropped == 6
+
+
+def test_subscription_is_done_once_drained_after_close():
+    buffer = EventBuffer()
+    subscription = buffer.subscribe()
+    fill(buffer, 2)
+    buffer.close()
+
+    assert not subscription.done
+    assert seqs(subscription.poll(0)) == [1, 2]
+    assert subscription.done
+    assert subscription.poll(0) == []
+
+
+def test_copied_frames_with_gaps():
+    buffer = EventBuffer()
+    for seq in (3, 4, 9, 12):
+        buffer.append_frame(seq, encode_frame(seq, {}))
+    buffer.append_frame(4, encode_frame(4, {}))
+
+    assert [seq for seq, _ in buffer.frames(after=4)] == [9, 12]
+    assert [seq for seq, _ in buffer.frames(after=5)] == [9, 12]
+    assert [seq for seq, _ in buffer.frames(after=12)] == []
+    # The gap before the first unseen frame counts as dropped
+    assert subscription_frames(buffer, after=10) == ['event: dropped', 'id: 12']
+
+
+def test_registry_keeps_only_recent_finished_buffers():
+    registry = EventBufferRegistry(max_finished=1)
+    for installation_id in ('a', 'b'):
+        registry.create(installation_id).close()
+    running = registry.create('c')
+
+    assert registry.get('a') is None
+    assert registry.get('b') is not None
+    assert registry.get('c') is running
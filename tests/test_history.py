@@ -0,0 +1,62 @@
+from history import RunHistory
+
+
+def result(event, host, task, start, end, **event_data):
+    return {'event': event, 'event_data': dict(host=host, task=task, start=start, end=end, **event_data)}
+
+
+def record_run(history, run_id, events, status='successful'):
+    history.start_run(run_id, {'hosts': ['web1', 'web2'], 'installation': 'jdk17'})
+    history.describe_run(run_id, {'friendly_name': 'JDK 17'}, {'install_path': '/opt/java'})
+    for event in events:
+        history.record_event(run_id, event)
+    history.finish_run(run_id, status)
+    assert history.flush(timeout=5)
+
+
+def test_run_hosts_and_task_statuses(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.db'))
+    record_run(history, 'run1', [
+        {'event': 'playbook_on_task_start', 'event_data': {'task': 'Gathering Facts'}},
+        result('runner_on_ok', 'web1', 'Gathering Facts', '2026-03-02T10:00:00', '2026-03-02T10:00:02'),
+        result('runner_on_ok', 'web1', 'Unpack', '2026-03-02T10:00:02', '2026-03-02T10:00:12',
+               res={'changed': True}),
+        result('runner_on_failed', 'web1', 'Remove old', '2026-03-02T10:00:12', '2026-03-02T10:00:13',
+               ignore_errors=True),
+        result('runner_on_unreachable', 'web2', 'Gathering Facts', '2026-03-02T10:00:00', '2026-03-02T10:00:30'),
+    ], status='failed')
+
+    [summary] = history.runs()
+    assert summary['id'] == 'run1'
+    assert (summary['installation'], summary['profile'], summary['status']) == ('JDK 17', '/opt/java', 'failed')
+    assert (summary['hosts'], summary['failed_hosts']) == (2, 1)
+    assert history.runs(status='successful') == []
+
+    run = history.run('run1')
+    assert run['request'] == {'hosts': ['web1', 'web2'], 'installation': 'jdk17'}
+    assert [(host['host'], host['status'], host['tasks'], host['duration']) for host in run['hosts']] == [
+        ('web2', 'unreachable', 1, 30.0),
+        ('web1', 'ok', 3, 13.0)
+    ]
+    statuses = history._query("SELECT task, status FROM task_results WHERE host = 'web1' ORDER BY started_at")
+    assert [row['status'] for row in statuses] == ['ok', 'changed', 'ignored']
+    assert history.run('missing') is None
+
+
+def test_slowest_tasks_across_runs(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.db'))
+    record_run(history, 'run1', [
+        result('runner_on_ok', 'web1', 'Unpack', None, None, duration=10.0),
+        result('runner_on_ok', 'web1', 'Copy', None, None, duration=1.0),
+    ])
+    record_run(history, 'run2', [
+        result('runner_on_ok', 'web1', 'Unpack', None, None, duration=20.0),
+        result('runner_on_skipped', 'web1', 'Cleanup', None, None),
+    ])
+
+    slowest = history.slowest_tasks()
+    assert [(task['task'], task['runs'], task['mean_duration'], task['max_duration']) for task in slowest] == [
+        ('Unpack', 2, 15.0, 20.0),
+        ('Copy', 1, 1.0, 1.0)
+    ]
+    assert len(history.slowest_tasks(limit=1)) == 1
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+
+
+def test_claim_takes_higher_priority_first(store):
+    store.create('low', {}, priority=0)
+    store.create('high', {}, priority=5)
+
+    job = store.claim('worker-a')
+
+    assert job['id'] == 'high'
+    assert job['status'] == 'running' and job['worker'] == 'worker-a'
+    assert store.claim('worker-a')['id'] == 'low'
+    assert store.claim('worker-a') is None
+
+
+def test_jobs_of_a_restarted_worker_expire(store, monkeypatch):
+    # Same host and PID, new start: the old process's jobs must not be kept alive by the new one's heartbeats
+    old_worker, new_worker = 'host-1-aaaaaaaa', 'host-1-bbbbbbbb'
+    store.create('orphaned', {})
+    store.heartbeat(old_worker)
+    assert store.claim(old_worker)['id'] == 'orphaned'
+
+    later = time.time() + 120
+    monkeypatch.setattr(jobs.time, 'time', lambda: later)
+    store.heartbeat(new_worker)
+    store.create('current', {})
+    assert store.claim(new_worker)['id'] == 'current'
+
+    assert store.expire(60) == ['orphaned']
+    assert store.get('orphaned')['status'] == 'lost'
+    assert store.get('current')['status'] == 'running'
+    # The lost job ends with a final event for its progress streams
+    seq, frame = store.events_since('orphaned')[-1]
+    assert '"status": "lost"' in frame
+    assert store.expire(60) == []
+
+
+def test_pinned_job_is_claimed_only_by_its_owner(store):
+    store.heartbeat('owner')
+    store.heartbeat('other')
+    store.create('pinned', {'password': '***'}, owner='owner')
+
+    assert store.claim('other') is None
+    assert store.claim('owner')['id'] == 'pinned'
+
+
+def test_pinned_job_expires_while_queued_when_its_owner_is_stale(store, monkeypatch):
+    store.heartbeat('owner')
+    store.create('pinned', {}, owner='owner')
+    store.create('shared', {})
+
+    later = time.time() + 120
+    monkeypatch.setattr(jobs.time, 'time', lambda: later)
+    store.heartbeat('other')
+
+    assert store.expire(60) == ['pinned']
+    assert store.get('shared')['status'] == 'queued'
+
+
+@pytest.mark.parametrize('authkey', [None, '', 'java-installer'])
+def test_remote_store_refuses_missing_or_published_authkey(authkey):
+    with pytest.raises(ValueError):
+        jobs.check_authkey(authkey)
+    assert jobs.check_authkey('s3cret') == b's3cret'
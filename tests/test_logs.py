@@ -0,0 +1,107 @@
+import os
+import threading
+
+from events import EventBuffer
+from logs import BLOCK_SIZE, LogArchive, follow_log, log_path, read_lines
+
+RUN_LOG = '''Installation started at 2026-03-02 10:15:00.123456
+TASK [Gathering Facts] *********************************************************
+ok: [web1]
+ok: [web2]
+TASK [Copy Java installation file to target] ***********************************
+changed: [web1]
+fatal: [web2]: UNREACHABLE! => {"changed": false, "unreachable": true}
+TASK [Verify Java installation] ************************************************
+fatal: [web1]: FAILED! => {"rc": 127}
+'''
+
+
+def test_read_lines_stops_at_the_last_newline(tmp_path):
+    path = tmp_path / 'log'
+    path.write_bytes(b'one\ntwo\nthr')
+
+    with open(path, 'rb') as f:
+        assert read_lines(f, 0) == (b'one\ntwo\n', 8)
+        assert read_lines(f, 8) == (b'', 8)
+
+
+def test_follow_log_until_the_buffer_closes(tmp_path):
+    path = log_path(str(tmp_path), 'job')
+    with open(path, 'w') as f:
+        f.write('first\n')
+    buffer = EventBuffer()
+
+    def write_more():
+        with open(path, 'a') as f:
+            f.write('second\nlast without newline')
+        buffer.touch()
+        buffer.close()
+
+    chunks = follow_log(path, 0, buffer, timeout=5)
+    assert next(chunks) == (6, 'first\n')
+    threading.Thread(target=write_more).start()
+    assert [chunk for chunk in chunks if chunk is not None] == [(13, 'second\n'), (33, 'last without newline')]
+
+
+def test_follow_log_resumes_from_an_offset_without_a_buffer(tmp_path):
+    path = log_path(str(tmp_path), 'job')
+    with open(path, 'w') as f:
+        f.write('first\nsecond\n')
+
+    assert list(follow_log(path, 6)) == [(13, 'second\n')]
+    assert list(follow_log(path, 100)) == []
+
+
+def write_log(log_dir, installation_id, text):
+    path = log_path(log_dir, installation_id)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def test_archive_and_read_back(tmp_path):
+    archive = LogArchive(str(tmp_path / 'archive'))
+    # Several compressed blocks, each ending on a line boundary
+    text = RUN_LOG + ''.join(f'line {n} ' + 'x' * 100 + '\n' for n in range(3 * BLOCK_SIZE // 100))
+    path = write_log(str(tmp_path), 'run1', text)
+
+    archive.archive('run1', path)
+
+    assert not os.path.exists(path)
+    assert archive.has('run1')
+    chunks = list(archive.read_chunks('run1'))
+    assert len(chunks) > 2
+    assert ''.join(text for _, text in chunks) == text
+    assert chunks[-1][0] == len(text)
+    # Resuming mid-log returns only what follows the offset
+    offset = len(text) - 50
+    assert ''.join(text for _, text in archive.read_chunks('run1', offset)) == text[offset:]
+
+
+def test_search_by_host_status_task_and_time(tmp_path):
+    archive = LogArchive(str(tmp_path / 'archive'))
+    archive.archive('run1', write_log(str(tmp_path), 'run1', RUN_LOG))
+    archive.archive('run2', write_log(str(tmp_path), 'run2', RUN_LOG.replace('2026-03-02', '2026-04-01')))
+
+    failed = archive.search(host='web1', status='failed')
+    assert [(result['installation_id'], result['task']) for result in failed] == [
+        ('run2', 'Verify Java installation'), ('run1', 'Verify Java installation')
+    ]
+    assert failed[0]['line'] == 'fatal: [web1]: FAILED! => {"rc": 127}'
+    assert failed[0]['started_at'] == '2026-04-01T10:15:00.123456'
+
+    unreachable = archive.search(status='unreachable', until='2026-04-01')
+    assert [(result['installation_id'], result['host']) for result in unreachable] == [('run1', 'web2')]
+    assert [result['host'] for result in archive.search(task='Copy', since='2026-04-01')] == ['web1', 'web2']
+    assert len(archive.search(limit=1)) == 1
+
+
+def test_archive_directory_skips_unfinished_logs(tmp_path):
+    archive = LogArchive(str(tmp_path / 'archive'))
+    write_log(str(tmp_path), 'done', RUN_LOG)
+    running = write_log(str(tmp_path), 'running', RUN_LOG)
+
+    archive.archive_directory(str(tmp_path), finished=lambda installation_id: installation_id == 'done')
+
+    assert archive.has('done')
+    assert not archive.has('running') and os.path.exists(running)
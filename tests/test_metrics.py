@@ -0,0 +1,47 @@
+import threading
+
+from metrics import Histogram
+
+
+def test_histogram_collect():
+    histogram = Histogram('task_seconds', 'Task duration', labels=('task',), buckets=(1, 0.5, 5))
+    histogram.observe(0.2, 'copy')
+    histogram.observe(1, 'copy')
+    histogram.observe(7.5, 'copy')
+    histogram.observe(3, 'unpack')
+
+    assert histogram.collect() == (
+        '# HELP task_seconds Task duration\n'
+        '# TYPE task_seconds histogram\n'
+        'task_seconds_bucket{task="copy",le="0.5"} 1\n'
+        'task_seconds_bucket{task="copy",le="1"} 2\n'
+        'task_seconds_bucket{task="copy",le="5"} 2\n'
+        'task_seconds_bucket{task="copy",le="+Inf"} 3\n'
+        'task_seconds_sum{task="copy"} 8.7\n'
+        'task_seconds_count{task="copy"} 3\n'
+        'task_seconds_bucket{task="unpack",le="0.5"} 0\n'
+        'task_seconds_bucket{task="unpack",le="1"} 0\n'
+        'task_seconds_bucket{task="unpack",le="5"} 1\n'
+        'task_seconds_bucket{task="unpack",le="+Inf"} 1\n'
+        'task_seconds_sum{task="unpack"} 3\n'
+        'task_seconds_count{task="unpack"} 1\n'
+    )
+
+
+def test_histogram_collect_adds_up_shards():
+    histogram = Histogram('request_seconds', 'Request duration', buckets=(0.1, 1))
+
+    def observe():
+        for _ in range(100):
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = histogram.collect().splitlines()
+    assert 'request_seconds_bucket{le="1"} 800' in lines
+    assert 'request_seconds_sum 400' in lines
+    assert 'request_seconds_count 800' in lines
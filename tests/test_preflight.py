@@ -0,0 +1,64 @@
+import pytest
+
+from preflight import exclusion_limit, is_compliant, parse_java_version, probe_command, version_tuple
+
+OPENJDK_17 = '''openjdk version "17.0.2" 2022-01-18
+OpenJDK Runtime Environment (build 17.0.2+8-86)
+OpenJDK 64-Bit Server VM (build 17.0.2+8-86, mixed mode, sharing)'''
+ORACLE_8 = '''java version "1.8.0_401"
+Java(TM) SE Runtime Environment (build 1.8.0_401-b10)'''
+ZULU_11 = '''openjdk version "11.0.22" 2024-01-16 LTS
+OpenJDK Runtime Environment Zulu11.70+15-CA (build 11.0.22+7-LTS)'''
+
+
+@pytest.mark.parametrize('output, expected', [
+    (OPENJDK_17, ('17.0.2', 'openjdk')),
+    (ORACLE_8, ('1.8.0_401', 'oracle')),
+    (ZULU_11, ('11.0.22', 'azul')),
+    ('java version "9" from a build nobody knows', ('9', None)),
+    ('bash: java: command not found', (None, None)),
+    ('', (None, None))
+])
+def test_parse_java_version(output, expected):
+    assert parse_java_version(output) == expected
+
+
+def test_version_tuple():
+    assert version_tuple('1.8.0_401') == (8, 0, 401)
+    assert version_tuple('17.0.2') == (17, 0, 2)
+
+
+@pytest.mark.parametrize('installed, target, compliant', [
+    (('17.0.2', 'openjdk'), ('17', 'openjdk'), True),
+    (('17.0.2', 'openjdk'), ('17.0.2', None), True),
+    (('1.8.0_401', 'oracle'), ('8', 'Oracle'), True),
+    (('17.0.2', 'openjdk'), ('17.0.10', 'openjdk'), False),
+    (('17.0.2', 'openjdk'), ('17', 'temurin'), False),
+    (('17.0.2', None), ('17', 'openjdk'), False),
+    (('17.0.2', None), ('17', None), True),
+    ((None, None), ('17', None), False)
+])
+def test_is_compliant(installed, target, compliant):
+    assert is_compliant(*installed, *target) is compliant
+
+
+def test_probe_command_prefers_the_profile_path():
+    assert '"/opt/java/bin/java" -version' in probe_command('linux_hosts', '/opt/java')
+    assert 'C:\\Java\\bin\\java.exe' in probe_command('windows_hosts', 'C:\\Java')
+
+
+def test_exclusion_limit_writes_a_limit_file(tmp_path):
+    path = str(tmp_path / 'limit')
+
+    assert exclusion_limit(['web2', 'web1'], path) == f'@{path}'
+    with open(path) as f:
+        assert f.read() == 'all\n!web1\n!web2'
+
+
+def test_exclusion_limit_stays_short_for_large_fleets(tmp_path):
+    hosts = [f'host-{n:05d}.example.com' for n in range(20000)]
+
+    limit = exclusion_limit(hosts, str(tmp_path / 'limit'))
+
+    assert len(limit) < 1024
+    assert (tmp_path / 'limit').stat().st_size > 128 * 1024
@@ -0,0 +1,49 @@
+import pytest
+import yaml
+
+from installer import OS_GROUPS
+from rollout import parse_rollout, write_group_playbook
+
+
+@pytest.mark.parametrize('options', [None, {}, {'enabled': False}])
+def test_parse_rollout_off(options):
+    assert parse_rollout(options) is None
+
+
+def test_parse_rollout_defaults():
+    assert parse_rollout({'enabled': True}) == {
+        'serial': 1, 'max_fail_percentage': None, 'strategy': 'linear', 'groups': list(OS_GROUPS.values())
+    }
+
+
+def test_parse_rollout_waves():
+    rollout = parse_rollout({'serial': [1, '2', '25%'], 'max_fail_percentage': '10', 'strategy': 'free',
+                             'groups': ['linux_hosts']})
+
+    assert rollout == {'serial': [1, 2, '25%'], 'max_fail_percentage': 10, 'strategy': 'free',
+                       'groups': ['linux_hosts']}
+
+
+@pytest.mark.parametrize('options', [
+    True, ['linux_hosts'], {'serial': 'half'}, {'serial': []}, {'serial': '-1'}, {'max_fail_percentage': 101},
+    {'strategy': 'random'}, {'groups': 'linux_hosts'}, {'groups': ['linux_hosts', 1]}, {'groups': ['db_hosts']}
+])
+def test_parse_rollout_rejects_invalid_options(options):
+    with pytest.raises(ValueError):
+        parse_rollout(options)
+
+
+def test_write_group_playbook(tmp_path):
+    base = tmp_path / 'compiled.yml'
+    base.write_text(yaml.safe_dump([
+        {'name': 'Linux', 'hosts': 'linux_hosts', 'tasks': []},
+        {'name': 'Windows', 'hosts': 'windows_hosts', 'tasks': []}
+    ]))
+    rollout = parse_rollout({'serial': '25%', 'max_fail_percentage': 0})
+
+    path = write_group_playbook(str(tmp_path / 'linux.yml'), 'linux_hosts', rollout, str(base))
+
+    with open(path) as f:
+        assert yaml.safe_load(f) == [{'name': 'Linux', 'hosts': 'linux_hosts', 'tasks': [], 'serial': '25%',
+                                      'strategy': 'linear', 'max_fail_percentage': 0}]
+    assert write_group_playbook(str(tmp_path / 'aix.yml'), 'aix_hosts', rollout, str(base)) is None
@@ -0,0 +1,30 @@
+import configparser
+import os
+
+from runner_config import build_ansible_cfg, control_path_dir, job_runner_options, remove_control_path_dir
+
+JOB_ID = '0f8c2a4e-1b7d-4c55-9a51-3f0e2b6d7c88'
+
+
+def test_build_ansible_cfg():
+    cfg = build_ansible_cfg(JOB_ID, {'ansible_forks': 50, 'ssh_control_persist': 30}, '/data/facts')
+
+    assert cfg['defaults']['forks'] == '50'
+    assert cfg['defaults']['fact_caching_connection'] == '/data/facts'
+    assert 'ControlPersist=30s' in cfg['ssh_connection']['ssh_args']
+    assert cfg['ssh_connection']['control_path_dir'] == control_path_dir(JOB_ID)
+    # Socket paths stay well under the 108 byte limit: directory, '/' and a 40 character %C hash
+    assert len(control_path_dir(JOB_ID)) + 41 < 108
+
+
+def test_job_runner_options_and_cleanup(tmp_path):
+    options = job_runner_options(str(tmp_path), JOB_ID, {}, '/data/facts')
+
+    cfg = configparser.ConfigParser(interpolation=None)
+    cfg.read(options['envvars']['ANSIBLE_CONFIG'])
+    assert cfg['defaults']['gathering'] == 'smart'
+    assert options['fact_cache_type'] is None
+    assert os.path.isdir(control_path_dir(JOB_ID))
+
+    remove_control_path_dir(JOB_ID)
+    assert not os.path.exists(control_path_dir(JOB_ID))
@@ -0,0 +1,53 @@
+import threading
+
+from jobs import MemoryJobStore
+from scheduler import JobScheduler
+
+
+def redact(data):
+    return {key: '********' if key == 'password' else value for key, value in data.items()}
+
+
+def test_full_request_reaches_the_target_but_only_the_redacted_one_is_stored():
+    store = MemoryJobStore()
+    started, release = threading.Event(), threading.Event()
+    received = {}
+
+    def target(job_id, data):
+        received[job_id] = data
+        started.set()
+        release.wait(5)
+        return 'successful'
+
+    scheduler = JobScheduler(target, store, 'worker-a', workers=1, poll_interval=0.05, redact=redact)
+    scheduler.submit('job1', {'hosts': ['web1'], 'password': 'hunter2'})
+
+    assert started.wait(5)
+    assert received['job1'] == {'hosts': ['web1'], 'password': 'hunter2'}
+    assert store.get('job1')['data'] == {'hosts': ['web1'], 'password': '********'}
+    assert store.get('job1')['owner'] == 'worker-a'
+    release.set()
+
+
+def test_cancelling_a_queued_job_forgets_its_credentials():
+    store = MemoryJobStore()
+    release = threading.Event()
+    scheduler = JobScheduler(lambda job_id, data: release.wait(5) and 'successful', store, 'worker-a',
+                             workers=1, poll_interval=0.05, redact=redact)
+    scheduler.submit('running', {'password': 'a'})
+    scheduler.submit('queued', {'password': 'b'})
+
+    assert scheduler.cancel('queued') == 'canceled'
+
+    assert 'queued' not in scheduler._secrets
+    assert store.get('queued')['status'] == 'canceled'
+    release.set()
+
+
+def test_requests_without_credentials_are_not_pinned():
+    store = MemoryJobStore()
+    scheduler = JobScheduler(lambda job_id, data: 'successful', store, 'worker-a', workers=1, redact=redact)
+    scheduler.submit('job1', {'hosts': ['web1']})
+
+    assert store.get('job1')['owner'] is None
+    assert scheduler._secrets == {}
@@ -0,0 +1,62 @@
+import hashlib
+import io
+
+import pytest
+
+from uploads import ChecksumMismatch, OffsetMismatch, UploadError, UploadManager, normalize_checksum
+
+DATA = b'java archive'
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.mark.parametrize('checksum', [DIGEST, DIGEST.upper(), f'sha256:{DIGEST}', f'SHA256:{DIGEST.upper()}'])
+def test_normalize_checksum(checksum):
+    assert normalize_checksum(checksum) == f'sha256:{DIGEST}'
+
+
+@pytest.mark.parametrize('checksum', ['', None])
+def test_normalize_checksum_without_checksum(checksum):
+    assert normalize_checksum(checksum) == ''
+
+
+@pytest.mark.parametrize('checksum', ['abc', 'md5:' + DIGEST, DIGEST + '0', f'sha256:{DIGEST[:-1]}g'])
+def test_normalize_checksum_rejects_malformed(checksum):
+    with pytest.raises(UploadError):
+        normalize_checksum(checksum)
+
+
+def test_upload_with_bare_upper_case_checksum_completes(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload = manager.create('jdk.tar.gz', len(DATA), DIGEST.upper())
+    assert upload.checksum == f'sha256:{DIGEST}'
+
+    destination = manager.append(upload, 0, io.BytesIO(DATA), len(DATA))
+
+    assert destination == str(tmp_path / 'jdk.tar.gz')
+    assert (tmp_path / 'jdk.tar.gz').read_bytes() == DATA
+
+
+def test_upload_with_wrong_checksum_is_discarded(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload = manager.create('jdk.tar.gz', len(DATA), '0' * 64)
+
+    with pytest.raises(ChecksumMismatch):
+        manager.append(upload, 0, io.BytesIO(DATA), len(DATA))
+    assert manager.get(upload.id) is None
+
+
+def test_upload_resumes_in_another_manager(tmp_path):
+    upload = UploadManager(str(tmp_path)).create('jdk.tar.gz', len(DATA), f'sha256:{DIGEST}')
+    UploadManager(str(tmp_path)).append(upload, 0, io.BytesIO(DATA[:5]), 5)
+
+    # A restarted process rebuilds the offset and hash state from the partial file
+    manager = UploadManager(str(tmp_path))
+    restored = manager.get(upload.id)
+    assert restored.offset == 5
+    assert manager.get(upload.id) is restored
+    with pytest.raises(OffsetMismatch):
+        manager.append(restored, 0, io.BytesIO(DATA), len(DATA))
+
+    manager.append(restored, 5, io.BytesIO(DATA[5:]), len(DATA) - 5)
+    assert (tmp_path / 'jdk.tar.gz').read_bytes() == DATA
+    assert manager.get(upload.id) is None
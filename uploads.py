@@ -0,0 +1,200 @@
+"""
+Resumable chunked uploads of installation archives
+Chunks are streamed straight to disk and hashed as they arrive, so memory use per upload is one read buffer
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+from werkzeug.utils import secure_filename
+
+from artifacts import parse_digest
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request stream per iteration
+READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised for invalid upload requests"""
+
+
+class OffsetMismatch(UploadError):
+    """Raised when a chunk does not start at the upload's current offset"""
+
+    def __init__(self, offset):
+        super().__init__(f'Chunk must start at offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    """Raised when a completed upload does not match its expected checksum"""
+
+
+class UploadsBusy(Exception):
+    """Raised when too many chunks are being received at once"""
+
+
+def normalize_checksum(checksum):
+    """'sha256:<lower-case hex>' for an expected checksum given with or without the prefix, in any case; '' for none"""
+    if not checksum:
+        return ''
+    digest = parse_digest(checksum)
+    if digest is None:
+        raise UploadError('Checksum must be a SHA-256 digest, as sha256:<hex> or bare hex')
+    return f'sha256:{digest}'
+
+
+class Upload:
+    """State of a single upload; `hasher` covers exactly the bytes written so far"""
+
+    def __init__(self, upload_id, filename, size, checksum=''):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.checksum = checksum
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'checksum': self.checksum
+        }
+
+
+class UploadManager:
+    """Create uploads, append chunks and move finished archives into the installation directory"""
+
+    def __init__(self, installation_dir, max_active=4, store=None):
+        self.installation_dir = installation_dir
+        self.store = store
+        self.upload_dir = os.path.join(installation_dir, '.uploads')
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._active = threading.BoundedSemaphore(max_active)
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.json')
+
+    def create(self, filename, size, checksum=''):
+        """Start a new upload of `size` bytes"""
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError('A filename is required')
+        if size is None or int(size) <= 0:
+            raise UploadError('Upload size must be a positive number of bytes')
+
+        upload = Upload(uuid.uuid4().hex, filename, int(size), normalize_checksum(checksum))
+        open(self._part_path(upload.id), 'wb').close()
+        with open(self._meta_path(upload.id), 'w') as f:
+            json.dump({'filename': upload.filename, 'size': upload.size, 'checksum': upload.checksum}, f)
+
+        with self._lock:
+            self._uploads[upload.id] = upload
+        return upload
+
+    def get(self, upload_id):
+        """Return an upload, restoring it from disk if this process has not seen it yet"""
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+
+        meta_path = self._meta_path(upload_id)
+        if secure_filename(upload_id) != upload_id or not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+
+            # Hash state is not persisted, so rebuild it from the bytes already on disk; this reads the whole
+            # part file, so it runs outside the manager lock that every other upload's requests take
+            upload = Upload(upload_id, meta['filename'], meta['size'], meta.get('checksum', ''))
+            with open(self._part_path(upload_id), 'rb') as part:
+                while True:
+                    data = part.read(READ_SIZE)
+                    if not data:
+                        break
+                    upload.hasher.update(data)
+                    upload.offset += len(data)
+        except FileNotFoundError:
+            # Finished or discarded meanwhile
+            return None
+
+        with self._lock:
+            # Another request may have restored it first and written to it since; keep that one
+            if upload_id not in self._uploads and not os.path.exists(meta_path):
+                return None
+            return self._uploads.setdefault(upload_id, upload)
+
+    def append(self, upload, offset, stream, length):
+        """Append `length` bytes from `stream` at `offset`; returns the finished file path when complete"""
+        if not self._active.acquire(blocking=False):
+            raise UploadsBusy()
+        try:
+            with upload.lock:
+                if offset != upload.offset:
+                    raise OffsetMismatch(upload.offset)
+                if offset + length > upload.size:
+                    raise UploadError('Chunk extends past the declared upload size')
+
+                with open(self._part_path(upload.id), 'r+b') as part:
+                    part.seek(offset)
+                    remaining = length
+                    while remaining:
+                        data = stream.read(min(READ_SIZE, remaining))
+                        if not data:
+                            break
+                        part.write(data)
+                        upload.hasher.update(data)
+                        upload.offset += len(data)
+                        remaining -= len(data)
+                    # Drop anything beyond the acknowledged offset left by an earlier interrupted chunk
+                    part.truncate(upload.offset)
+
+                if upload.offset < upload.size:
+                    return None
+                return self._finish(upload)
+        finally:
+            self._active.release()
+
+    def _finish(self, upload):
+        digest = f'sha256:{upload.hasher.hexdigest()}'
+        if upload.checksum and parse_digest(upload.checksum) != upload.hasher.hexdigest():
+            self.discard(upload.id)
+            raise ChecksumMismatch(f'Expected {upload.checksum}, received {digest}')
+
+        upload.checksum = digest
+        if self.store is not None:
+            destination = self.store.ingest(self._part_path(upload.id), digest, upload.filename)
+        else:
+            destination = os.path.join(self.installation_dir, upload.filename)
+            os.replace(self._part_path(upload.id), destination)
+        os.remove(self._meta_path(upload.id))
+        with self._lock:
+            self._uploads.pop(upload.id, None)
+
+        logger.info(f"Upload {upload.id} stored as {destination} ({digest})")
+        return destination
+
+    def discard(self, upload_id):
+        """Abort an upload and remove its partial data"""
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)